@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Backfill decode throughput: decoding a directory of Level II volumes one after
+another on the calling thread versus decode_volumes across a process pool. Run from
+the repo root with e.g. a day of scans for one radar:
+
+    PYTHONPATH=src python benchmarks/bench_decode.py LEVEL2_DIR [WORKERS ...]
+"""
+
+import os
+import sys
+import time
+
+from services.scans.decode import decode_volumes, read_sweep_arrays
+
+
+def main():
+    directory = sys.argv[1]
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if not name.endswith("_MDM")
+    )
+    worker_counts = [int(n) for n in sys.argv[2:]] or [1, 2, 4, os.cpu_count()]
+
+    start = time.perf_counter()
+    for path in paths:
+        read_sweep_arrays(path)
+    serial = time.perf_counter() - start
+    print(f"{len(paths)} volumes, serial: {serial:.1f} s")
+
+    for workers in worker_counts:
+        start = time.perf_counter()
+        for volume in decode_volumes(paths, workers=workers):
+            volume.close()
+        elapsed = time.perf_counter() - start
+        print(f"{workers:>3} workers: {elapsed:.1f} s ({serial / elapsed:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
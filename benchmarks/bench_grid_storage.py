@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Size and encode/decode time of one reflectivity sweep (720 rays x 1832 gates) as
+the old grid_data JSON versus the binary grid columns. Run from the repo root:
+
+    PYTHONPATH=src python benchmarks/bench_grid_storage.py
+"""
+
+import json
+import timeit
+
+import numpy as np
+
+from services.postgres.grid import decode_grid, encode_grid, json_grid_to_array
+
+
+def synthetic_sweep(n_rays=720, n_gates=1832):
+    rng = np.random.default_rng(0)
+    data = rng.normal(20, 15, size=(n_rays, n_gates)).astype(np.float32)
+    return np.ma.masked_less(np.round(data * 2) / 2, 5)
+
+
+def bench(label, encode, decode, number=3):
+    payload = encode()
+    enc = min(timeit.repeat(encode, number=number, repeat=3)) / number
+    dec = min(timeit.repeat(lambda: decode(payload), number=number, repeat=3)) / number
+    size = len(payload["grid"]) if isinstance(payload, dict) else len(payload)
+    print(
+        f"  {label:>14}: {size / 1e6:7.2f} MB, encode {enc * 1e3:8.1f} ms,"
+        f" decode {dec * 1e3:8.1f} ms"
+    )
+
+
+def main():
+    sweep = synthetic_sweep()
+    print("One sweep:")
+    bench(
+        "json",
+        lambda: json.dumps({"reflectivity": sweep.tolist()}),
+        json_grid_to_array,
+    )
+    for encoding in ("float16", "int8"):
+        for compression in ("none", "zstd"):
+            try:
+                bench(
+                    f"{encoding}/{compression}",
+                    lambda e=encoding, c=compression: encode_grid(sweep, e, c),
+                    lambda grid: decode_grid(**grid),
+                )
+            except ImportError:
+                label = f"{encoding}/{compression}"
+                print(f"  {label:>14}: zstandard not installed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Latency of building model inputs from a Level II volume, in memory versus the
+previous pyart -> write_cfradial -> read back round trip. Run from the repo root:
+
+    PYTHONPATH=src python benchmarks/bench_level2_input.py [LEVEL2_FILE]
+
+Without a file a synthetic volume (720 rays x 1832 gates, 14 sweeps) is used, which
+only measures the CF/Radial serialize/deserialize cost, not Level II decoding.
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pyart
+import xarray as xr
+
+from services.model.level2 import LEVEL2_FIELDS, radar_to_sample, read_level2
+
+
+def synthetic_radar(n_rays=720, n_gates=1832, n_sweeps=14):
+    radar = pyart.testing.make_empty_ppi_radar(n_gates, n_rays, n_sweeps)
+    radar.fixed_angle["data"][:] = np.repeat(np.arange(n_sweeps // 2) * 0.8 + 0.5, 2)
+    radar.azimuth["data"][:] = np.tile(np.arange(n_rays) * 360.0 / n_rays, n_sweeps)
+    rng = np.random.default_rng(0)
+    for field in LEVEL2_FIELDS:
+        data = rng.normal(size=(radar.nrays, n_gates)).astype(np.float32)
+        radar.add_field(field, {"data": np.ma.masked_less(data, -1)})
+    return radar
+
+
+def round_trip(radar, nc_file):
+    """What the /model endpoint used to do before the model read the fields back."""
+    pyart.io.write_cfradial(nc_file, radar)
+    with xr.open_dataset(nc_file) as ds:
+        return {v: ds[v].values for v in LEVEL2_FIELDS}
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    nc_file = os.path.join(tempfile.mkdtemp(), "volume.nc")
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+        old = timed(lambda: round_trip(pyart.io.read_nexrad_archive(path), nc_file))
+        new = timed(lambda: read_level2(path))
+    else:
+        radar = synthetic_radar()
+        old = timed(lambda: round_trip(radar, nc_file))
+        new = timed(lambda: radar_to_sample(radar))
+    print(f"CF/Radial round trip: {old * 1e3:8.1f} ms")
+    print(f"In-memory:            {new * 1e3:8.1f} ms")
+    print(f"Saved:                {(old - new) * 1e3:8.1f} ms ({old / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
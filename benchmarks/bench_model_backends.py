@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Load time, resident memory and predict_batch latency of each Model backend
+(keras, onnx, onnx-int8, onnx-fp16) on zero inputs at a few batch sizes. Each
+backend runs in a fresh process so memory isn't shared between them. Needs the
+checkpoint (and keras) to export the ONNX variants on first run. Run from the
+repo root:
+
+    PYTHONPATH=src python benchmarks/bench_model_backends.py [backend ...]
+
+Accuracy parity on TorNet samples is checked separately with
+`python -m services.model.export parity YEAR`.
+"""
+
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+from services.model.export import BACKENDS
+
+BATCH_SIZES = [1, 8, 32]
+REPEATS = 20
+
+
+def measure(backend):
+    from services.model.main import Model
+    from services.model.server import rss_mb
+
+    before = rss_mb()
+    start = time.perf_counter()
+    model = Model(compile_metrics=False, backend=backend)
+    result = {"load_s": time.perf_counter() - start}
+    for batch_size in BATCH_SIZES:
+        model.warmup(batch_size)
+        x = {
+            k: np.zeros((batch_size, *t.shape[1:]), dtype=t.dtype)
+            for k, t in model.model.input.items()
+        }
+        latencies = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            model.predict_batch(x)
+            latencies.append(time.perf_counter() - start)
+        latencies = np.array(latencies) * 1000
+        result[f"b{batch_size}_p50_ms"] = float(np.percentile(latencies, 50))
+        result[f"b{batch_size}_p99_ms"] = float(np.percentile(latencies, 99))
+    result["rss_mb"] = rss_mb() - before
+    return result
+
+
+def main(backends=BACKENDS):
+    context = multiprocessing.get_context("spawn")
+    for backend in backends:
+        with context.Pool(1) as pool:
+            result = pool.apply(measure, (backend,))
+        print(f"{backend:10s}", " ".join(f"{k}={v:.1f}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or BACKENDS)
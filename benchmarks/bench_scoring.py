@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Samples/sec of BatchScorer against reading, stacking and scoring one batch at a
+time on the main thread, over synthetic TorNet-shaped samples (six 120x240x2
+variables plus coordinates) saved as compressed .npz files. A fixed per-sample
+delay stands in for NetCDF I/O latency. Run from the repo root:
+
+    PYTHONPATH=src python benchmarks/bench_scoring.py [n_samples] [workers]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from services.model.batching import stack_samples
+from services.model.scoring import SCORING_WORKERS, BatchScorer
+
+VARIABLES = ["DBZ", "VEL", "KDP", "RHOHV", "ZDR", "WIDTH"]
+IO_DELAY_S = 0.01
+
+
+def write_samples(root, n):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(n):
+        path = os.path.join(root, f"sample_{i}.npz")
+        arrays = {
+            v: np.round(rng.normal(size=(120, 240, 2)), 1).astype(np.float32)
+            for v in VARIABLES
+        }
+        arrays["coordinates"] = rng.normal(size=(120, 240, 2)).astype(np.float32)
+        np.savez_compressed(path, **arrays)
+        paths.append(path)
+    return paths
+
+
+def read_sample(path):
+    time.sleep(IO_DELAY_S)
+    with np.load(path) as f:
+        return {k: f[k] for k in f.files}
+
+
+def predict(x):
+    # Roughly the cost of a small conv net forward pass per sample
+    return np.stack([np.tanh(x[v]).mean(axis=(1, 2, 3)) for v in VARIABLES], axis=1)
+
+
+def sequential(paths, batch_size):
+    for i in range(0, len(paths), batch_size):
+        predict(stack_samples([read_sample(p) for p in paths[i : i + batch_size]]))
+
+
+def main(n=256, workers=SCORING_WORKERS, batch_size=32):
+    with tempfile.TemporaryDirectory() as root:
+        paths = write_samples(root, n)
+
+        start = time.perf_counter()
+        sequential(paths, batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"sequential: {n / elapsed:7.1f} samples/s")
+
+        for w in sorted({1, workers, 2 * workers}):
+            scorer = BatchScorer(
+                predict, read_sample, batch_size=batch_size, workers=w, prefetch=2
+            )
+            for _ in scorer.score(paths):
+                pass
+            stats = scorer.stats()
+            stages = ", ".join(
+                f"{name} p50 {s['p50_ms']:.1f} ms"
+                for name, s in stats["stages"].items()
+            )
+            print(
+                f"  pipeline, {w} workers: {stats['samples_per_s']:7.1f} samples/s"
+                f" ({stages})"
+            )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
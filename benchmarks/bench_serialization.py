@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Serialization throughput of the station endpoints' payloads.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json, as rendered by
+JSONResponse) against FastJSONResponse. Run from the repo root:
+
+    PYTHONPATH=src python benchmarks/bench_serialization.py
+"""
+
+import timeit
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from services.api.responses import JSON_BACKEND, FastJSONResponse
+from services.scans.get_stations import get_nearest_radars
+
+
+def default_render(content):
+    return JSONResponse(content=jsonable_encoder(content)).body
+
+
+def fast_render(content):
+    return FastJSONResponse(content=content).body
+
+
+def bench(name, content, number):
+    print(f"{name}:")
+    for label, render in (("default", default_render), (JSON_BACKEND, fast_render)):
+        seconds = min(
+            timeit.repeat(
+                lambda render=render: render(content), number=number, repeat=5
+            )
+        )
+        size = len(render(content))
+        print(
+            f"  {label:>8}: {number / seconds:10.1f} responses/s"
+            f" ({seconds / number * 1e6:9.1f} us, {size / 1e3:.1f} kB)"
+        )
+
+
+def main():
+    radars = get_nearest_radars(34.0522, -118.2437, output_format="records")
+    bench(f"all stations ({len(radars)} records)", radars, number=2000)
+
+    # A single-sweep reflectivity grid (rays x gates), as scan endpoints would serve it
+    grid = np.random.default_rng(0).uniform(-7.5, 65, size=(720, 1832))
+    bench("reflectivity grid (720 x 1832)", {"reflectivity": grid.tolist()}, number=3)
+
+
+if __name__ == "__main__":
+    main()
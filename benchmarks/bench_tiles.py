@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tile latency while panning and zooming around a stored KDVN-like sweep (720 rays
+x 1832 gates), from several threads at once as the API serves them. Cold is the
+first pass over the tiles (lookup tables and PNGs computed), warm a second pass
+with only the lookup tables cached, and disk a third with the TileCache filled.
+Run from the repo root:
+
+    PYTHONPATH=src python benchmarks/bench_tiles.py
+"""
+
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyart
+
+from services.postgres.query import ScanStore
+from services.postgres.store import radar_scan_row
+from services.scans.tiles import TileCache, TileRenderer, gate_lookup
+
+
+class LocalScan:
+    filename = "KDVN20200810_163012_V06"
+
+
+def synthetic_radar(n_rays=720, n_gates=1832):
+    radar = pyart.testing.make_empty_ppi_radar(n_gates, n_rays, 1)
+    radar.latitude["data"][:] = 41.61
+    radar.longitude["data"][:] = -90.58
+    radar.range["data"] = 2125.0 + 250.0 * np.arange(n_gates, dtype=np.float32)
+    radar.fixed_angle["data"][:] = 0.5
+    rng = np.random.default_rng(0)
+    data = rng.normal(20, 15, size=(n_rays, n_gates)).astype(np.float32)
+    radar.add_field("reflectivity", {"data": np.ma.masked_less(data, 5)})
+    return radar
+
+
+def viewport_tiles(z, lon=-90.58, lat=41.61, span=4):
+    """Tiles of a span x span viewport centered on lon/lat, as a map requests them."""
+    n = 2**z
+    cx = int((lon + 180) / 360 * n)
+    cy = int((1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n)
+    return [
+        (z, x, y)
+        for x in range(cx - span // 2, cx + span // 2)
+        for y in range(cy - span // 2, cy + span // 2)
+    ]
+
+
+def run(renderer, tiles, t, threads):
+    def timed(tile):
+        start = time.perf_counter()
+        renderer.tile("KDVN", t, *tile)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(threads) as pool:
+        latencies = np.array(list(pool.map(timed, tiles))) * 1e3
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main(threads=8):
+    store = ScanStore.sqlite()
+    store.add([radar_scan_row(LocalScan, synthetic_radar(), "KDVN")])
+    t = pd.Timestamp("2020-08-10 16:30:12", tz="UTC")
+    tiles = [tile for z in range(6, 11) for tile in viewport_tiles(z)]
+
+    with tempfile.TemporaryDirectory() as root:
+        renderer = TileRenderer(store, TileCache(root))
+        print(f"{len(tiles)} tiles, zoom 6-10, {threads} threads:")
+        for label in ["cold", "warm", "disk"]:
+            if label == "warm":
+                renderer.cache = None
+            elif label == "disk":
+                renderer.cache = TileCache(root)
+            p50, p99 = run(renderer, tiles, t, threads)
+            print(f"  {label:>5}: p50 {p50:7.2f} ms, p99 {p99:7.2f} ms")
+        gate_lookup.cache_clear()
+
+
+if __name__ == "__main__":
+    main()
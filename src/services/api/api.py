@@ -1,21 +1,39 @@
-# import os
-
-# import numpy as np
-# import pandas as pd
-# import pyart
 # import torch
 # import torchvision.transforms as T
+import asyncio
 import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, status
+import numpy as np
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
+
+from services.api.cache import ResponseCache
+from services.api.responses import (
+    JSON_BACKEND,
+    FastJSONResponse,
+    dumps,
+    scan_binary_frame,
+    scan_ndjson_line,
+)
+from services.model.server import InferenceService, ModelClient, rss_mb
+from services.model.tensor_cache import TENSOR_CACHE_DIR, TensorCache
+from services.postgres.query import STORE_ERRORS, ScanStore
 
-# from services.model.main import Model
 # from services.model.utils import get_pretrained
-# from services.scans.get_scans import download_scans
-from services.scans.get_stations import get_radars
-
-# from services.scans.utils import enforce_dir_size_limit
+from services.scans.availability import ScanAvailabilityIndex
+from services.scans.cache import ScanCache
+from services.scans.downloader import AsyncScanDownloader
+from services.scans.get_stations import (
+    get_nearest_radars,
+    get_radars,
+    iter_radars_batch,
+    load_stations,
+    stations_digest,
+)
+from services.scans.tiles import TILE_CACHE_DIR, TileCache, TileRenderer
 
 # from tornet.tornet.data.loader import TornadoDataLoader, get_dataloader
 # from tornet.tornet.data.preprocess import (
@@ -23,11 +41,60 @@ from services.scans.get_stations import get_radars
 #     remove_time_dim,
 # )
 
+MODEL_ENABLED = os.environ.get("MODEL_ENABLED", "0") == "1"
+DATA_DIR = os.environ.get("SCAN_DIR", "./data/scans")
+
+
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET")
+# Radars whose scan availability is refreshed in the background, e.g. "KDVN,KLOT"
+SCAN_POLL_RADARS = [r for r in os.environ.get("SCAN_POLL_RADARS", "").split(",") if r]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    app.state.inference = None
+    if MODEL_ENABLED:
+        app.state.scan_cache = ScanCache(DATA_DIR)
+        await app.state.scan_cache.start()
+        app.state.downloader = AsyncScanDownloader(
+            max_concurrency=int(os.environ.get("SCAN_DOWNLOAD_CONCURRENCY", "8"))
+        )
+        app.state.availability = ScanAvailabilityIndex(app.state.downloader.source)
+        if SCAN_POLL_RADARS:
+            app.state.availability_poller = asyncio.create_task(
+                app.state.availability.poll(SCAN_POLL_RADARS)
+            )
+        if MODEL_SERVER_SOCKET:
+            # One model server process is shared by all workers
+            app.state.inference = ModelClient(MODEL_SERVER_SOCKET)
+        else:
+            # keras/torch are only installed in images that serve the model
+            from services.model.main import Model
+
+            tensor_cache = TensorCache(TENSOR_CACHE_DIR) if TENSOR_CACHE_DIR else None
+            app.state.inference = InferenceService(
+                Model(compile_metrics=False, tensor_cache=tensor_cache),
+                max_batch_size=int(os.environ.get("MODEL_MAX_BATCH_SIZE", "16")),
+                max_latency_ms=float(os.environ.get("MODEL_MAX_LATENCY_MS", "20")),
+            )
+        await app.state.inference.start()
+    yield
+    if app.state.inference is not None:
+        await app.state.inference.stop()
+    if getattr(app.state, "availability_poller", None) is not None:
+        app.state.availability_poller.cancel()
+    if getattr(app.state, "scan_cache", None) is not None:
+        await app.state.scan_cache.stop()
+
+
 app = FastAPI(
     root_path="/api",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan,
 )
 
 print("INFO:\t API URL:", os.environ.get("VITE_API_URL"))
+print("INFO:\t JSON backend:", JSON_BACKEND)
 if not (os.environ.get("VITE_API_URL") == "https://orion.harville.dev/api"):
     # Production sets CORS in nginx, so we wouldnt set it here again.
     print("\nConfiguring CORS\n")
@@ -40,11 +107,22 @@ if not (os.environ.get("VITE_API_URL") == "https://orion.harville.dev/api"):
     )
 
 
-# model_ = Model()
-# pretrained_model = get_pretrained()
+# Build the station table once per worker instead of on every request
+load_stations()
 
-# DATA_DIR = os.environ.get("SCAN_DIR", "./data/scans")
-# os.makedirs(os.path.join(DATA_DIR, "radar"), exist_ok=True)
+station_cache = ResponseCache(
+    maxsize=int(os.environ.get("STATION_CACHE_SIZE", "4096")),
+    ttl=int(os.environ.get("STATION_CACHE_TTL", "3600")),
+    grid_deg=float(os.environ.get("STATION_CACHE_GRID_DEG", "0.01")),
+)
+
+# Connections are only opened (from the pool) by requests that read radar_scans
+scan_store = ScanStore()
+tile_renderer = TileRenderer(
+    scan_store, TileCache(TILE_CACHE_DIR) if TILE_CACHE_DIR else None
+)
+
+# pretrained_model = get_pretrained()
 
 
 @app.get("/")
@@ -58,58 +136,276 @@ async def healthcheck():
     return {"status": "healthy"}
 
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Returns hit/miss counters for the station response cache"""
+    return station_cache.stats()
+
+
 @app.get("/radars_near/{lat}/{lon}/{radius_km}")
-async def radars_nearby(lat, lon, radius_km):
+async def radars_nearby(request: Request, lat, lon, radius_km):
     """Returns all radars within a specified radius of a given latitude and longitude"""
-    radars = get_radars(
-        float(lat), float(lon), radius_km=int(radius_km), output_format="json"
+    lat, lon = station_cache.quantize(float(lat)), station_cache.quantize(float(lon))
+    radius_km = int(radius_km)
+
+    def compute():
+        radars = get_radars(lat, lon, radius_km=radius_km, output_format="records")
+        if not len(radars):
+            return {"Error": f"Could not find radars within {radius_km}km radius"}, 500
+        return radars
+
+    return station_cache.respond(
+        request, ("radars_near", lat, lon, radius_km), stations_digest(), compute
     )
-    if not len(radars):
-        return {"Error": f"Could not find radars within {radius_km}km radius"}, 500
-    return radars
+
+
+@app.post("/radars_near/batch")
+async def radars_nearby_batch(request: Request, radius_km: float = 100):
+    """
+    Returns radars within radius_km of many points, one NDJSON line per point.
+    The body is either a JSON array of [lat, lon] pairs or, with
+    Content-Type: application/octet-stream, little-endian float64 lat/lon pairs.
+    """
+    try:
+        if request.headers.get("content-type") == "application/octet-stream":
+            points = np.frombuffer(await request.body(), dtype="<f8").reshape(-1, 2)
+        else:
+            points = np.asarray(await request.json(), dtype=np.float64)
+            if points.size and (points.ndim != 2 or points.shape[1] != 2):
+                raise ValueError(f"got shape {points.shape}")
+            points = points.reshape(-1, 2)
+        # Checked before streaming: once the first line is sent the status is 200
+        if not np.isfinite(points).all():
+            raise ValueError("coordinates must be finite numbers")
+        if (np.abs(points[:, 0]) > 90).any() or (np.abs(points[:, 1]) > 180).any():
+            raise ValueError("lat must be within [-90, 90] and lon within [-180, 180]")
+    except (ValueError, TypeError) as e:
+        # e.g. invalid JSON, ragged pairs, or an object instead of an array
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Expected an array of [lat, lon] pairs: {e}",
+        )
+
+    def lines():
+        results = iter_radars_batch(
+            points[:, 0], points[:, 1], radius_km=radius_km, output_format="records"
+        )
+        for (lat, lon), radars in zip(points.tolist(), results):
+            yield dumps({"lat": lat, "lon": lon, "radars": radars}) + b"\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 @app.get("/radars/{lat}/{lon}")
-async def radars(lat, lon):
+async def radars(request: Request, lat, lon):
     """Returns all radars and distances"""
-    radars = get_radars(float(lat), float(lon), radius_km=1000000, output_format="json")
+    lat, lon = station_cache.quantize(float(lat)), station_cache.quantize(float(lon))
+
+    def compute():
+        radars = get_nearest_radars(lat, lon, output_format="records")
+        if not len(radars):
+            return {"Error": "Could not find any radars"}, 500
+        return radars
+
+    return station_cache.respond(
+        request, ("radars", lat, lon), stations_digest(), compute
+    )
+
+
+@app.get("/radars_nearest/{lat}/{lon}/{k}")
+async def radars_nearest(request: Request, lat, lon, k):
+    """Returns the k radars nearest to a given latitude and longitude"""
+    lat, lon = station_cache.quantize(float(lat)), station_cache.quantize(float(lon))
+    k = int(k)
+
+    def compute():
+        radars = get_nearest_radars(lat, lon, k=k, output_format="records")
+        if not len(radars):
+            return {"Error": f"Could not find {k} nearest radars"}, 500
+        return radars
+
+    return station_cache.respond(
+        request, ("radars_nearest", lat, lon, k), stations_digest(), compute
+    )
+
+
+def utc_timestamp(t):
+    t = pd.Timestamp(t)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+
+@app.get("/scans")
+async def scans(
+    radar_id: str | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    bbox: str | None = None,
+    format: str = "ndjson",
+    grids: bool = True,
+):
+    """
+    Streams stored scans matching the filters, oldest first: one NDJSON line per
+    scan (format=ndjson) or length-prefixed binary frames (format=binary). bbox is
+    "min_lon,max_lon,min_lat,max_lat"; start/end are ISO timestamps (UTC if naive).
+    Grids are sent as stored, see services.postgres.grid.decode_grid.
+    """
+    encoders = {
+        "ndjson": (scan_ndjson_line, "application/x-ndjson"),
+        "binary": (scan_binary_frame, "application/octet-stream"),
+    }
+    try:
+        encode, media_type = encoders[format]
+        t0, t1 = (None if t is None else utc_timestamp(t) for t in (start, end))
+        if bbox is not None:
+            bbox = tuple(float(v) for v in bbox.split(","))
+            if len(bbox) != 4:
+                raise ValueError("bbox needs 4 values")
+    except (KeyError, ValueError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid query: {e}"
+        )
+
+    refs = scan_store.iter_scans(
+        radar_id=radar_id, t0=t0, t1=t1, bbox=bbox, with_grid=grids
+    )
+    try:
+        # Runs the query before the response starts, so failures get a status code
+        first = await asyncio.to_thread(next, refs, None)
+    except STORE_ERRORS as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Could not query scans: {e}",
+        )
+
+    def frames():
+        if first is None:
+            return
+        yield encode(first, grids)
+        for ref in refs:
+            yield encode(ref, grids)
+
+    return StreamingResponse(frames(), media_type=media_type)
+
+
+@app.get("/tiles/stats")
+async def tile_stats():
+    return tile_renderer.stats()
+
+
+@app.get("/tiles/{radar_id}/latest")
+async def latest_tiles(radar_id: str):
+    """Returns the latest stored scan of a radar and the URL template of its tiles"""
+    try:
+        ref = await asyncio.to_thread(scan_store.latest, radar_id)
+    except STORE_ERRORS as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Could not query scans: {e}",
+        )
+    if ref is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No stored scans for {radar_id}",
+        )
+    scan_time = f"{ref.scan_time:%Y%m%dT%H%M%S}"
+    return {
+        "radar_id": radar_id,
+        "scan_time": ref.scan_time.isoformat(),
+        "bbox": list(ref.bbox),
+        "tiles": f"/tiles/{radar_id}/{scan_time}/{{z}}/{{x}}/{{y}}.png",
+    }
+
+
+@app.get("/tiles/{radar_id}/{scan_time}/{z}/{x}/{y}.png")
+async def tile(radar_id: str, scan_time: str, z: int, x: int, y: int):
+    """
+    Returns XYZ (Web Mercator) tile z/x/y of a stored scan's reflectivity as a PNG.
+    scan_time is e.g. 20200810T163012; tiles of a scan never change.
+    """
+    try:
+        scan_time = utc_timestamp(scan_time)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not (0 <= z <= 18 and 0 <= x < 2**z and 0 <= y < 2**z):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid tile"
+        )
+
+    try:
+        png = await asyncio.to_thread(tile_renderer.tile, radar_id, scan_time, z, x, y)
+    except STORE_ERRORS as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Could not query scans: {e}",
+        )
+    if png is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No tiled scan of {radar_id} at {scan_time}",
+        )
+    return Response(
+        png,
+        media_type="image/png",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@app.get("/model/{lat}/{lon}/{timestamp}")
+async def model(request: Request, lat, lon, timestamp: str):
+    """Returns the tornado probability for the nearest radar's scan at a timestamp"""
+    engine = request.app.state.inference
+    if engine is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model serving is not enabled",
+        )
+
+    radars = get_radars(float(lat), float(lon), radius_km=200)
     if not len(radars):
-        return {"Error": "Could not find any radars"}, 500
-    return radars
-
-
-# @app.get("/model/{lat}/{lon}/{timestamp}")
-# async def model(lat, lon, timestamp: str):
-#     radars = get_nearby_radars(float(lat), float(lon), radius_km=200)
-#     if not len(radars):
-#         return {"Error": "No radars in 200km range"}, 500
-#     else:
-#         nearest_radar = radars[0]
-#         nearest_radar = "KDVN"
-
-#     timestamp = pd.Timestamp(*map(int, timestamp.split("-"))).tz_localize("UTC")
-#     scans = download_scans(nearest_radar, timestamp, DATA_DIR, scan_count=1)
-#     if not scans.success_count:
-#         return {"Error": f"{nearest_radar} has 0 scans currently available."}, 500
-
-#     files = [
-#         os.path.join(DATA_DIR, f)
-#         for f in os.listdir(DATA_DIR)
-#         if os.path.isfile(os.path.join(DATA_DIR, f)) and f not in ["radar", ".gitkeep"]
-#     ]
-#     print(f"{files=}")
-#     latest_scan = max(files, key=os.path.getmtime)
-#     print(f"{latest_scan=}")
-
-#     radar = pyart.io.read_nexrad_archive(latest_scan)
-#     nc_file = f"{DATA_DIR}/radar/{os.path.basename(latest_scan)}.nc"
-#     pyart.io.write_cfradial(nc_file, radar)
-
-#     tornado_probability = model_.predict(nc_file)
-
-#     enforce_dir_size_limit(DATA_DIR, max_size_bytes=3 * 1024 * 1024 * 1024)
-
-#     return {"probability": tornado_probability}
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="No radars in 200km range",
+        )
+    nearest_radar = radars[0]
+
+    timestamp = pd.Timestamp(*map(int, timestamp.split("-"))).tz_localize("UTC")
+    key = await request.app.state.availability.latest_before(nearest_radar, timestamp)
+    if key is None:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"{nearest_radar} has 0 scans currently available.",
+        )
+
+    scan_cache = request.app.state.scan_cache
+    name = os.path.basename(key)
+    # Pinned so the eviction task can't delete the scan while it is being scored;
+    # the flock and index updates block, so they run off the event loop
+    async with scan_cache.pin_async(name):
+        latest_scan = await asyncio.to_thread(scan_cache.get, name)
+        if latest_scan is None:
+            path = await request.app.state.downloader.download(key, DATA_DIR)
+            latest_scan = await asyncio.to_thread(scan_cache.add, path)
+
+        # The Level II archive is scored directly; no CF/Radial file is written
+        tornado_probability = await engine.predict_file(latest_scan)
+
+    return {"probability": tornado_probability}
+
+
+@app.get("/model/stats")
+async def model_stats(request: Request):
+    """Returns inference batch counters, model process memory and this worker's RSS"""
+    engine = request.app.state.inference
+    if engine is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Model serving is not enabled",
+        )
+    return {
+        "model": await engine.stats(),
+        "worker": {"pid": os.getpid(), "rss_mb": rss_mb()},
+        "scan_cache": request.app.state.scan_cache.stats(),
+    }
 
 
 # def filter_numeric(data):
@@ -0,0 +1,108 @@
+import hashlib
+import time
+from collections import OrderedDict
+
+from fastapi import Response, status
+
+from services.api.responses import dumps
+
+
+class ResponseCache:
+    """
+    In-process LRU of serialized JSON responses with a TTL.
+
+    Coordinates are quantized to a grid of grid_deg degrees before being used as keys
+    (and before the response is computed), so nearby requests share an entry. Every
+    response carries a strong ETag derived from the data version and key, and requests
+    whose If-None-Match matches are answered with 304 Not Modified.
+    """
+
+    def __init__(self, maxsize=4096, ttl=3600, grid_deg=0.01):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.grid_deg = grid_deg
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._entries = OrderedDict()
+
+    def quantize(self, value):
+        if not self.grid_deg:
+            return value
+        return round(round(value / self.grid_deg) * self.grid_deg, 6)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, body = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def set(self, key, body):
+        self._entries[key] = (time.monotonic() + self.ttl, body)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "grid_deg": self.grid_deg,
+        }
+
+    @staticmethod
+    def etag_matches(etag, if_none_match):
+        """
+        True if an If-None-Match header lists etag (weak comparison) or is "*".
+        """
+        tags = [t.strip() for t in if_none_match.split(",")]
+        return "*" in tags or any(t.removeprefix("W/") == etag for t in tags)
+
+    def respond(self, request, key, version, compute):
+        """
+        Returns a cached response for key, calling compute() on a miss.
+        version identifies the underlying data (e.g. the station CSV hash).
+        compute() may return (content, status_code) for an error, which is sent
+        with that status and neither cached nor given an ETag.
+        """
+        digest = hashlib.sha256(f"{version}:{key!r}".encode()).hexdigest()[:32]
+        headers = {
+            "ETag": f'"{digest}"',
+            "Cache-Control": f"public, max-age={self.ttl}",
+        }
+
+        if self.etag_matches(headers["ETag"], request.headers.get("if-none-match", "")):
+            self.not_modified += 1
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        body = self.get((version, key))
+        if body is None:
+            self.misses += 1
+            result = compute()
+            if isinstance(result, tuple):
+                content, status_code = result
+                return Response(
+                    content=dumps(content),
+                    status_code=status_code,
+                    media_type="application/json",
+                    headers={"Cache-Control": "no-store"},
+                )
+            body = dumps(result)
+            self.set((version, key), body)
+        else:
+            self.hits += 1
+        return Response(content=body, media_type="application/json", headers=headers)
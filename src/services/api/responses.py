@@ -0,0 +1,106 @@
+import base64
+import dataclasses
+import json
+import struct
+
+import numpy as np
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def enc_hook(obj):
+    """
+    Numpy values and record dataclasses (e.g. RadarRecord), for the encoders that
+    don't serialize them natively.
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    raise TypeError(f"Can't serialize {type(obj).__name__} to JSON")
+
+
+if orjson is not None:
+    JSON_BACKEND = "orjson"
+
+    def dumps(content):
+        return orjson.dumps(
+            content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        )
+
+elif msgspec is not None:
+    JSON_BACKEND = "msgspec"
+    dumps = msgspec.json.Encoder(enc_hook=enc_hook).encode
+
+else:
+    JSON_BACKEND = "json"
+
+    def dumps(content):
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+            default=enc_hook,
+        ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson/msgspec when installed, else stdlib json."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def scan_header(ref, with_grid=True):
+    """JSON-ready metadata of a streamed ScanRef, including how its grid is stored."""
+    header = {
+        "id": ref.id,
+        "radar_id": ref.radar_id,
+        "scan_time": ref.scan_time.isoformat(),
+        "bbox": list(ref.bbox),
+    }
+    if with_grid and ref.payload is not None and ref.payload[0] is not None:
+        grid, shape, dtype, scale, offset, codec = ref.payload
+        if isinstance(shape, str):
+            shape = json.loads(shape)
+        header["grid"] = {
+            "shape": list(shape),
+            "dtype": dtype,
+            "scale": scale,
+            "offset": offset,
+            "codec": codec,
+            "nbytes": len(grid),
+        }
+    return header
+
+
+def scan_ndjson_line(ref, with_grid=True):
+    """One NDJSON line per scan, with the stored grid bytes base64 encoded."""
+    header = scan_header(ref, with_grid)
+    if "grid" in header:
+        header["grid"]["data"] = base64.b64encode(ref.payload[0]).decode("ascii")
+    return dumps(header) + b"\n"
+
+
+def scan_binary_frame(ref, with_grid=True):
+    """
+    One binary frame per scan: a little-endian uint32 header length, the JSON
+    header, then header["grid"]["nbytes"] bytes of stored grid (see decode_grid).
+    """
+    header = dumps(scan_header(ref, with_grid))
+    frame = struct.pack("<I", len(header)) + header
+    if with_grid and ref.payload is not None and ref.payload[0] is not None:
+        frame += bytes(ref.payload[0])
+    return frame
@@ -0,0 +1,108 @@
+import asyncio
+
+import numpy as np
+
+
+def stack_samples(samples):
+    """
+    Stacks preprocessed samples into one batch along a new leading axis.
+    Dict samples are stacked per key, dropping entries that are not arrays/tensors.
+    """
+    if isinstance(samples[0], dict):
+        return {
+            k: np.stack([np.asarray(s[k]) for s in samples])
+            for k, v in samples[0].items()
+            if hasattr(v, "shape")
+        }
+    return np.stack([np.asarray(s) for s in samples])
+
+
+class BatchingEngine:
+    """
+    Dynamic request batching around a blocking batch predict function.
+
+    Callers await `predict(sample)`; a background task collects queued samples until
+    max_batch_size are waiting or max_latency_ms has passed since the first one,
+    runs predict_fn once on the stacked batch in a worker thread and resolves each
+    caller with its own row of the output.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_latency_ms=20):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.batches = 0
+        self.samples = 0
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def predict(self, sample):
+        if self._task is None:
+            raise RuntimeError("BatchingEngine.start() has not been called")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sample, future))
+        return await future
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "samples": self.samples,
+            "mean_batch_size": self.samples / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_latency_ms": self.max_latency * 1000,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except TimeoutError:
+                    break
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch):
+        # Callers that gave up (e.g. client disconnects) don't need a forward pass
+        batch = [(sample, future) for sample, future in batch if not future.done()]
+        if not batch:
+            return
+        samples, futures = zip(*batch)
+        try:
+            outputs = await asyncio.to_thread(self.predict_fn, stack_samples(samples))
+        except Exception as e:  # noqa: BLE001 - any model error goes to every caller
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.samples += len(samples)
+        for future, output in zip(futures, outputs):
+            if not future.done():
+                future.set_result(output)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Indexed TorNet catalog.
+
+catalog.csv is converted once into catalog.parquet next to it, with typed
+columns, a year column and rows sorted by (year, type, radar, start_time) in row
+groups of CATALOG_ROW_GROUP_SIZE. The min/max statistics Parquet keeps per row
+group then act as an index on year, type, radar and ef_number: queries read only
+the row groups whose ranges can match and filter those rows exactly.
+
+    python -m services.model.catalog [TORNET_ROOT]
+
+(re)builds the Parquet catalog.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+TORNET_ROOT = os.environ.get("TORNET_ROOT", "data/TorNet/")
+CATALOG_ROW_GROUP_SIZE = int(os.environ.get("CATALOG_ROW_GROUP_SIZE", "4096"))
+CATALOG_SORT = ["year", "type", "radar", "start_time"]
+
+
+def build_catalog(csv_path, parquet_path, row_group_size=CATALOG_ROW_GROUP_SIZE):
+    """Converts a TorNet catalog.csv into the sorted, typed Parquet catalog."""
+    catalog = pd.read_csv(csv_path, parse_dates=["start_time", "end_time"])
+    catalog["year"] = catalog.start_time.dt.year.astype(np.int16)
+    # TorNet rates non-tornadic samples -1; treat missing ratings the same way
+    catalog["ef_number"] = catalog.ef_number.fillna(-1).astype(np.int8)
+    catalog = catalog.sort_values(CATALOG_SORT, kind="stable", ignore_index=True)
+    tmp = f"{parquet_path}.{os.getpid()}.tmp"
+    catalog.to_parquet(tmp, index=False, row_group_size=row_group_size)
+    os.replace(tmp, parquet_path)
+    print(f"Indexed {len(catalog)} samples into {parquet_path}")
+
+
+def _as_set(values):
+    if values is None:
+        return None
+    if isinstance(values, (str, int, np.integer)):
+        return {values}
+    return set(values)
+
+
+class Catalog:
+    """
+    Query API over the TorNet catalog under root. catalog.parquet is built from
+    catalog.csv on first use, and rebuilt when the CSV is newer.
+    """
+
+    def __init__(self, root=TORNET_ROOT, row_group_size=CATALOG_ROW_GROUP_SIZE):
+        import pyarrow.parquet as pq
+
+        self.root = root
+        csv_path = os.path.join(root, "catalog.csv")
+        self.path = os.path.join(root, "catalog.parquet")
+        if not os.path.exists(self.path) or (
+            os.path.exists(csv_path)
+            and os.path.getmtime(csv_path) > os.path.getmtime(self.path)
+        ):
+            build_catalog(csv_path, self.path, row_group_size)
+        self.file = pq.ParquetFile(self.path)
+        self.columns = self.file.schema_arrow.names
+        self._stats = self._load_stats()
+
+    def _load_stats(self):
+        """Per row group {column: (min, max)} for the indexed columns."""
+        indexed = ["year", "type", "radar", "ef_number"]
+        positions = {self.columns.index(c): c for c in indexed if c in self.columns}
+        stats = []
+        metadata = self.file.metadata
+        for i in range(metadata.num_row_groups):
+            group = metadata.row_group(i)
+            ranges = {}
+            for position, column in positions.items():
+                s = group.column(position).statistics
+                if s is not None and s.has_min_max:
+                    ranges[column] = (s.min, s.max)
+            stats.append(ranges)
+        return stats
+
+    @staticmethod
+    def _predicates(years, types, radars, min_ef, max_ef):
+        """(column, test on a value, test on a (min, max) range) per given filter."""
+        predicates = []
+        for column, values in [("year", years), ("type", types), ("radar", radars)]:
+            values = _as_set(values)
+            if values is not None:
+                predicates.append(
+                    (
+                        column,
+                        lambda s, values=values: s.isin(values),
+                        lambda lo, hi, values=values: any(
+                            lo <= v <= hi for v in values
+                        ),
+                    )
+                )
+        if min_ef is not None:
+            predicates.append(
+                ("ef_number", lambda s: s >= min_ef, lambda lo, hi: hi >= min_ef)
+            )
+        if max_ef is not None:
+            predicates.append(
+                ("ef_number", lambda s: s <= max_ef, lambda lo, hi: lo <= max_ef)
+            )
+        return predicates
+
+    def row_groups(self, years=None, types=None, radars=None, min_ef=None, max_ef=None):
+        """Indices of the row groups that may hold rows matching the filters."""
+        predicates = self._predicates(years, types, radars, min_ef, max_ef)
+        return [
+            i
+            for i, ranges in enumerate(self._stats)
+            if all(
+                column not in ranges or overlaps(*ranges[column])
+                for column, _, overlaps in predicates
+            )
+        ]
+
+    def query(
+        self,
+        years=None,
+        types=None,
+        radars=None,
+        min_ef=None,
+        max_ef=None,
+        columns=None,
+    ):
+        """
+        Catalog rows matching every given filter (years, types and radars may be
+        single values or collections), with a "path" column of the sample's file
+        under root. columns limits the metadata read besides filename.
+        """
+        predicates = self._predicates(years, types, radars, min_ef, max_ef)
+        groups = self.row_groups(years, types, radars, min_ef, max_ef)
+        if columns is not None:
+            columns = list(
+                dict.fromkeys(["filename", *columns, *(c for c, _, _ in predicates)])
+            )
+        table = self.file.read_row_groups(groups, columns=columns)
+        frame = table.to_pandas()
+        if predicates:
+            keep = np.ones(len(frame), dtype=bool)
+            for column, matches, _ in predicates:
+                keep &= matches(frame[column]).to_numpy()
+            frame = frame[keep].reset_index(drop=True)
+        frame["path"] = [os.path.join(self.root, f) for f in frame.filename]
+        return frame
+
+    def files(self, **filters):
+        """Paths of the samples matching query filters."""
+        return self.query(columns=[], **filters).path.tolist()
+
+
+def main():
+    root = sys.argv[1] if len(sys.argv) > 1 else TORNET_ROOT
+    build_catalog(
+        os.path.join(root, "catalog.csv"), os.path.join(root, "catalog.parquet")
+    )
+
+
+if __name__ == "__main__":
+    main()
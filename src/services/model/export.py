@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+CPU inference artifacts for the baseline checkpoint.
+
+The Keras checkpoint is exported once to ONNX, optionally quantized, and run with
+ONNX Runtime (graph optimizations on, CPU provider) instead of the eager Keras
+graph. Model picks one with MODEL_BACKEND:
+
+    keras       tornado_detector_baseline.keras (default)
+    onnx        the exported float32 graph
+    onnx-int8   dynamic int8 quantization (int8 weights, activations quantized
+                per batch at run time)
+    onnx-fp16   float16 weights and activations, float32 inputs and outputs
+
+    python -m services.model.export
+    python -m services.model.export parity 2018 [n_samples]
+
+The first writes every variant to MODEL_EXPORT_DIR. The second scores n_samples
+TorNet test samples of a year with each backend and prints the build_metrics
+results (AUC, F1, ...), agreement with the Keras model, predict latency and
+memory, so a quantized variant can be checked before it is deployed.
+"""
+
+import fcntl
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+MODEL_BACKEND = os.environ.get("MODEL_BACKEND", "keras")
+MODEL_EXPORT_DIR = os.environ.get("MODEL_EXPORT_DIR", "data/checkpoints")
+# ONNX Runtime intra-op threads; 0 lets it use every core
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))
+BACKENDS = ["keras", "onnx", "onnx-int8", "onnx-fp16"]
+
+ONNX_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+    "tensor(int64)": np.int64,
+    "tensor(int32)": np.int32,
+}
+
+
+def export_path(backend, root=MODEL_EXPORT_DIR):
+    return os.path.join(root, f"tornado_detector_baseline.{backend}.onnx")
+
+
+def quantize_int8(src, dst):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(src, dst, weight_type=QuantType.QInt8)
+
+
+def convert_fp16(src, dst):
+    import onnx
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    # Inputs and outputs stay float32, so callers don't change
+    onnx.save(convert_float_to_float16(onnx.load(src), keep_io_types=True), dst)
+
+
+VARIANTS = {"onnx-int8": quantize_int8, "onnx-fp16": convert_fp16}
+
+
+def write_atomic(path, write):
+    """Runs write(tmp) and moves tmp to path, so path is never seen half written."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.onnx"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def export(backends=BACKENDS[1:], keras_model=None, root=MODEL_EXPORT_DIR, force=True):
+    """
+    Writes the ONNX variants in backends (exporting the float32 graph first if it
+    isn't there yet) and returns their paths. Variants that already exist are
+    only rewritten if force. Exports hold a lock on root, so concurrent processes
+    don't export the same file twice.
+    """
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, ".export.lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        source = export_path("onnx", root)
+        if not os.path.exists(source):
+            if keras_model is None:
+                from services.model.main import load_checkpoint
+
+                keras_model = load_checkpoint()
+            # Keras traces the model with its own backend (torch here) into ONNX
+            write_atomic(source, lambda tmp: keras_model.export(tmp, format="onnx"))
+            print(f"Exported {source}")
+        paths = {"onnx": source}
+        for backend in backends:
+            if backend not in VARIANTS:
+                continue
+            paths[backend] = export_path(backend, root)
+            if force or not os.path.exists(paths[backend]):
+                write_atomic(
+                    paths[backend], lambda tmp, b=backend: VARIANTS[b](source, tmp)
+                )
+                print(f"Wrote {paths[backend]}")
+    return paths
+
+
+class InputSpec:
+    """Shape (None for dynamic axes) and dtype of one graph input."""
+
+    def __init__(self, shape, dtype):
+        self.shape = shape
+        self.dtype = dtype
+
+
+class OnnxModel:
+    """
+    An exported graph run with ONNX Runtime, exposing the parts of keras.Model that
+    Model uses: input (name -> InputSpec), predict and predict_on_batch.
+    """
+
+    def __init__(self, path, threads=ONNX_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.path = path
+        self.session = ort.InferenceSession(
+            path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input = {
+            i.name: InputSpec(
+                tuple(d if isinstance(d, int) else None for d in i.shape),
+                ONNX_DTYPES[i.type],
+            )
+            for i in self.session.get_inputs()
+        }
+
+    def predict_on_batch(self, x):
+        feed = {
+            name: np.ascontiguousarray(np.asarray(x[name]), dtype=spec.dtype)
+            for name, spec in self.input.items()
+        }
+        return self.session.run(None, feed)[0]
+
+    def predict(self, x):
+        return self.predict_on_batch(x)
+
+
+def load_backend(backend=MODEL_BACKEND, root=MODEL_EXPORT_DIR):
+    """
+    The model object for a backend; ONNX variants are exported on first use (once,
+    however many processes load the backend at the same time).
+    """
+    if backend == "keras":
+        from services.model.main import load_checkpoint
+
+        return load_checkpoint()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {backend}")
+    path = export_path(backend, root)
+    if not os.path.exists(path):
+        export([backend], root=root, force=False)
+    return OnnxModel(path)
+
+
+def evaluate(model, files, batch_size=32):
+    """
+    Scores TorNet files with a Model through BatchScorer. Returns the per-sample
+    scores and the build_metrics results, throughput and predict latency.
+    """
+    import keras
+
+    from services.model.main import build_metrics
+    from services.model.scoring import BatchScorer
+
+    labels = []
+
+    def predict(x):
+        label = np.asarray(x["label"])
+        labels.append(label.reshape(len(label), -1)[:, -1].copy())
+        return model.predict_batch({k: v for k, v in x.items() if k != "label"})
+
+    scorer = BatchScorer(
+        predict, batch_size=batch_size, keys=[*model.model.input, "label"]
+    )
+    scores = scorer.score_all(files)
+    y_true = np.concatenate(labels).astype(np.float32)
+    y_pred = scores.output.to_numpy()
+    valid = ~np.isnan(y_pred)
+    results = {}
+    for metric in build_metrics():
+        metric.update_state(y_true[valid, None], y_pred[valid, None])
+        results[metric.name] = float(keras.ops.convert_to_numpy(metric.result()))
+    stats = scorer.stats()
+    results["samples_per_s"] = stats["samples_per_s"]
+    results["predict_p50_ms"] = stats["stages"]["predict"]["p50_ms"]
+    results["predict_p95_ms"] = stats["stages"]["predict"]["p95_ms"]
+    return scores, results
+
+
+def parity(year, n_samples=None, backends=BACKENDS):
+    """
+    build_metrics results, latency and memory of each backend on the TorNet test
+    samples of year, and how far each backend's logits are from the Keras model's.
+    """
+    from services.model.catalog import TORNET_ROOT, Catalog
+    from services.model.main import Model
+    from services.model.server import rss_mb
+
+    files = Catalog(TORNET_ROOT).files(years=int(year), types="test")
+    files = files[: int(n_samples)] if n_samples else files
+    report, reference = {}, None
+    for backend in backends:
+        before = rss_mb()
+        start = time.perf_counter()
+        model = Model(compile_metrics=False, backend=backend)
+        load_s = time.perf_counter() - start
+        model.warmup()
+        loaded_mb = rss_mb() - before
+        scores, results = evaluate(model, files)
+        logits = scores.output.to_numpy()
+        if reference is None:
+            reference = logits
+        results["max_abs_logit_diff"] = float(np.nanmax(np.abs(logits - reference)))
+        results["agreement"] = float(np.nanmean((logits > 0) == (reference > 0)))
+        results["load_s"] = load_s
+        results["rss_delta_mb"] = loaded_mb
+        report[backend] = results
+        print(backend, {k: round(v, 4) for k, v in results.items()})
+        del model
+    return report
+
+
+def main(args):
+    if args and args[0] == "parity":
+        parity(*args[1:])
+    else:
+        export(args or BACKENDS[1:])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,176 @@
+import os
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+# Frames per model input; the shipped checkpoint is single-frame
+MODEL_N_FRAMES = int(os.environ.get("MODEL_N_FRAMES", "1"))
+# A radar that skips more than this between volumes starts a new sequence
+FRAME_MAX_GAP_S = int(os.environ.get("FRAME_MAX_GAP_S", "1200"))
+FRAME_MAX_RADARS = int(os.environ.get("FRAME_MAX_RADARS", "256"))
+
+
+def default_reader(path):
+    from services.model.main import preprocess_file
+
+    return preprocess_file(path)
+
+
+class FrameBuffer:
+    """
+    The last n_frames preprocessed (post-TRANSFORM) samples of one radar, in
+    preallocated arrays.
+
+    Entries in frame_keys (every array entry if None) are kept per frame; other
+    entries are taken from the newest frame. Each frame is written twice, at i and
+    i + n_frames of a 2 * n_frames ring, so the newest n_frames are always one
+    contiguous slice: push and window are O(1) whatever n_frames is.
+    """
+
+    def __init__(self, n_frames, frame_keys=None):
+        self.n_frames = n_frames
+        self.frame_keys = frame_keys
+        self.frames = {}
+        self.static = {}
+        self.times = deque(maxlen=n_frames)
+        self.count = 0
+        self.lock = threading.Lock()
+        self._next = 0
+
+    def _keys(self, sample):
+        if self.frame_keys is None:
+            return [k for k, v in sample.items() if hasattr(v, "shape")]
+        return [k for k in self.frame_keys if k in sample]
+
+    def _allocate(self, sample, keys):
+        self.frames = {
+            k: np.empty(
+                (2 * self.n_frames, *np.shape(sample[k])),
+                np.asarray(sample[k]).dtype,
+            )
+            for k in keys
+        }
+
+    def reset(self):
+        self.count = 0
+        self._next = 0
+        self.times.clear()
+
+    def push(self, sample, scan_time=None):
+        """
+        Adds the newest frame. The first frame after a reset fills every slot, so
+        a window is available right away, with the oldest frames repeated.
+        """
+        keys = self._keys(sample)
+        if list(self.frames) != keys or any(
+            self.frames[k].shape[1:] != np.shape(sample[k]) for k in keys
+        ):
+            self._allocate(sample, keys)
+            self.reset()
+        if self.count == 0:
+            for k, a in self.frames.items():
+                a[...] = np.asarray(sample[k])
+        else:
+            i = self._next
+            for k, a in self.frames.items():
+                a[i] = a[i + self.n_frames] = np.asarray(sample[k])
+        self.static = {k: v for k, v in sample.items() if k not in self.frames}
+        self._next = (self._next + 1) % self.n_frames
+        self.count = min(self.count + 1, self.n_frames)
+        self.times.append(scan_time)
+
+    @property
+    def ready(self):
+        """True once n_frames real frames (no repeats) are buffered."""
+        return self.count == self.n_frames
+
+    def window(self, copy=False):
+        """
+        Sample dict of model inputs: frame entries are (n_frames, ...) arrays,
+        oldest first, or with n_frames=1 the newest frame as is. Unless copy is
+        True they are views, only valid until the next push.
+        """
+        start = self._next
+        if self.n_frames == 1:
+            frames = {k: a[start] for k, a in self.frames.items()}
+        else:
+            frames = {
+                k: a[start : start + self.n_frames] for k, a in self.frames.items()
+            }
+        return {
+            **self.static,
+            **{k: np.array(a, copy=copy) for k, a in frames.items()},
+        }
+
+
+class FrameStore:
+    """
+    FrameBuffers for many radars (the last max_radars used), fed one volume at a
+    time: each volume is read and preprocessed once, by reader(path), and older
+    frames are reused from the buffer instead of being read and transformed again.
+    """
+
+    def __init__(
+        self,
+        n_frames=MODEL_N_FRAMES,
+        reader=default_reader,
+        keys=None,
+        max_gap_s=FRAME_MAX_GAP_S,
+        max_radars=FRAME_MAX_RADARS,
+    ):
+        self.n_frames = n_frames
+        self.reader = reader
+        self.keys = keys
+        self.max_gap = pd.Timedelta(seconds=max_gap_s)
+        self.max_radars = max_radars
+        self.reads = 0
+        self._lock = threading.Lock()
+        self._buffers = OrderedDict()
+
+    def _buffer(self, radar_id):
+        with self._lock:
+            buffer = self._buffers.get(radar_id)
+            if buffer is None:
+                buffer = self._buffers[radar_id] = FrameBuffer(self.n_frames, self.keys)
+            self._buffers.move_to_end(radar_id)
+            while len(self._buffers) > self.max_radars:
+                self._buffers.popitem(last=False)
+        return buffer
+
+    def update(self, radar_id, path, scan_time):
+        """
+        Pushes a new volume of radar_id and returns a copy of its window (see
+        FrameBuffer.window), so other threads can keep pushing. The last volume
+        isn't read again; one after a gap longer than max_gap_s starts a new
+        sequence. An older volume (e.g. a past scan) is read into a window of its
+        own, leaving the radar's buffer as it is.
+        """
+        buffer = self._buffer(radar_id)
+        scan_time = pd.Timestamp(scan_time)
+        with buffer.lock:
+            last = buffer.times[-1] if buffer.times else None
+            if last is not None and scan_time == last:
+                return buffer.window(copy=True)
+            sample = self.reader(path)
+            self.reads += 1
+            if last is not None and scan_time < last:
+                past = FrameBuffer(self.n_frames, self.keys)
+                past.push(sample, scan_time)
+                return past.window(copy=True)
+            if last is not None and scan_time - last > self.max_gap:
+                buffer.reset()
+            buffer.push(sample, scan_time)
+            return buffer.window(copy=True)
+
+    def get(self, radar_id):
+        """The FrameBuffer of radar_id, or None."""
+        return self._buffers.get(radar_id)
+
+    def stats(self):
+        return {
+            "radars": len(self._buffers),
+            "reads": self.reads,
+            "n_frames": self.n_frames,
+        }
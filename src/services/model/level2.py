@@ -0,0 +1,101 @@
+import io
+
+import numpy as np
+
+from services.scans.geometry import regrid_azimuth
+
+# Fields read by Model.preprocess, using Py-ART's names for the Level II moments
+LEVEL2_FIELDS = [
+    "reflectivity",
+    "velocity",
+    "differential_phase",
+    "cross_correlation_ratio",
+    "differential_reflectivity",
+    "spectrum_width",
+]
+# Split cuts put the two lowest tilts in the first four scans of every VCP
+LEVEL2_SCANS = [0, 1, 2, 3]
+
+
+def is_netcdf(file_path):
+    """True for NetCDF3/NetCDF4 files, False for e.g. NEXRAD Level II archives."""
+    with open(file_path, "rb") as f:
+        magic = f.read(4)
+    return magic[:3] == b"CDF" or magic == b"\x89HDF"
+
+
+def read_level2(source, variables=LEVEL2_FIELDS, scans=LEVEL2_SCANS, **kwargs):
+    """
+    Reads model input arrays straight from a Level II archive (path or raw bytes).
+    Only the requested fields and scans are decoded; see radar_to_sample for kwargs.
+    """
+    import pyart
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    radar = pyart.io.read_nexrad_archive(
+        source, include_fields=list(variables), scans=list(scans)
+    )
+    return radar_to_sample(radar, variables=variables, **kwargs)
+
+
+def select_sweeps(radar, field, n_sweeps=2):
+    """
+    Indices of the sweeps holding field at the n_sweeps lowest elevations. Split cuts
+    scan a tilt twice (surveillance, then Doppler), so the sweep where the field has
+    the most valid gates is used for each tilt.
+    """
+    angles = np.round(radar.fixed_angle["data"], 1)
+    data = radar.fields[field]["data"]
+    sweeps = []
+    for angle in np.unique(angles)[:n_sweeps]:
+        candidates = np.flatnonzero(angles == angle)
+        sweeps.append(
+            max(candidates, key=lambda s: np.ma.count(data[radar.get_slice(s)]))
+        )
+    return sweeps
+
+
+def sweep_to_grid(radar, field, sweep, n_azimuth=720, n_gates=None):
+    """
+    One sweep of field on a uniform azimuth grid (nearest ray), as float32 with
+    masked gates set to NaN. Shape is (n_azimuth, n_gates).
+    """
+    rays = radar.get_slice(sweep)
+    azimuth = radar.azimuth["data"][rays]
+    data = np.ma.filled(
+        radar.fields[field]["data"][rays, :n_gates].astype(np.float32), np.nan
+    )
+    return regrid_azimuth(data, azimuth, n_azimuth)
+
+
+def radar_to_sample(
+    radar, variables=LEVEL2_FIELDS, n_sweeps=2, n_azimuth=720, n_gates=None
+):
+    """
+    Builds the dict tornet's read_file(..., tilt_last=True, n_frames=1) returns from
+    an in-memory pyart Radar: each variable is (1, n_azimuth, n_gates, n_sweeps)
+    from the lowest tilts, plus the mask and coordinate limits used by
+    add_coordinates. Level II doesn't flag range folding separately, so
+    range_folded_mask is all zeros.
+    """
+    n_gates = n_gates or radar.ngates
+    sample = {}
+    for v in variables:
+        sweeps = select_sweeps(radar, v, n_sweeps)
+        sample[v] = np.stack(
+            [sweep_to_grid(radar, v, s, n_azimuth, n_gates) for s in sweeps],
+            axis=-1,
+        )[None]
+
+    shape = sample[variables[0]].shape
+    gate_range = radar.range["data"][:n_gates]
+    sample["range_folded_mask"] = np.zeros(shape, dtype=np.float32)
+    sample["az_lower"] = np.array([0.0])
+    sample["az_upper"] = np.array([360.0])
+    sample["rng_lower"] = np.array([float(gate_range[0])])
+    sample["rng_upper"] = np.array([float(gate_range[-1])])
+    sample["time"] = np.array(
+        [np.datetime64(radar.time["units"].split(" ")[-1].rstrip("Z"), "s")]
+    ).astype(np.int64)
+    return sample
@@ -1,67 +1,154 @@
+import os
+
 import keras
+import numpy as np
 import torch
 import torchvision.transforms as T
 from huggingface_hub import hf_hub_download
 
+from services.model.export import MODEL_BACKEND, load_backend
+from services.model.frames import MODEL_N_FRAMES, FrameStore
+from services.model.level2 import is_netcdf, read_level2
+from services.scans.downloader import scan_time
 from tornet.tornet.data.loader import read_file
 from tornet.tornet.data.preprocess import add_coordinates, remove_time_dim
 from tornet.tornet.metrics.keras import metrics as tfm
 from tornet.tornet.models.keras.layers import *  # noqa
 
+VARIABLES = [
+    "reflectivity",
+    "velocity",
+    "differential_phase",
+    "cross_correlation_ratio",
+    "differential_reflectivity",
+    "spectrum_width",
+]
+# Bump whenever read_file arguments or self.transform change, so cached tensors
+# from the old pipeline are not reused
+PREPROCESS_VERSION = 1
 
-class Model:
-    def __init__(self):
-        self.model = keras.saving.load_model(
-            hf_hub_download(
-                repo_id="tornet-ml/tornado_detector_baseline_v1",
-                filename="tornado_detector_baseline.keras",
-                local_dir="data/checkpoints",
-                local_dir_use_symlinks=False,
-            ),
-            compile=False,
-        )
-        self.transform = T.Compose(
-            [
-                lambda d: add_coordinates(
-                    d, include_az=False, tilt_last=False, backend=torch
-                ),
-                lambda d: remove_time_dim(d),
-            ]
+
+TRANSFORM = T.Compose(
+    [
+        lambda d: add_coordinates(d, include_az=False, tilt_last=False, backend=torch),
+        lambda d: remove_time_dim(d),
+    ]
+)
+
+
+def read_sample(file_path):
+    """One frame of a TorNet NetCDF sample or Level II archive, before TRANSFORM."""
+    if is_netcdf(file_path):
+        return read_file(
+            file_path,
+            variables=VARIABLES,
+            tilt_last=True,
+            n_frames=1,
         )
+    # Level II archives are decoded in memory, without a CF/Radial round trip
+    return read_level2(file_path, variables=VARIABLES)
+
+
+def preprocess_file(file_path):
+    """
+    Model inputs for one TorNet NetCDF sample or Level II archive. Doesn't need a
+    loaded model, so batch scoring workers (services.model.scoring) call it too.
+    """
+    return TRANSFORM(read_sample(file_path))
+
 
-        metrics = [
-            keras.metrics.AUC(
-                from_logits=(from_logits := True), name="AUC", num_thresholds=2000
-            ),
-            keras.metrics.AUC(
-                from_logits=from_logits, curve="PR", name="AUCPR", num_thresholds=2000
-            ),
-            tfm.BinaryAccuracy(from_logits=from_logits, name="BinaryAccuracy"),
-            tfm.Precision(from_logits=from_logits, name="Precision"),
-            tfm.Recall(from_logits=from_logits, name="Recall"),
-            tfm.F1Score(from_logits=from_logits, name="F1"),
-        ]
-        self.model.compile(metrics=metrics)
+def load_checkpoint():
+    return keras.saving.load_model(
+        hf_hub_download(
+            repo_id="tornet-ml/tornado_detector_baseline_v1",
+            filename="tornado_detector_baseline.keras",
+            local_dir="data/checkpoints",
+            local_dir_use_symlinks=False,
+        ),
+        compile=False,
+    )
+
+
+def build_metrics():
+    return [
+        keras.metrics.AUC(
+            from_logits=(from_logits := True), name="AUC", num_thresholds=2000
+        ),
+        keras.metrics.AUC(
+            from_logits=from_logits, curve="PR", name="AUCPR", num_thresholds=2000
+        ),
+        tfm.BinaryAccuracy(from_logits=from_logits, name="BinaryAccuracy"),
+        tfm.Precision(from_logits=from_logits, name="Precision"),
+        tfm.Recall(from_logits=from_logits, name="Recall"),
+        tfm.F1Score(from_logits=from_logits, name="F1"),
+    ]
+
+
+class Model:
+    def __init__(
+        self,
+        compile_metrics=True,
+        tensor_cache=None,
+        backend=MODEL_BACKEND,
+        n_frames=MODEL_N_FRAMES,
+    ):
+        """
+        compile_metrics=False skips the evaluation metrics (inference only).
+        tensor_cache is an optional TensorCache of preprocessed inputs.
+        backend is "keras" or an exported ONNX variant (see model.export).
+        n_frames is the number of frames per input of a Level II radar's volumes,
+        buffered per radar in a FrameStore (1 for the shipped checkpoint).
+        """
+        self.backend = backend
+        self.model = load_backend(backend)
+        self.tensor_cache = tensor_cache
+        self.transform = TRANSFORM
+        self.frames = FrameStore(
+            n_frames, reader=self.preprocess_frame, keys=list(self.model.input)
+        )
+        if compile_metrics and backend == "keras":
+            self.model.compile(metrics=build_metrics())
 
     def predict(self, file_path):
-        x = self._prepoc(file_path)
+        x = self.preprocess(file_path)
         return self.model.predict(x)
 
-    def _prepoc(self, file_path):
-        data = read_file(
+    def predict_batch(self, x):
+        """Single forward pass over an already stacked batch (see model.batching)."""
+        return keras.ops.convert_to_numpy(self.model.predict_on_batch(x))
+
+    def warmup(self, batch_size=1):
+        """Runs one forward pass on zeros so the first request doesn't pay for it."""
+        x = {
+            k: np.zeros((batch_size, *t.shape[1:]), dtype=t.dtype)
+            for k, t in self.model.input.items()
+        }
+        self.predict_batch(x)
+
+    def preprocess(self, file_path):
+        """
+        Model inputs for a file. A Level II volume (e.g. KDVN20200810_163012_V06)
+        goes through its radar's FrameStore buffer: it is preprocessed once and
+        stacked with the radar's earlier frames without reading them again.
+        """
+        if is_netcdf(file_path):
+            return self.preprocess_frame(file_path)
+        name = os.path.basename(file_path)
+        return self.frames.update(name[:4], file_path, scan_time(name))
+
+    def preprocess_frame(self, file_path):
+        """Model inputs for one frame (TRANSFORM applied), from the tensor cache."""
+        if self.tensor_cache is None:
+            return self._preprocess(file_path)
+        return self.tensor_cache.get_or_compute(
             file_path,
-            variables=[
-                "reflectivity",
-                "velocity",
-                "differential_phase",
-                "cross_correlation_ratio",
-                "differential_reflectivity",
-                "spectrum_width",
-            ],
-            tilt_last=True,
-            n_frames=1,
+            VARIABLES,
+            PREPROCESS_VERSION,
+            lambda: self._preprocess(file_path),
         )
-        return self.transform(data)
+
+    def _preprocess(self, file_path):
+        return preprocess_file(file_path)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Batch scoring of many samples, e.g. a year of TorNet from get_files.
+
+Samples are read and preprocessed by a process pool straight into preallocated
+batch arrays in shared memory, `prefetch` batches ahead of the model. While
+predict_fn scores one batch, workers fill the next ones, so reading overlaps with
+inference and the main process never copies or stacks samples.
+
+    python -m services.model.scoring 2018 scores.csv
+
+scores the TorNet test samples of a year with the baseline model.
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from services.scans.ingest import StageStats
+
+SCORING_WORKERS = int(os.environ.get("SCORING_WORKERS", str(os.cpu_count() or 1)))
+SCORING_BATCH_SIZE = int(os.environ.get("SCORING_BATCH_SIZE", "32"))
+SCORING_PREFETCH = int(os.environ.get("SCORING_PREFETCH", "2"))
+
+
+def default_reader(path):
+    from services.model.main import preprocess_file
+
+    return preprocess_file(path)
+
+
+def sample_arrays(sample, keys=None):
+    """The array entries of a sample dict (only keys, if given), as numpy arrays."""
+    return {
+        k: np.asarray(v)
+        for k, v in sample.items()
+        if hasattr(v, "shape") and (keys is None or k in keys)
+    }
+
+
+class BatchBuffers:
+    """
+    `slots` batches of batch_size samples shaped like template, allocated once in
+    one shared memory block. Each input of a batch is a contiguous
+    (batch_size, *shape) array, ready to be passed to the model as is.
+    """
+
+    def __init__(self, template, batch_size, slots):
+        self.batch_size = batch_size
+        self.slots = slots
+        # name -> (offset within a slot, sample shape, dtype)
+        self.layout = {}
+        size = 0
+        for name, a in template.items():
+            self.layout[name] = (size, a.shape, a.dtype.str)
+            size += -(-a.nbytes * batch_size // 64) * 64
+        self.slot_bytes = size
+        self.shm = SharedMemory(create=True, size=max(size * slots, 1))
+
+    def batch(self, slot, n=None):
+        """Arrays of slot, limited to its first n samples."""
+        n = self.batch_size if n is None else n
+        return {
+            name: np.ndarray(
+                (self.batch_size, *shape),
+                dtype,
+                buffer=self.shm.buf,
+                offset=slot * self.slot_bytes + offset,
+            )[:n]
+            for name, (offset, shape, dtype) in self.layout.items()
+        }
+
+    def row_layout(self, slot, row):
+        """(offset, shape, dtype) of each input of one sample of slot."""
+        layout = {}
+        for name, (offset, shape, dtype) in self.layout.items():
+            row_bytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            layout[name] = (
+                slot * self.slot_bytes + offset + row * row_bytes,
+                shape,
+                dtype,
+            )
+        return layout
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Shared memory blocks a worker process has attached to, by name
+_attached = {}
+
+
+def _fill(shm_name, layout, path, reader):
+    """Reads one sample into its row of a shared batch. Runs in a worker process."""
+    start = time.perf_counter()
+    shm = _attached.get(shm_name)
+    if shm is None:
+        # Workers share the scorer's resource tracker, which unlinks the block
+        shm = _attached[shm_name] = SharedMemory(name=shm_name)
+    sample = sample_arrays(reader(path), layout)
+    for name, (offset, shape, dtype) in layout.items():
+        np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)[...] = sample[name]
+    return time.perf_counter() - start
+
+
+class BatchScorer:
+    """
+    Scores files with predict_fn (e.g. Model.predict_batch) in batches of
+    batch_size. reader(path) returns a sample dict (Model.preprocess's by default)
+    and runs in a pool of `workers` processes; keys limits the inputs passed on.
+    """
+
+    def __init__(
+        self,
+        predict_fn,
+        reader=default_reader,
+        batch_size=SCORING_BATCH_SIZE,
+        workers=SCORING_WORKERS,
+        prefetch=SCORING_PREFETCH,
+        keys=None,
+    ):
+        self.predict_fn = predict_fn
+        self.reader = reader
+        self.batch_size = batch_size
+        self.workers = workers
+        self.prefetch = prefetch
+        self.keys = keys
+        self.stages = {
+            "read": StageStats(),
+            "wait": StageStats(),
+            "predict": StageStats(),
+        }
+        self.samples = 0
+        self.elapsed = 0.0
+
+    def score(self, paths):
+        """
+        Yields (paths, outputs, errors) per batch in order. Rows of samples that
+        failed to read are NaN in outputs, with {path: error} in errors.
+        """
+        paths = list(paths)
+        if not paths:
+            return
+        start = time.perf_counter()
+        # Samples are read here until one succeeds, to learn the shapes of the
+        # batch arrays; the ones that fail first are reported like worker errors
+        read, template = {}, None
+        for first, path in enumerate(paths):
+            read[first] = Future()
+            began = time.perf_counter()
+            try:
+                template = sample_arrays(self.reader(path), self.keys)
+            except Exception as e:  # noqa: BLE001
+                # A failed read is that sample's error, not the whole run's
+                read[first].set_exception(e)
+                continue
+            read[first].set_result(time.perf_counter() - began)
+            break
+        batches = [
+            paths[i : i + self.batch_size]
+            for i in range(0, len(paths), self.batch_size)
+        ]
+        if template is None:
+            # Nothing could be read, so there is nothing to score
+            for b, batch_paths in enumerate(batches):
+                errors = {
+                    path: repr(read[b * self.batch_size + row].exception())
+                    for row, path in enumerate(batch_paths)
+                }
+                self.stages["read"].errors += len(batch_paths)
+                self.samples += len(batch_paths)
+                self.elapsed = time.perf_counter() - start
+                yield batch_paths, np.full(len(batch_paths), np.nan, np.float32), errors
+            return
+        slots = min(self.prefetch + 1, len(batches))
+        buffers = BatchBuffers(template, self.batch_size, slots)
+        pool = ProcessPoolExecutor(self.workers)
+        pending = {}
+
+        def submit(b):
+            slot = b % slots
+            pending[b] = []
+            for row, path in enumerate(batches[b]):
+                i = b * self.batch_size + row
+                if i == first:
+                    for name, a in buffers.batch(slot, row + 1).items():
+                        a[row] = template[name]
+                pending[b].append(
+                    read[i]
+                    if i in read
+                    else pool.submit(
+                        _fill,
+                        buffers.shm.name,
+                        buffers.row_layout(slot, row),
+                        path,
+                        self.reader,
+                    )
+                )
+
+        try:
+            for b in range(slots):
+                submit(b)
+            for b, batch_paths in enumerate(batches):
+                slot = b % slots
+                x = buffers.batch(slot, len(batch_paths))
+                waited = time.perf_counter()
+                errors = {}
+                for row, future in enumerate(pending.pop(b)):
+                    try:
+                        self.stages["read"].record(future.result())
+                    except Exception as e:  # noqa: BLE001
+                        # Worker read errors become NaN rows of this batch
+                        self.stages["read"].errors += 1
+                        errors[batch_paths[row]] = repr(e)
+                        for a in x.values():
+                            a[row] = 0
+                self.stages["wait"].record(time.perf_counter() - waited)
+
+                predicted = time.perf_counter()
+                outputs = np.array(self.predict_fn(x), dtype=np.float32)
+                self.stages["predict"].record(time.perf_counter() - predicted)
+                for row, path in enumerate(batch_paths):
+                    if path in errors:
+                        outputs[row] = np.nan
+
+                # The slot is free again once predict_fn has returned
+                if b + slots < len(batches):
+                    submit(b + slots)
+                self.samples += len(batch_paths)
+                self.elapsed = time.perf_counter() - start
+                yield batch_paths, outputs, errors
+        finally:
+            for futures in pending.values():
+                for future in futures:
+                    future.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+            buffers.close()
+
+    def score_all(self, paths):
+        """DataFrame of path, output (first model output) and error per sample."""
+        rows = []
+        for batch_paths, outputs, errors in self.score(paths):
+            outputs = outputs.reshape(len(batch_paths), -1)[:, 0]
+            rows.extend(
+                (path, output, errors.get(path))
+                for path, output in zip(batch_paths, outputs)
+            )
+        return pd.DataFrame(rows, columns=["path", "output", "error"])
+
+    def stats(self):
+        return {
+            "samples": self.samples,
+            "elapsed_s": self.elapsed,
+            "samples_per_s": self.samples / self.elapsed if self.elapsed else 0.0,
+            "stages": {name: s.summary() for name, s in self.stages.items()},
+        }
+
+
+def main(year, out_path, types="test"):
+    from services.model.main import Model
+    from services.model.utils import get_files
+
+    model = Model(compile_metrics=False)
+    scorer = BatchScorer(model.predict_batch, keys=list(model.model.input.keys()))
+    scores = scorer.score_all(get_files(years=[int(year)], types=types, min_ef=None))
+    scores.to_csv(out_path, index=False)
+    print(scorer.stats())
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
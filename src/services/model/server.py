@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Single model-serving process shared by all API workers.
+
+The Keras model is loaded (without the evaluation metrics) and warmed up once, and
+scored through a BatchingEngine so requests from every uvicorn worker are batched
+together. Workers talk to it with ModelClient over a Unix socket using
+newline-delimited JSON: {"op": "predict", "file": path} or {"op": "stats"}.
+
+    MODEL_SERVER_SOCKET=/run/orion/model.sock python -m services.model.server
+"""
+
+import asyncio
+import json
+import os
+import resource
+import time
+
+import numpy as np
+
+from services.model.batching import BatchingEngine
+from services.model.tensor_cache import TENSOR_CACHE_DIR, TensorCache
+
+MODEL_SERVER_SOCKET = os.environ.get("MODEL_SERVER_SOCKET", "/run/orion/model.sock")
+
+
+def rss_mb():
+    """Current resident set size of this process in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class InferenceService:
+    """Preprocesses scan files and scores them through a BatchingEngine."""
+
+    def __init__(self, model, max_batch_size=16, max_latency_ms=20, startup_s=None):
+        self.model = model
+        self.engine = BatchingEngine(
+            model.predict_batch,
+            max_batch_size=max_batch_size,
+            max_latency_ms=max_latency_ms,
+        )
+        self.startup_s = startup_s
+
+    async def start(self):
+        await self.engine.start()
+
+    async def stop(self):
+        await self.engine.stop()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def predict_file(self, nc_file):
+        sample = await asyncio.to_thread(self.model.preprocess, nc_file)
+        return np.asarray(await self.engine.predict(sample)).tolist()
+
+    async def stats(self):
+        tensor_cache = getattr(self.model, "tensor_cache", None)
+        frames = getattr(self.model, "frames", None)
+        return {
+            **self.engine.stats(),
+            "tensor_cache": tensor_cache.stats() if tensor_cache else None,
+            "frames": frames.stats() if frames else None,
+            "pid": os.getpid(),
+            "rss_mb": rss_mb(),
+            "startup_s": self.startup_s,
+        }
+
+
+async def serve(service, socket_path=MODEL_SERVER_SOCKET):
+    async def handle(reader, writer):
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if request.get("op") == "stats":
+                        response = {"stats": await service.stats()}
+                    else:
+                        response = {
+                            "probability": await service.predict_file(request["file"])
+                        }
+                except Exception as e:  # noqa: BLE001
+                    # Answer a failed request instead of dropping the connection
+                    response = {"error": f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = await asyncio.start_unix_server(handle, path=socket_path)
+    async with server:
+        await server.serve_forever()
+
+
+class ModelClient:
+    """Client for the model server with the same interface as InferenceService."""
+
+    def __init__(self, socket_path=MODEL_SERVER_SOCKET):
+        self.socket_path = socket_path
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def _request(self, payload):
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        try:
+            writer.write(json.dumps(payload).encode() + b"\n")
+            await writer.drain()
+            response = json.loads(await reader.readline())
+        finally:
+            writer.close()
+            await writer.wait_closed()
+        if "error" in response:
+            raise RuntimeError(f"Model server error: {response['error']}")
+        return response
+
+    async def predict_file(self, nc_file):
+        response = await self._request({"op": "predict", "file": nc_file})
+        return response["probability"]
+
+    async def stats(self):
+        return (await self._request({"op": "stats"}))["stats"]
+
+
+def main():
+    start = time.perf_counter()
+    # Imported here so API workers can use ModelClient without loading keras/torch
+    from services.model.main import Model
+
+    model = Model(
+        compile_metrics=False,
+        tensor_cache=TensorCache(TENSOR_CACHE_DIR) if TENSOR_CACHE_DIR else None,
+    )
+    model.warmup()
+    service = InferenceService(
+        model,
+        max_batch_size=int(os.environ.get("MODEL_MAX_BATCH_SIZE", "16")),
+        max_latency_ms=float(os.environ.get("MODEL_MAX_LATENCY_MS", "20")),
+        startup_s=time.perf_counter() - start,
+    )
+    print(
+        f"INFO:\t Model loaded and warmed up in {service.startup_s:.1f}s,"
+        f" RSS {rss_mb():.0f} MB, serving on {MODEL_SERVER_SOCKET}"
+    )
+
+    async def run():
+        async with service:
+            await serve(service)
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+TENSOR_CACHE_DIR = os.environ.get("TENSOR_CACHE_DIR")
+TENSOR_CACHE_MAX_BYTES = int(os.environ.get("TENSOR_CACHE_MAX_BYTES", "5368709120"))
+
+
+def file_digest(file_path):
+    with open(file_path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+class TensorCache:
+    """
+    Content-addressed on-disk cache of preprocessed model inputs.
+
+    Entries are keyed by the SHA-256 of the source file plus the variable list and
+    preprocessing version, and stored as one .npy per array so hits are memory-mapped
+    instead of decoding the NetCDF again. Total size is bounded by evicting the
+    least recently used entries.
+    """
+
+    def __init__(self, root, max_bytes=TENSOR_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+        os.makedirs(root, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """Rebuilds the LRU index from disk, oldest access first."""
+        found = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not entry.name.startswith("."):
+                size = sum(f.stat().st_size for f in os.scandir(entry.path))
+                found.append((entry.stat().st_mtime, entry.name, size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._size += size
+
+    @staticmethod
+    def key(file_path, variables, version):
+        spec = json.dumps({"variables": list(variables), "version": version})
+        return hashlib.sha256(f"{file_digest(file_path)}:{spec}".encode()).hexdigest()
+
+    def _adopt(self, key):
+        """
+        Indexes an entry another process sharing the directory stored. Returns
+        False if there is none.
+        """
+        try:
+            with os.scandir(os.path.join(self.root, key)) as it:
+                size = sum(f.stat().st_size for f in it)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size
+                self._size += size
+                self._evict()
+        return True
+
+    def get(self, key):
+        path = os.path.join(self.root, key)
+        with self._lock:
+            indexed = key in self._entries
+        if not indexed and not self._adopt(key):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        try:
+            os.utime(path)
+            return {
+                f.name[: -len(".npy")]: np.load(f.path, mmap_mode="r")
+                for f in os.scandir(path)
+                if f.name.endswith(".npy")
+            }
+        except FileNotFoundError:
+            # Evicted by another process sharing the directory
+            with self._lock:
+                self._drop(key)
+            return None
+
+    def put(self, key, sample):
+        """Stores the array entries of a sample dict; other entries are not cached."""
+        tmp = os.path.join(self.root, f".{key}.{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        size = 0
+        for name, value in sample.items():
+            if hasattr(value, "shape"):
+                file_path = os.path.join(tmp, f"{name}.npy")
+                np.save(file_path, np.asarray(value))
+                size += os.path.getsize(file_path)
+        path = os.path.join(self.root, key)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+            # Another writer stored the same content first; index theirs
+            self._adopt(key)
+            return
+        with self._lock:
+            self._entries[key] = size
+            self._size += size
+            self._evict()
+
+    def get_or_compute(self, file_path, variables, version, compute):
+        key = self.key(file_path, variables, version)
+        sample = self.get(key)
+        if sample is None:
+            sample = compute()
+            self.put(key, sample)
+        return sample
+
+    def _drop(self, key):
+        self._size -= self._entries.pop(key, 0)
+
+    def _evict(self):
+        while self._size > self.max_bytes and len(self._entries) > 1:
+            key, _ = next(iter(self._entries.items()))
+            self._drop(key)
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+        }
@@ -1,39 +1,17 @@
 import os
 
-import keras
 import matplotlib.pyplot as plt
-import pandas as pd
-from huggingface_hub import hf_hub_download
 
+from services.model.catalog import Catalog
+from services.model.main import build_metrics, load_checkpoint
 from tornet.tornet.data.loader import TornadoDataLoader
 from tornet.tornet.display.display import plot_radar
-from tornet.tornet.metrics.keras import metrics as tfm
-from tornet.tornet.models.keras.layers import *  # noqa
 
 
-def get_pretrained():
-    model = keras.saving.load_model(
-        hf_hub_download(
-            repo_id="tornet-ml/tornado_detector_baseline_v1",
-            filename="tornado_detector_baseline.keras",
-            local_dir="data/checkpoints",
-            local_dir_use_symlinks=False,
-        ),
-        compile=False,
-    )
-    metrics = [
-        keras.metrics.AUC(
-            from_logits=(from_logits := True), name="AUC", num_thresholds=2000
-        ),
-        keras.metrics.AUC(
-            from_logits=from_logits, curve="PR", name="AUCPR", num_thresholds=2000
-        ),
-        tfm.BinaryAccuracy(from_logits=from_logits, name="BinaryAccuracy"),
-        tfm.Precision(from_logits=from_logits, name="Precision"),
-        tfm.Recall(from_logits=from_logits, name="Recall"),
-        tfm.F1Score(from_logits=from_logits, name="F1"),
-    ]
-    model.compile(metrics=metrics)
+def get_pretrained(compile_metrics=True):
+    model = load_checkpoint()
+    if compile_metrics:
+        model.compile(metrics=build_metrics())
     return model
 
 
@@ -71,20 +49,10 @@ def plot(file_list):
     )
 
 
-def get_files():
+def get_files(years=(2019, 2020), types="train", min_ef=2, **filters):
+    """
+    Sample paths from the TorNet catalog (see services.model.catalog); by default
+    training data from certain years with strong tornadoes.
+    """
     data_root = os.environ.get("TORNET_ROOT", "data/TorNet/")
-    catalog = pd.read_csv(
-        os.path.join(data_root, "catalog.csv"), parse_dates=["start_time", "end_time"]
-    )
-
-    # Setset catalog to get training data from certain years with strong tornaodes
-    years = [2019, 2020]
-    min_ef = 2
-
-    subset = catalog[
-        (catalog.start_time.dt.year.isin(years))
-        & (catalog["type"] == "train")
-        & (catalog["ef_number"] >= min_ef)
-    ]
-
-    return [os.path.join(data_root, f) for f in subset.filename]
+    return Catalog(data_root).files(years=years, types=types, min_ef=min_ef, **filters)
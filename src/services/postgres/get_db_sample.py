@@ -5,17 +5,17 @@ import json
 import psycopg2
 import psycopg2.extras
 
-from services.postgres.utils import get_postgres_connection
+from services.postgres.utils import pooled_connection
 
 
 def fetch_sample_data():
-    conn = get_postgres_connection()
-    cur = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-    query = "SELECT * FROM radar_scans LIMIT 1;"
-    cur.execute(query)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with (
+        pooled_connection() as conn,
+        conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur,
+    ):
+        query = "SELECT * FROM radar_scans LIMIT 1;"
+        cur.execute(query)
+        rows = cur.fetchall()
     return rows
 
 
@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+
+# Encoding of new radar_scans.grid values: "int8" (quantized) or "float16", and
+# "zstd" or "none" compression (zstd needs the zstandard package)
+GRID_ENCODING = os.environ.get("GRID_ENCODING", "int8")
+GRID_COMPRESSION = os.environ.get("GRID_COMPRESSION", "none")
+
+# int8 code for masked gates; valid values use -127..127
+INT8_MASKED = -128
+
+
+def _compressor(codec):
+    if codec == "none":
+        return None
+    if codec == "zstd":
+        import zstandard
+
+        return zstandard
+    raise ValueError(f"Unknown grid codec: {codec}")
+
+
+def encode_grid(array, encoding=GRID_ENCODING, compression=GRID_COMPRESSION):
+    """
+    Packs a 2D field (masked array or NaN for missing gates) for the radar_scans
+    grid columns. int8 maps the finite range of the data linearly onto -127..127
+    (value = code * scale + offset) and marks missing gates with INT8_MASKED;
+    float16 keeps missing gates as NaN. Returns a dict keyed by column name.
+    """
+    data = np.ma.filled(np.ma.asarray(array, dtype=np.float32), np.nan)
+    missing = ~np.isfinite(data)
+    scale, offset = 1.0, 0.0
+    if encoding == "int8":
+        valid = data[~missing]
+        if valid.size:
+            lo, hi = float(valid.min()), float(valid.max())
+            offset = (lo + hi) / 2
+            scale = (hi - lo) / 254 or 1.0
+        codes = np.rint((np.where(missing, offset, data) - offset) / scale)
+        packed = np.clip(codes, -127, 127).astype(np.int8)
+        packed[missing] = INT8_MASKED
+    elif encoding == "float16":
+        packed = data.astype(np.float16)
+    else:
+        raise ValueError(f"Unknown grid encoding: {encoding}")
+
+    raw = packed.tobytes()
+    compressor = _compressor(compression)
+    if compressor is not None:
+        raw = compressor.ZstdCompressor(level=3).compress(raw)
+    return {
+        "grid": raw,
+        "grid_shape": list(packed.shape),
+        "grid_dtype": packed.dtype.str,
+        "grid_scale": scale,
+        "grid_offset": offset,
+        "grid_codec": compression,
+    }
+
+
+def decode_grid(
+    grid,
+    grid_shape,
+    grid_dtype,
+    grid_scale=1.0,
+    grid_offset=0.0,
+    grid_codec="none",
+    dequantize=True,
+):
+    """
+    Array stored by encode_grid. The stored values are read with np.frombuffer
+    straight from the bytes/memoryview the driver returns (no copy unless zstd
+    compressed); with dequantize=False that read-only view is returned as is.
+    Otherwise int8 grids are scaled back to float32 with NaN for missing gates.
+    """
+    compressor = _compressor(grid_codec)
+    if compressor is not None:
+        grid = compressor.ZstdDecompressor().decompress(grid)
+    packed = np.frombuffer(grid, dtype=np.dtype(grid_dtype)).reshape(grid_shape)
+    if not dequantize or packed.dtype != np.int8:
+        return packed
+    values = packed.astype(np.float32) * np.float32(grid_scale) + np.float32(
+        grid_offset
+    )
+    values[packed == INT8_MASKED] = np.nan
+    return values
+
+
+def json_grid_to_array(grid_data):
+    """Reflectivity from a legacy grid_data JSON value, with nulls as NaN."""
+    if isinstance(grid_data, str):
+        grid_data = json.loads(grid_data)
+    reflectivity = grid_data.get("reflectivity", [])
+    array = np.array(reflectivity, dtype=np.float32)
+    if array.ndim == 1:
+        array = array.reshape(1, -1)
+    return array
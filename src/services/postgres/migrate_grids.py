@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Moves radar_scans rows from the JSON grid_data column to the binary grid columns.
+
+    python -m services.postgres.migrate_grids [--drop-json]
+
+Safe to re-run: only rows without a binary grid are converted, in batches that
+each commit on their own. With --drop-json the converted rows' grid_data is
+cleared afterwards to reclaim the space.
+"""
+
+import argparse
+
+import psycopg2
+
+from services.postgres.grid import encode_grid, json_grid_to_array
+from services.postgres.utils import get_postgres_connection
+
+GRID_COLUMNS_SQL = """
+ALTER TABLE radar_scans
+    ADD COLUMN IF NOT EXISTS grid BYTEA,
+    ADD COLUMN IF NOT EXISTS grid_shape INTEGER[],
+    ADD COLUMN IF NOT EXISTS grid_dtype TEXT,
+    ADD COLUMN IF NOT EXISTS grid_scale REAL,
+    ADD COLUMN IF NOT EXISTS grid_offset REAL,
+    ADD COLUMN IF NOT EXISTS grid_codec TEXT;
+"""
+
+
+def add_grid_columns(conn):
+    with conn.cursor() as cur:
+        cur.execute(GRID_COLUMNS_SQL)
+    conn.commit()
+
+
+def migrate_json_grids(conn, batch_size=100, drop_json=False):
+    """Converts every row with grid_data but no grid. Returns the number converted."""
+    add_grid_columns(conn)
+    migrated = 0
+    while True:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, grid_data FROM radar_scans
+                WHERE grid IS NULL AND grid_data IS NOT NULL
+                ORDER BY id LIMIT %s
+                """,
+                (batch_size,),
+            )
+            rows = cur.fetchall()
+            if not rows:
+                break
+            for row_id, grid_data in rows:
+                grid = encode_grid(json_grid_to_array(grid_data))
+                cur.execute(
+                    """
+                    UPDATE radar_scans SET grid = %s, grid_shape = %s,
+                        grid_dtype = %s, grid_scale = %s, grid_offset = %s,
+                        grid_codec = %s
+                    WHERE id = %s
+                    """,
+                    (
+                        psycopg2.Binary(grid["grid"]),
+                        grid["grid_shape"],
+                        grid["grid_dtype"],
+                        grid["grid_scale"],
+                        grid["grid_offset"],
+                        grid["grid_codec"],
+                        row_id,
+                    ),
+                )
+        conn.commit()
+        migrated += len(rows)
+        print(f"Migrated {migrated} rows")
+
+    if drop_json:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE radar_scans SET grid_data = NULL WHERE grid IS NOT NULL"
+            )
+        conn.commit()
+    return migrated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--drop-json", action="store_true")
+    args = parser.parse_args()
+
+    conn = get_postgres_connection()
+    try:
+        migrate_json_grids(conn, args.batch_size, args.drop_json)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+import json
+import os
+import sqlite3
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+import psycopg2
+
+from services.postgres.grid import decode_grid
+from services.postgres.schema import create_sqlite_schema
+from services.postgres.store import SCAN_COLUMNS, store_scans
+from services.postgres.utils import pooled_connection
+from services.scans.geometry import GEOMETRY_COLUMNS
+
+# Rows fetched per round trip when streaming from a server-side cursor
+SCAN_ITERSIZE = int(os.environ.get("SCAN_ITERSIZE", "32"))
+
+METADATA_COLUMNS = ", ".join(
+    ["id", "radar_id", "scan_time", "min_lon", "max_lon", "min_lat", "max_lat"]
+    + GEOMETRY_COLUMNS
+)
+# Errors a ScanStore query can raise, with either backend
+STORE_ERRORS = (psycopg2.Error, sqlite3.Error)
+
+GRID_COLUMNS = "grid, grid_shape, grid_dtype, grid_scale, grid_offset, grid_codec"
+
+# Bounding box overlap, written against the expression of radar_scans_bbox_idx in
+# Postgres so the GiST index is used
+BBOX_OVERLAP = {
+    "postgres": (
+        "box(point(min_lon, min_lat), point(max_lon, max_lat))"
+        " && box(point(%s, %s), point(%s, %s))"
+    ),
+    "sqlite": "min_lon <= %s AND max_lon >= %s AND min_lat <= %s AND max_lat >= %s",
+}
+
+
+class ScanRef:
+    """
+    Metadata of one radar_scans row. Unless the stored grid columns came with the
+    row (payload, from iter_scans), the grid is only read from the database when
+    grid() is called, and isn't kept, so holding many refs is cheap. geometry is
+    a dict of GEOMETRY_COLUMNS, or None for rows stored without it.
+    """
+
+    def __init__(
+        self, store, id, radar_id, scan_time, bbox, geometry=None, payload=None
+    ):
+        self.store = store
+        self.id = id
+        self.radar_id = radar_id
+        self.scan_time = pd.Timestamp(scan_time).tz_convert("UTC")
+        self.bbox = tuple(float(v) for v in bbox)
+        self.geometry = geometry
+        self.payload = payload
+
+    @classmethod
+    def from_row(cls, store, row, with_payload=False):
+        """From a row of METADATA_COLUMNS, followed by GRID_COLUMNS if with_payload."""
+        row_id, radar_id, scan_time, *rest = row
+        n = len(GEOMETRY_COLUMNS)
+        geometry = None
+        if rest[4] is not None:
+            geometry = {c: float(v) for c, v in zip(GEOMETRY_COLUMNS, rest[4 : 4 + n])}
+        payload = rest[4 + n :] if with_payload else None
+        return cls(store, row_id, radar_id, scan_time, rest[:4], geometry, payload)
+
+    def grid(self, dequantize=True):
+        if self.payload is not None:
+            return _decode_payload(self.payload, dequantize)
+        return self.store.load_grid(self, dequantize=dequantize)
+
+    def __repr__(self):
+        return f"ScanRef({self.radar_id}, {self.scan_time}, id={self.id})"
+
+
+def _decode_payload(payload, dequantize=True):
+    """Array from the GRID_COLUMNS values of a row, or None for JSON-only rows."""
+    grid, shape, *rest = payload
+    if grid is None:
+        return None
+    if isinstance(shape, str):
+        shape = json.loads(shape)
+    return decode_grid(grid, shape, *rest, dequantize=dequantize)
+
+
+def _sqlite_time(t):
+    t = pd.Timestamp(t)
+    t = t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    return t.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+
+
+class ScanStore:
+    """
+    Range and bounding box queries over radar_scans. connection() must return a
+    context manager yielding a DB-API connection; by default connections come from
+    the Postgres pool. ScanStore.sqlite(path) gives a stand-in backed by SQLite.
+    """
+
+    def __init__(self, connection=None, dialect="postgres"):
+        self.connection = connection or pooled_connection
+        self.dialect = dialect
+
+    @classmethod
+    def sqlite(cls, path=":memory:"):
+        conn = sqlite3.connect(path, check_same_thread=False)
+        create_sqlite_schema(conn)
+
+        @contextmanager
+        def connection():
+            with conn:
+                yield conn
+
+        return cls(connection, dialect="sqlite")
+
+    def _sql(self, sql):
+        return sql.replace("%s", "?") if self.dialect == "sqlite" else sql
+
+    def _time(self, t):
+        return _sqlite_time(t) if self.dialect == "sqlite" else pd.Timestamp(t)
+
+    def _fetch(self, sql, params):
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(self._sql(sql), params)
+                return cur.fetchall()
+            finally:
+                cur.close()
+
+    def _refs(self, rows):
+        return [ScanRef.from_row(self, row) for row in rows]
+
+    def _select(
+        self,
+        columns,
+        radar_id=None,
+        t0=None,
+        t1=None,
+        bbox=None,
+        order="scan_time, radar_id",
+    ):
+        """SELECT of columns filtered by whichever of the arguments are given."""
+        where, params = [], []
+        if radar_id is not None:
+            where.append("radar_id = %s")
+            params.append(radar_id)
+        if t0 is not None:
+            where.append("scan_time >= %s")
+            params.append(self._time(t0))
+        if t1 is not None:
+            where.append("scan_time <= %s")
+            params.append(self._time(t1))
+        if bbox is not None:
+            min_lon, max_lon, min_lat, max_lat = bbox
+            where.append(BBOX_OVERLAP[self.dialect])
+            if self.dialect == "sqlite":
+                params.extend([max_lon, min_lon, max_lat, min_lat])
+            else:
+                params.extend([min_lon, min_lat, max_lon, max_lat])
+        sql = f"SELECT {columns} FROM radar_scans"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return sql + f" ORDER BY {order}", params
+
+    def scans_in_range(self, radar_id, t0, t1):
+        """ScanRefs of radar_id's scans with t0 <= scan_time <= t1, oldest first."""
+        return self._refs(
+            self._fetch(*self._select(METADATA_COLUMNS, radar_id, t0, t1))
+        )
+
+    def latest(self, radar_id, before=None):
+        """ScanRef of radar_id's most recent scan (at or before `before`), or None."""
+        sql, params = self._select(
+            METADATA_COLUMNS, radar_id, t1=before, order="scan_time DESC LIMIT 1"
+        )
+        refs = self._refs(self._fetch(sql, params))
+        return refs[0] if refs else None
+
+    def scans_intersecting(self, bbox, t0, t1):
+        """
+        ScanRefs of scans whose coverage overlaps bbox = (min_lon, max_lon, min_lat,
+        max_lat) with t0 <= scan_time <= t1, oldest first.
+        """
+        sql, params = self._select(METADATA_COLUMNS, t0=t0, t1=t1, bbox=bbox)
+        return self._refs(self._fetch(sql, params))
+
+    def iter_scans(
+        self,
+        radar_id=None,
+        t0=None,
+        t1=None,
+        bbox=None,
+        with_grid=True,
+        itersize=SCAN_ITERSIZE,
+    ):
+        """
+        Streams ScanRefs matching the filters, oldest first, with their stored grid
+        bytes attached when with_grid (decoded only by ScanRef.grid()). Postgres rows
+        come through a server-side cursor itersize rows at a time, so memory use
+        doesn't grow with the size of the result. The pooled connection is held
+        until the generator is exhausted or closed.
+        """
+        columns = METADATA_COLUMNS + (f", {GRID_COLUMNS}" if with_grid else "")
+        sql, params = self._select(columns, radar_id, t0, t1, bbox)
+        with self.connection() as conn:
+            if self.dialect == "sqlite":
+                cur = conn.cursor()
+            else:
+                cur = conn.cursor(name=f"scans_{uuid.uuid4().hex}")
+                cur.itersize = itersize
+            try:
+                cur.execute(self._sql(sql), params)
+                while rows := cur.fetchmany(itersize):
+                    for row in rows:
+                        yield ScanRef.from_row(self, row, with_payload=with_grid)
+            finally:
+                cur.close()
+
+    def load_grid(self, ref, dequantize=True):
+        # scan_time lets Postgres prune to the one partition holding the row
+        rows = self._fetch(
+            f"SELECT {GRID_COLUMNS} FROM radar_scans WHERE id = %s AND scan_time = %s",
+            (ref.id, self._time(ref.scan_time)),
+        )
+        if not rows:
+            return None
+        return _decode_payload(rows[0], dequantize)
+
+    def add(self, rows):
+        """Inserts store.scan_row tuples (store_scans, for Postgres)."""
+        if self.dialect != "sqlite":
+            with self.connection() as conn:
+                return store_scans(rows, conn=conn)
+
+        rows = [
+            (
+                radar_id,
+                _sqlite_time(scan_time),
+                bytes(getattr(grid, "adapted", grid)),
+                json.dumps(list(shape)),
+                *rest,
+            )
+            for radar_id, scan_time, grid, shape, *rest in rows
+        ]
+        with self.connection() as conn:
+            conn.executemany(
+                f"INSERT INTO radar_scans ({', '.join(SCAN_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(SCAN_COLUMNS))})",
+                rows,
+            )
+        return len(rows)
+
+
+_store = None
+
+
+def default_store():
+    global _store
+    if _store is None:
+        _store = ScanStore()
+    return _store
+
+
+def scans_in_range(radar_id, t0, t1):
+    return default_store().scans_in_range(radar_id, t0, t1)
+
+
+def scans_intersecting(bbox, t0, t1):
+    return default_store().scans_intersecting(bbox, t0, t1)
+
+
+def iter_scans(**filters):
+    return default_store().iter_scans(**filters)
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Managed radar_scans schema.
+
+In Postgres radar_scans is range-partitioned by month on scan_time, with a
+(radar_id, scan_time) index for per-radar time ranges and a GiST index on the
+lat/lon bounding box for spatial queries. Monthly partitions are created on demand
+by ensure_partitions (store_scans calls it before inserting). SQLITE_SCHEMA is a
+flat equivalent used as a stand-in by tests.
+
+    python -m services.postgres.schema
+
+creates the schema, first moving rows of an older unpartitioned radar_scans table
+into it (the old table is kept as radar_scans_legacy).
+"""
+
+import pandas as pd
+
+from services.postgres.migrate_grids import add_grid_columns
+from services.postgres.utils import get_postgres_connection
+
+POSTGRES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS radar_scans (
+    id BIGSERIAL,
+    radar_id TEXT NOT NULL,
+    scan_time TIMESTAMPTZ NOT NULL,
+    grid_data JSONB,
+    grid BYTEA,
+    grid_shape INTEGER[],
+    grid_dtype TEXT,
+    grid_scale REAL,
+    grid_offset REAL,
+    grid_codec TEXT,
+    min_lon DOUBLE PRECISION,
+    max_lon DOUBLE PRECISION,
+    min_lat DOUBLE PRECISION,
+    max_lat DOUBLE PRECISION,
+    site_lat DOUBLE PRECISION,
+    site_lon DOUBLE PRECISION,
+    site_alt REAL,
+    elevation REAL,
+    range_start REAL,
+    gate_spacing REAL,
+    PRIMARY KEY (id, scan_time)
+) PARTITION BY RANGE (scan_time);
+
+ALTER TABLE radar_scans
+    ADD COLUMN IF NOT EXISTS site_lat DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS site_lon DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS site_alt REAL,
+    ADD COLUMN IF NOT EXISTS elevation REAL,
+    ADD COLUMN IF NOT EXISTS range_start REAL,
+    ADD COLUMN IF NOT EXISTS gate_spacing REAL;
+
+CREATE INDEX IF NOT EXISTS radar_scans_radar_time_idx
+    ON radar_scans (radar_id, scan_time);
+
+CREATE INDEX IF NOT EXISTS radar_scans_bbox_idx
+    ON radar_scans USING gist (box(point(min_lon, min_lat), point(max_lon, max_lat)));
+"""
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS radar_scans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    radar_id TEXT NOT NULL,
+    scan_time TEXT NOT NULL,
+    grid_data TEXT,
+    grid BLOB,
+    grid_shape TEXT,
+    grid_dtype TEXT,
+    grid_scale REAL,
+    grid_offset REAL,
+    grid_codec TEXT,
+    min_lon REAL,
+    max_lon REAL,
+    min_lat REAL,
+    max_lat REAL,
+    site_lat REAL,
+    site_lon REAL,
+    site_alt REAL,
+    elevation REAL,
+    range_start REAL,
+    gate_spacing REAL
+);
+
+CREATE INDEX IF NOT EXISTS radar_scans_radar_time_idx
+    ON radar_scans (radar_id, scan_time);
+
+CREATE INDEX IF NOT EXISTS radar_scans_time_idx ON radar_scans (scan_time);
+"""
+
+SCAN_COPY_COLUMNS = (
+    "radar_id, scan_time, grid_data, grid, grid_shape, grid_dtype, grid_scale, "
+    "grid_offset, grid_codec, min_lon, max_lon, min_lat, max_lat"
+)
+
+
+def month_start(t):
+    t = pd.Timestamp(t)
+    t = t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+    return t.normalize().replace(day=1)
+
+
+def partition_name(month):
+    return f"radar_scans_y{month:%Y}m{month:%m}"
+
+
+def ensure_partitions(conn, times):
+    """
+    Creates the monthly partitions covering every timestamp in times, in conn's
+    current transaction (committing is up to the caller). Existing partitions are
+    only looked up, which is cheap, and nothing is remembered across calls, so a
+    rolled back transaction can't leave a partition wrongly marked as created.
+    """
+    months = {month_start(t) for t in times}
+    with conn.cursor() as cur:
+        for month in sorted(months):
+            name = partition_name(month)
+            cur.execute("SELECT to_regclass(%s)", (name,))
+            if cur.fetchone()[0] is not None:
+                continue
+            # IF NOT EXISTS alone fails when another store worker creates the same
+            # month concurrently; the lock is held until the transaction ends, so
+            # the second creator waits and then finds the committed partition
+            cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (name,))
+            cur.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {name}
+                PARTITION OF radar_scans FOR VALUES FROM (%s) TO (%s)
+                """,
+                (month, month + pd.DateOffset(months=1)),
+            )
+
+
+def create_sqlite_schema(conn):
+    conn.executescript(SQLITE_SCHEMA)
+    conn.commit()
+
+
+def _relkind(cur, name):
+    cur.execute("SELECT relkind FROM pg_class WHERE relname = %s", (name,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def create_schema(conn):
+    """
+    Creates the partitioned radar_scans table and its indexes. An unpartitioned
+    radar_scans from before is renamed to radar_scans_legacy and its rows copied in.
+    """
+    with conn.cursor() as cur:
+        legacy = _relkind(cur, "radar_scans") == "r"
+    if legacy:
+        add_grid_columns(conn)
+        with conn.cursor() as cur:
+            cur.execute("ALTER TABLE radar_scans RENAME TO radar_scans_legacy")
+            # Frees the name for the new table's primary key
+            cur.execute(
+                "ALTER INDEX IF EXISTS radar_scans_pkey RENAME TO radar_scans_legacy_pkey"
+            )
+        conn.commit()
+
+    with conn.cursor() as cur:
+        cur.execute(POSTGRES_SCHEMA)
+    conn.commit()
+
+    if legacy:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT DISTINCT date_trunc('month', scan_time, 'UTC') "
+                "FROM radar_scans_legacy WHERE scan_time IS NOT NULL"
+            )
+            months = [row[0] for row in cur.fetchall()]
+        ensure_partitions(conn, months)
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                INSERT INTO radar_scans ({SCAN_COPY_COLUMNS})
+                SELECT {SCAN_COPY_COLUMNS} FROM radar_scans_legacy
+                WHERE radar_id IS NOT NULL AND scan_time IS NOT NULL
+                ORDER BY scan_time
+                """
+            )
+            print(f"Copied {cur.rowcount} rows from radar_scans_legacy")
+        conn.commit()
+
+
+def main():
+    conn = get_postgres_connection()
+    try:
+        create_schema(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ docker compose up -d
 echo "Waiting for PostgreSQL to start..."
 sleep 10
 
-docker compose exec postgres psql -U admin -d weather_db -c "CREATE TABLE IF NOT EXISTS radar_scans (id SERIAL PRIMARY KEY, radar_id TEXT, scan_time TIMESTAMPTZ, grid_data JSONB, min_lon NUMERIC, max_lon NUMERIC, min_lat NUMERIC, max_lat NUMERIC);"
+# Partitioned radar_scans table and indexes (see services/postgres/schema.py)
+PYTHONPATH="$(dirname "$0")/../.." python -m services.postgres.schema
 
 docker logs -f postgres
@@ -1,54 +1,126 @@
-import json
+from itertools import islice
 
-import pandas as pd
+import numpy as np
+import psycopg2
+import psycopg2.extras
 
-from services.postgres.utils import get_postgres_connection
+from services.postgres.grid import encode_grid
+from services.postgres.schema import ensure_partitions
+from services.postgres.utils import pooled_connection
+from services.scans.downloader import scan_time as key_scan_time
+from services.scans.geometry import (
+    GEOMETRY_COLUMNS,
+    SCAN_AZIMUTHS,
+    geometry_cache,
+    regrid_azimuth,
+    sweep_geometry,
+)
 
+SCAN_COLUMNS = [
+    "radar_id",
+    "scan_time",
+    "grid",
+    "grid_shape",
+    "grid_dtype",
+    "grid_scale",
+    "grid_offset",
+    "grid_codec",
+    "min_lon",
+    "max_lon",
+    "min_lat",
+    "max_lat",
+    *GEOMETRY_COLUMNS,
+]
+INSERT_SCANS_SQL = f"INSERT INTO radar_scans ({', '.join(SCAN_COLUMNS)}) VALUES %s"
 
-def store_scan_in_postgres(scan, radar, radar_id):
-    scan_time = pd.to_datetime(scan.filename[4:17], format="%Y%m%d_%H%M").tz_localize(
-        "UTC"
-    )
 
-    reflectivity_data = radar.fields["reflectivity"]["data"][0]
-    reflectivity_list = reflectivity_data.tolist()
-
-    lats, lons, alts = radar.get_gate_lat_lon_alt(sweep=0)
-
-    lats_sweep = lats[0]
-    lons_sweep = lons[0]
-    min_lon_val = float(lons_sweep.min())
-    max_lon_val = float(lons_sweep.max())
-    min_lat_val = float(lats_sweep.min())
-    max_lat_val = float(lats_sweep.max())
-
-    grid_data = {
-        "reflectivity": reflectivity_list,
-        "min_lon": min_lon_val,
-        "max_lon": max_lon_val,
-        "min_lat": min_lat_val,
-        "max_lat": max_lat_val,
-    }
-
-    conn = get_postgres_connection()
-    cur = conn.cursor()
-    insert_sql = """
-    INSERT INTO radar_scans (radar_id, scan_time, grid_data, min_lon, max_lon, min_lat, max_lat)
-    VALUES (%s, %s, %s, %s, %s, %s, %s)
+def scan_row(radar_id, scan_time, reflectivity, bbox, geometry=None):
+    """
+    radar_scans row (values in SCAN_COLUMNS order) for one sweep of reflectivity.
+    bbox is (min_lon, max_lon, min_lat, max_lat); geometry is a dict of
+    GEOMETRY_COLUMNS (see services.scans.geometry), for grids on a uniform azimuth
+    grid, and is what tiles are rendered from.
     """
-    cur.execute(
-        insert_sql,
-        (
-            radar_id,
-            scan_time,
-            json.dumps(grid_data),
-            min_lon_val,
-            max_lon_val,
-            min_lat_val,
-            max_lat_val,
-        ),
+    geometry = geometry or {}
+    grid = encode_grid(reflectivity)
+    return (
+        radar_id,
+        scan_time,
+        psycopg2.Binary(grid["grid"]),
+        grid["grid_shape"],
+        grid["grid_dtype"],
+        grid["grid_scale"],
+        grid["grid_offset"],
+        grid["grid_codec"],
+        *(float(v) for v in bbox),
+        *(geometry.get(column) for column in GEOMETRY_COLUMNS),
+    )
+
+
+def radar_scan_row(scan, radar, radar_id):
+    """scan_row for the lowest sweep of a pyart Radar read from scan."""
+    # Same full-second time as volume_rows, so rows of either path line up
+    scan_time = key_scan_time(scan.filename)
+    sweep = radar.get_slice(0)
+    reflectivity_data = np.ma.filled(
+        radar.fields["reflectivity"]["data"][sweep].astype(np.float32), np.nan
     )
-    conn.commit()
-    cur.close()
-    conn.close()
+    reflectivity_data = regrid_azimuth(
+        reflectivity_data, radar.azimuth["data"][sweep], SCAN_AZIMUTHS
+    )
+    geometry = sweep_geometry(radar, 0)
+    gates = geometry_cache().get(radar_id, geometry, *reflectivity_data.shape)
+    return scan_row(radar_id, scan_time, reflectivity_data, gates.bbox, geometry)
+
+
+def volume_rows(volumes, radar_id):
+    """
+    scan_rows for DecodedVolumes from services.scans.decode.decode_volumes (with
+    the default reader), closing each volume once its grid is encoded. Backfill:
+
+        store_scans(volume_rows(decode_volumes(paths), radar_id))
+    """
+    for volume in volumes:
+        with volume:
+            yield scan_row(
+                radar_id,
+                key_scan_time(volume.path),
+                regrid_azimuth(
+                    volume["reflectivity_0"], volume["azimuth_0"], SCAN_AZIMUTHS
+                ),
+                volume.meta["bbox"],
+                volume.meta["geometry"],
+            )
+
+
+def store_scans(rows, conn=None, page_size=100):
+    """
+    Inserts scan_row tuples in one transaction, page_size rows per statement.
+    rows may be a generator; it is consumed page by page, so only one page of
+    encoded grids is held at a time. Uses a pooled connection unless conn is given,
+    in which case committing is left to the caller. Returns the number of rows.
+    """
+    rows = iter(rows)
+    count = 0
+
+    def insert(conn):
+        nonlocal count
+        with conn.cursor() as cur:
+            while page := list(islice(rows, page_size)):
+                ensure_partitions(conn, [row[1] for row in page])
+                psycopg2.extras.execute_values(
+                    cur, INSERT_SCANS_SQL, page, page_size=page_size
+                )
+                count += len(page)
+
+    if conn is not None:
+        insert(conn)
+    else:
+        with pooled_connection() as pooled:
+            insert(pooled)
+    return count
+
+
+def store_scan_in_postgres(scan, radar, radar_id):
+    store_scans([radar_scan_row(scan, radar, radar_id)])
     print("  Stored in Postgres.", end="\n\n")
@@ -1,14 +1,132 @@
+import asyncio
 import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
 
 import psycopg2
+import psycopg2.pool
+
+PG_POOL_MIN = int(os.environ.get("PG_POOL_MIN", "1"))
+PG_POOL_MAX = int(os.environ.get("PG_POOL_MAX", "8"))
+
+
+def connection_kwargs():
+    return {
+        "host": os.getenv("PG_HOST", "localhost"),
+        "database": os.getenv("PG_DATABASE", "weather_db"),
+        "user": os.getenv("PG_USER", "admin"),
+        "password": os.getenv("PG_PASSWORD", "password"),
+        "port": os.getenv("PG_PORT", "5432"),
+    }
 
 
 def get_postgres_connection():
-    conn = psycopg2.connect(
-        host=os.getenv("PG_HOST", "localhost"),
-        database=os.getenv("PG_DATABASE", "weather_db"),
-        user=os.getenv("PG_USER", "admin"),
-        password=os.getenv("PG_PASSWORD", "password"),
-        port=os.getenv("PG_PORT", "5432"),
-    )
+    conn = psycopg2.connect(**connection_kwargs())
     return conn
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of psycopg2 connections. Unlike psycopg2's own pools, getting
+    a connection waits for one to be returned when all maxconn are in use instead
+    of raising. A pool used after fork (e.g. in a process pool worker) reconnects
+    rather than sharing the parent's sockets.
+    """
+
+    def __init__(self, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX, **kwargs):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.kwargs = kwargs or connection_kwargs()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self.minconn, self.maxconn, **self.kwargs
+                )
+                self._pid = os.getpid()
+            return self._pool
+
+    def getconn(self):
+        self._slots.acquire()
+        try:
+            return self._get_pool().getconn()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            self._get_pool().putconn(conn, close=close or bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """A pooled connection; commits on success and rolls back on error."""
+        conn = self.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self.putconn(conn)
+
+    def closeall(self):
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.closeall()
+            self._pool = None
+
+
+class AsyncConnectionPool:
+    """
+    asyncio front end to a ConnectionPool: run(fn, *args) calls fn(conn, *args)
+    with a pooled connection in a worker thread, so queries don't block the event
+    loop and at most maxconn run at once.
+    """
+
+    def __init__(self, pool=None):
+        self.pool = pool or get_pool()
+        self._slots = None
+
+    @asynccontextmanager
+    async def _slot(self):
+        # Created lazily so the semaphore belongs to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool.maxconn)
+        async with self._slots:
+            yield
+
+    async def run(self, fn, *args):
+        def call():
+            with self.pool.connection() as conn:
+                return fn(conn, *args)
+
+        async with self._slot():
+            return await asyncio.to_thread(call)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide ConnectionPool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+        return _pool
+
+
+def pooled_connection():
+    """Context manager for a connection from the process-wide pool."""
+    return get_pool().connection()
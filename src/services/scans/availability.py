@@ -0,0 +1,120 @@
+import asyncio
+from bisect import bisect_left, bisect_right
+
+import pandas as pd
+
+from services.scans.downloader import day_prefixes, scan_time
+
+
+class _DayListing:
+    """Sorted scan times (epoch seconds) and keys of one radar for one UTC day."""
+
+    def __init__(self):
+        self.times = []
+        self.keys = []
+        self.last_key = None
+        self.listed_at = None
+        self.complete = False
+        self.lock = asyncio.Lock()
+
+    def extend(self, keys):
+        # Listings are lexicographic, which for one radar/day is also time order
+        for key in keys:
+            self.last_key = key
+            if key.endswith("_MDM"):
+                continue
+            self.times.append(int(scan_time(key).timestamp()))
+            self.keys.append(key)
+
+
+class ScanAvailabilityIndex:
+    """
+    Local index of which Level II volumes exist, per radar and UTC day.
+
+    A day is listed from the source the first time it is queried and then only
+    refreshed incrementally (listing keys after the last one seen), at most every
+    refresh_s seconds; past days are listed once. Queries bisect the sorted scan
+    times. A background `poll` keeps the current day of selected radars fresh.
+    """
+
+    def __init__(self, source, refresh_s=60):
+        self.source = source
+        self.refresh_s = refresh_s
+        self._days = {}
+
+    def _stale(self, listing, now):
+        if listing.complete:
+            return False
+        return (
+            listing.listed_at is None
+            or (now - listing.listed_at).total_seconds() >= self.refresh_s
+        )
+
+    async def _listing(self, radar_id, day):
+        listing = self._days.setdefault((radar_id, day), _DayListing())
+        if self._stale(listing, pd.Timestamp.now("UTC")):
+            async with listing.lock:
+                # Another request may have refreshed it while we waited
+                now = pd.Timestamp.now("UTC")
+                if self._stale(listing, now):
+                    await self._refresh(listing, radar_id, day, now)
+        return listing
+
+    async def _refresh(self, listing, radar_id, day, now):
+        (prefix,) = day_prefixes(radar_id, day, day)
+        keys = await asyncio.to_thread(self.source.list, prefix, listing.last_key)
+        listing.extend(keys)
+        listing.listed_at = now
+        # Nothing is added to a day's prefix once the next day has begun (with slack
+        # for volumes uploaded late)
+        listing.complete = now - day > pd.Timedelta(days=1, hours=1)
+
+    async def refresh(self, radar_id, day=None):
+        """Lists new volumes for radar_id on day (default: today) right away."""
+        day = (day or pd.Timestamp.now("UTC")).floor("D")
+        listing = self._days.setdefault((radar_id, day), _DayListing())
+        async with listing.lock:
+            await self._refresh(listing, radar_id, day, pd.Timestamp.now("UTC"))
+
+    async def scans_between(self, radar_id, start, end):
+        """Keys of radar_id's volumes with start <= scan time <= end, oldest first."""
+        keys = []
+        for day in pd.date_range(start.floor("D"), end.floor("D"), freq="D"):
+            listing = await self._listing(radar_id, day)
+            lo = bisect_left(listing.times, int(start.timestamp()))
+            hi = bisect_right(listing.times, int(end.timestamp()))
+            keys.extend(listing.keys[lo:hi])
+        return keys
+
+    async def latest_before(self, radar_id, t, max_days_back=1):
+        """Key of radar_id's latest volume at or before t, or None."""
+        day = t.floor("D")
+        for _ in range(max_days_back + 1):
+            listing = await self._listing(radar_id, day)
+            i = bisect_right(listing.times, int(t.timestamp()))
+            if i:
+                return listing.keys[i - 1]
+            day -= pd.Timedelta(days=1)
+        return None
+
+    async def poll(self, radar_ids, interval_s=60):
+        """Refreshes today's listing for radar_ids every interval_s, forever."""
+        while True:
+            now = pd.Timestamp.now("UTC")
+            days = [now.floor("D")]
+            if now - now.floor("D") < pd.Timedelta(hours=1):
+                days.append(days[0] - pd.Timedelta(days=1))
+            results = await asyncio.gather(
+                *(self.refresh(r, day) for r in radar_ids for day in days),
+                return_exceptions=True,
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"Scan availability refresh failed: {result}")
+            await asyncio.sleep(interval_s)
+
+    def stats(self):
+        return {
+            "days": len(self._days),
+            "scans": sum(len(listing.keys) for listing in self._days.values()),
+        }
@@ -0,0 +1,421 @@
+import asyncio
+import fcntl
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+SCAN_CACHE_MAX_BYTES = int(os.environ.get("SCAN_CACHE_MAX_BYTES", "3221225472"))
+# lru, or lfu (least hits first, least recently used among equal hits)
+SCAN_CACHE_POLICY = os.environ.get("SCAN_CACHE_POLICY", "lru")
+# How often the evicting worker checks the directory size, besides its own adds
+SCAN_CACHE_EVICT_INTERVAL_S = float(os.environ.get("SCAN_CACHE_EVICT_INTERVAL_S", "30"))
+
+
+INDEX_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS entries (
+        name TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        last_access REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )""",
+    "CREATE INDEX IF NOT EXISTS entries_lru ON entries (last_access, name)",
+    "CREATE INDEX IF NOT EXISTS entries_lfu ON entries (hits, last_access, name)",
+    """CREATE TABLE IF NOT EXISTS totals (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        entries INTEGER NOT NULL,
+        bytes INTEGER NOT NULL
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+        UPDATE totals SET entries = entries + 1, bytes = bytes + new.size;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+        UPDATE totals SET entries = entries - 1, bytes = bytes - old.size;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS entries_resize AFTER UPDATE OF size ON entries
+    BEGIN
+        UPDATE totals SET bytes = bytes - old.size + new.size;
+    END""",
+]
+# Columns CacheIndex.candidates orders by, per policy; name makes the order total
+EVICTION_ORDER = {
+    "lru": ("last_access", "name"),
+    "lfu": ("hits", "last_access", "name"),
+}
+
+
+class CacheIndex:
+    """
+    Size, last access and hit count of every file in a cache directory, kept in
+    SQLite under the directory (root/.index.sqlite), so every process using the
+    directory reads and updates one index. Triggers keep the entry count and total
+    size in a one-row table, so neither needs a scan, and eviction candidates come
+    in order from an index on the access columns.
+
+    scan() yields (name, size, mtime) for the files on disk. It runs when the index
+    is first created, to adopt files already there, and on reindex().
+    """
+
+    def __init__(self, root, scan):
+        self.scan = scan
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(root, ".index.sqlite"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as conn:
+            for sql in INDEX_SCHEMA:
+                conn.execute(sql)
+            created = conn.execute(
+                "INSERT OR IGNORE INTO totals VALUES (0, 0, 0)"
+            ).rowcount
+            if created:
+                self._reindex(conn)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _reindex(self, conn):
+        found = {name: (size, mtime) for name, size, mtime in self.scan()}
+        indexed = {name for (name,) in conn.execute("SELECT name FROM entries")}
+        conn.executemany(
+            "DELETE FROM entries WHERE name = ?",
+            [(name,) for name in indexed - found.keys()],
+        )
+        conn.executemany(
+            """INSERT INTO entries VALUES (?, ?, ?, 0) ON CONFLICT (name) DO UPDATE
+            SET size = excluded.size,
+                last_access = max(last_access, excluded.last_access)""",
+            [(name, size, mtime) for name, (size, mtime) in found.items()],
+        )
+
+    def reindex(self):
+        """
+        Reconciles the index with the directory, e.g. after files were copied in
+        or deleted by hand; takes newer mtimes as accesses.
+        """
+        with self._transaction() as conn:
+            self._reindex(conn)
+
+    def add(self, name, size):
+        """Indexes a new (or replaced) file as just accessed, with no hits."""
+        self._execute(
+            """INSERT INTO entries VALUES (?, ?, ?, 0) ON CONFLICT (name) DO UPDATE
+            SET size = excluded.size, last_access = excluded.last_access, hits = 0""",
+            (name, size, time.time()),
+        )
+
+    def hit(self, name, size):
+        """Records a read of a file, indexing it if it isn't yet."""
+        self._execute(
+            """INSERT INTO entries VALUES (?, ?, ?, 1) ON CONFLICT (name) DO UPDATE
+            SET size = excluded.size, last_access = excluded.last_access,
+                hits = hits + 1""",
+            (name, size, time.time()),
+        )
+
+    def remove(self, name):
+        """Drops a file from the index; returns its size, or None if not indexed."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT size FROM entries WHERE name = ?", (name,)
+            ).fetchone()
+            conn.execute("DELETE FROM entries WHERE name = ?", (name,))
+        return None if row is None else row[0]
+
+    def totals(self):
+        """(entries, bytes) of the whole directory."""
+        return self._execute("SELECT entries, bytes FROM totals")[0]
+
+    def candidates(self, policy, page=256):
+        """Yields indexed names in eviction order, fetched a page at a time."""
+        columns = ", ".join(EVICTION_ORDER[policy])
+        sql = f"SELECT {columns} FROM entries {{}} ORDER BY {columns} LIMIT {page}"
+        after = None
+        while True:
+            if after is None:
+                rows = self._execute(sql.format(""))
+            else:
+                where = f"WHERE ({columns}) > ({', '.join('?' * len(after))})"
+                rows = self._execute(sql.format(where), after)
+            for row in rows:
+                yield row[-1]
+            if len(rows) < page:
+                return
+            after = rows[-1]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ScanCache:
+    """
+    Bounded directory of downloaded scans, shared by the processes (e.g. API
+    workers) that each open a ScanCache on it.
+
+    Sizes, reads and hit counts live in a CacheIndex under the directory, so every
+    process sees the same total size and eviction order without scanning the
+    directory. get() checks the file on disk and adopts it if it isn't indexed.
+    Eviction follows reads (LRU, or LFU on the shared hit counts) and skips pinned
+    files, e.g. scans an in-flight prediction is reading. Pins are flock locks on
+    files under root/.pins, so they hold across processes.
+
+    Once over max_bytes, entries are evicted down to low_water * max_bytes. With
+    start(), a single process evicts: whichever holds the lock on root/.evict.lock,
+    every evict_interval_s and after its own adds; the directory can overshoot by
+    what the other workers download in between. Without start(), add() evicts
+    inline. Scans should be written under a temporary name and renamed into root
+    (as AsyncScanDownloader.download does) and then add()ed, so no process sees a
+    partial file and the index sees every file.
+    """
+
+    def __init__(
+        self,
+        root,
+        max_bytes=SCAN_CACHE_MAX_BYTES,
+        policy=SCAN_CACHE_POLICY,
+        low_water=0.9,
+        evict_interval_s=SCAN_CACHE_EVICT_INTERVAL_S,
+    ):
+        if policy not in EVICTION_ORDER:
+            raise ValueError(f"Unknown eviction policy: {policy}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.low_water = low_water
+        self.evict_interval_s = evict_interval_s
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._pins = Counter()
+        self._owner = None
+        self._wake = None
+        self._loop = None
+        self._task = None
+        os.makedirs(os.path.join(root, ".pins"), exist_ok=True)
+        self.index = CacheIndex(root, self._scan)
+
+    def _scan(self):
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name.startswith(".") or entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        yield entry.name, stat.st_size, stat.st_mtime
+                except FileNotFoundError:
+                    continue
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def _pin_path(self, name):
+        return os.path.join(self.root, ".pins", name)
+
+    def _lock_pin(self, name, operation):
+        """
+        fd holding a flock on name's pin file, or None if a non-blocking lock is
+        refused (another holder has it).
+        """
+        path = self._pin_path(name)
+        while True:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, operation)
+            except BlockingIOError:
+                os.close(fd)
+                return None
+            # An evicting process may have unlinked the pin file before we locked
+            # it; a lock on the old file would protect nothing, so take it again
+            try:
+                if os.fstat(fd).st_ino == os.stat(path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    def get(self, name):
+        """Path of a cached scan, recording the access, or None if not cached."""
+        path = self.path(name)
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            # Never cached, or deleted by hand: keep the shared size right
+            self.index.remove(name)
+            with self._lock:
+                self.misses += 1
+            return None
+        # Also adopts a file that was never add()ed
+        self.index.hit(name, size)
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def add(self, path):
+        """
+        Indexes a file just moved into root (e.g. by AsyncScanDownloader). Returns
+        its path, or None if another process already evicted it.
+        """
+        name = os.path.basename(path)
+        try:
+            size = os.path.getsize(self.path(name))
+        except FileNotFoundError:
+            return None
+        self.index.add(name, size)
+        if self.index.totals()[1] > self.max_bytes:
+            self._schedule_eviction()
+        return self.path(name)
+
+    def _pin(self, name):
+        fd = self._lock_pin(name, fcntl.LOCK_SH)
+        with self._lock:
+            self._pins[name] += 1
+        return fd
+
+    def _unpin(self, name, fd):
+        with self._lock:
+            self._pins[name] -= 1
+            if not self._pins[name]:
+                del self._pins[name]
+        os.close(fd)
+
+    @contextmanager
+    def pin(self, name):
+        """
+        Keeps name from being evicted, by any process, inside the block (it needn't
+        exist yet). Waits while an evicting process is deleting it.
+        """
+        fd = self._pin(name)
+        try:
+            yield self.path(name)
+        finally:
+            self._unpin(name, fd)
+
+    @asynccontextmanager
+    async def pin_async(self, name):
+        """pin() for coroutines; the lock is taken and released off the event loop."""
+        fd = await asyncio.to_thread(self._pin, name)
+        try:
+            yield self.path(name)
+        finally:
+            await asyncio.to_thread(self._unpin, name, fd)
+
+    def evict(self):
+        """
+        Evicts down to low_water * max_bytes if the directory is over max_bytes.
+        Returns bytes freed.
+        """
+        size = self.index.totals()[1]
+        if size <= self.max_bytes:
+            return 0
+        target = self.low_water * self.max_bytes
+        freed = 0
+        for name in self.index.candidates(self.policy):
+            if size - freed <= target:
+                break
+            fd = self._lock_pin(name, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            if fd is None:
+                # Pinned, by this or another process
+                continue
+            try:
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Error deleting {name}: {e}")
+                    continue
+                try:
+                    os.unlink(self._pin_path(name))
+                except FileNotFoundError:
+                    pass
+                removed = self.index.remove(name)
+            finally:
+                os.close(fd)
+            if removed is not None:
+                freed += removed
+                with self._lock:
+                    self.evicted += 1
+        return freed
+
+    def _schedule_eviction(self):
+        if self._task is None:
+            self.evict()
+        elif self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def _try_own(self):
+        """Becomes the evicting process if no other process is."""
+        fd = os.open(os.path.join(self.root, ".evict.lock"), os.O_RDWR | os.O_CREAT)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    async def _evict_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.evict_interval_s)
+            except TimeoutError:
+                pass
+            self._wake.clear()
+            # Retried every round, so another worker takes over if the owner exits
+            if self._owner is None:
+                self._owner = self._try_own()
+            if self._owner is not None:
+                await asyncio.to_thread(self.evict)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._evict_forever())
+        self._wake.set()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._owner is not None:
+            os.close(self._owner)
+            self._owner = None
+
+    def stats(self):
+        entries, size = self.index.totals()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "entries": entries,
+            "pinned": len(self._pins),
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "policy": self.policy,
+            "evicting": self._owner is not None,
+        }
@@ -0,0 +1,187 @@
+import io
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from services.scans.downloader import scan_time
+from services.scans.geometry import SCAN_AZIMUTHS, geometry_cache, sweep_geometry
+
+DECODE_WORKERS = int(os.environ.get("DECODE_WORKERS", str(os.cpu_count() or 1)))
+DECODE_FIELDS = ["reflectivity"]
+
+
+def read_sweep_arrays(path, fields=DECODE_FIELDS, sweeps=(0,), data=None):
+    """
+    Decodes the given fields and sweeps of a Level II volume. Returns the arrays
+    (float32, masked gates as NaN) keyed "<field>_<sweep>", plus "azimuth_<sweep>"
+    and "range", and a metadata dict with the scan time, fixed angles and the lat/lon
+    bounding box and geometry (see services.scans.geometry) of the first sweep.
+    data, if given, holds the volume's bytes and path only names it.
+    """
+    import pyart
+
+    radar = pyart.io.read_nexrad_archive(
+        path if data is None else io.BytesIO(data),
+        include_fields=list(fields),
+        scans=list(sweeps),
+    )
+    arrays = {"range": radar.range["data"].astype(np.float32)}
+    for i, sweep in enumerate(sweeps):
+        rays = radar.get_slice(i)
+        arrays[f"azimuth_{sweep}"] = radar.azimuth["data"][rays].astype(np.float32)
+        for field in fields:
+            data = radar.fields[field]["data"][rays]
+            arrays[f"{field}_{sweep}"] = np.ma.filled(data.astype(np.float32), np.nan)
+
+    # Volumes are named after their radar, e.g. KDVN20200810_163012_V06
+    radar_id = os.path.basename(path)[:4]
+    geometry = sweep_geometry(radar, 0)
+    gates = geometry_cache().get(radar_id, geometry, SCAN_AZIMUTHS, radar.ngates)
+    meta = {
+        "scan_time": radar.time["units"].split(" ")[-1],
+        "fixed_angles": radar.fixed_angle["data"].tolist(),
+        "bbox": gates.bbox,
+        "geometry": geometry,
+    }
+    return arrays, meta
+
+
+def _to_shared(arrays):
+    """Copies arrays into one new shared memory block; returns its name and layout."""
+    arrays = {name: np.ascontiguousarray(a) for name, a in arrays.items()}
+    layout, size = {}, 0
+    for name, a in arrays.items():
+        layout[name] = (size, a.shape, a.dtype.str)
+        size += -(-a.nbytes // 64) * 64
+    shm = SharedMemory(create=True, size=max(size, 1))
+    try:
+        for name, a in arrays.items():
+            offset, shape, dtype = layout[name]
+            np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)[...] = a
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    shm.close()
+    # The block now belongs to the parent, which unlinks it; without this the
+    # worker's resource tracker would also try to clean it up when the worker exits
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm.name, layout
+
+
+def decode_shared(path, reader=read_sweep_arrays, **kwargs):
+    """
+    Runs reader(path, **kwargs) and copies its arrays into shared memory. Meant to
+    run in a worker process; returns (shm_name, layout, meta), which the calling
+    process opens with DecodedVolume(path, *result) and must close.
+    """
+    arrays, meta = reader(path, **kwargs)
+    return (*_to_shared(arrays), meta)
+
+
+def _decode_chunk(paths, reader, kwargs):
+    results = []
+    for path in paths:
+        try:
+            results.append((path, *decode_shared(path, reader, **kwargs), None))
+        except Exception as e:  # noqa: BLE001
+            # Any reader error skips that volume instead of failing the whole chunk
+            results.append((path, None, None, None, repr(e)))
+    return results
+
+
+class DecodedVolume:
+    """
+    Arrays decoded by a worker process, viewed in place in shared memory. close()
+    (or leaving a with block) frees the memory, after which the arrays are invalid;
+    copy anything that must outlive it.
+    """
+
+    def __init__(self, path, shm_name, layout, meta):
+        self.path = path
+        self.meta = meta
+        self._shm = SharedMemory(name=shm_name)
+        self.arrays = {
+            name: np.ndarray(shape, dtype, buffer=self._shm.buf, offset=offset)
+            for name, (offset, shape, dtype) in layout.items()
+        }
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self):
+        if self._shm is None:
+            return
+        self.arrays = {}
+        self._shm.unlink()
+        self._shm.close()
+        self._shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _release(results):
+    for _, shm_name, _, _, error in results:
+        if error is None:
+            shm = SharedMemory(name=shm_name)
+            shm.close()
+            shm.unlink()
+
+
+def _scan_time_key(path):
+    try:
+        return scan_time(os.fspath(path)).value
+    except ValueError:
+        return 0
+
+
+def decode_volumes(
+    paths,
+    workers=DECODE_WORKERS,
+    chunksize=2,
+    max_pending=None,
+    reader=read_sweep_arrays,
+    **reader_kwargs,
+):
+    """
+    Decodes Level II volumes across a process pool, yielding a DecodedVolume per
+    readable file in scan time order. Paths are submitted in chunks of chunksize,
+    with at most max_pending chunks (default 2 per worker) decoded ahead of the
+    consumer to bound shared memory use. reader(path, **reader_kwargs) must be
+    picklable and return (arrays, meta); volumes that fail to decode are skipped.
+    """
+    paths = sorted(paths, key=_scan_time_key)
+    chunks = deque(paths[i : i + chunksize] for i in range(0, len(paths), chunksize))
+    max_pending = max_pending or 2 * workers
+    pending = deque()
+    results = []
+    with ProcessPoolExecutor(workers) as pool:
+        try:
+            while chunks or pending:
+                while chunks and len(pending) < max_pending:
+                    pending.append(
+                        pool.submit(
+                            _decode_chunk, chunks.popleft(), reader, reader_kwargs
+                        )
+                    )
+                results = pending.popleft().result()
+                while results:
+                    path, shm_name, layout, meta, error = results.pop(0)
+                    if error is not None:
+                        print(f"Could not decode {path}: {error}")
+                        continue
+                    yield DecodedVolume(path, shm_name, layout, meta)
+        finally:
+            # Consumer stopped early (or a worker died): free what was decoded ahead
+            _release(results)
+            for future in pending:
+                if not future.cancel() and future.exception() is None:
+                    _release(future.result())
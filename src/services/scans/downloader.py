@@ -0,0 +1,177 @@
+import asyncio
+import io
+import os
+import random
+import threading
+
+import pandas as pd
+
+NEXRAD_BUCKET = "noaa-nexrad-level2"
+
+
+def scan_time(key):
+    """Scan time encoded in a Level II key such as .../KDVN20200810_163012_V06."""
+    name = os.path.basename(key)
+    return pd.to_datetime(name[4:19], format="%Y%m%d_%H%M%S").tz_localize("UTC")
+
+
+def day_prefixes(radar_id, start, end):
+    """Bucket prefixes (YYYY/MM/DD/RADAR/) for every UTC day touched by [start, end]."""
+    days = pd.date_range(start.floor("D"), end.floor("D"), freq="D")
+    return [f"{day:%Y/%m/%d}/{radar_id}/" for day in days]
+
+
+class S3Source:
+    """Anonymous reads from the public NEXRAD bucket through one pooled boto3 client."""
+
+    def __init__(self, bucket=NEXRAD_BUCKET, max_pool_connections=32, client=None):
+        if client is None:
+            import boto3
+            from botocore import UNSIGNED
+            from botocore.config import Config
+
+            client = boto3.client(
+                "s3",
+                config=Config(
+                    signature_version=UNSIGNED,
+                    max_pool_connections=max_pool_connections,
+                    # Retries are handled by AsyncScanDownloader
+                    retries={"max_attempts": 1},
+                ),
+            )
+        self.bucket = bucket
+        self.client = client
+
+    def read(self, key, byte_range=None, chunk_size=1024 * 1024):
+        kwargs = {"Bucket": self.bucket, "Key": key}
+        if byte_range is not None:
+            kwargs["Range"] = f"bytes={byte_range[0]}-{byte_range[1] - 1}"
+        try:
+            body = self.client.get_object(**kwargs)["Body"]
+        except self.client.exceptions.NoSuchKey:
+            raise FileNotFoundError(key)
+        buffer = io.BytesIO()
+        for chunk in body.iter_chunks(chunk_size):
+            buffer.write(chunk)
+        return buffer.getvalue()
+
+    def list(self, prefix, start_after=None):
+        """Keys under prefix in lexicographic order, only those after start_after."""
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        if start_after:
+            kwargs["StartAfter"] = start_after
+        paginator = self.client.get_paginator("list_objects_v2")
+        return [
+            obj["Key"]
+            for page in paginator.paginate(**kwargs)
+            for obj in page.get("Contents", [])
+        ]
+
+
+class DirectorySource:
+    """Directory laid out like the bucket, for tests and offline replays."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def read(self, key, byte_range=None, chunk_size=None):
+        with open(os.path.join(self.root, key), "rb") as f:
+            if byte_range is None:
+                return f.read()
+            f.seek(byte_range[0])
+            return f.read(byte_range[1] - byte_range[0])
+
+    def list(self, prefix, start_after=None):
+        directory = os.path.join(self.root, os.path.dirname(prefix))
+        if not os.path.isdir(directory):
+            return []
+        keys = (f"{os.path.dirname(prefix)}/{name}" for name in os.listdir(directory))
+        return sorted(
+            key
+            for key in keys
+            if key.startswith(prefix) and (start_after is None or key > start_after)
+        )
+
+
+class AsyncScanDownloader:
+    """
+    Downloads scans into memory without blocking the event loop.
+
+    Blocking source reads run in worker threads, at most max_concurrency at a time,
+    and failed reads are retried with exponential backoff and jitter (missing keys
+    are not retried). Concurrent requests for the same key share one download.
+    """
+
+    def __init__(self, source=None, max_concurrency=8, retries=3, backoff_s=0.5):
+        self.source = source or S3Source(max_pool_connections=max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight = {}
+
+    async def fetch(self, key, byte_range=None):
+        """Returns the bytes of key (or of byte_range=(start, stop) within it)."""
+        request = (key, byte_range)
+        task = self._inflight.get(request)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, byte_range))
+            self._inflight[request] = task
+            task.add_done_callback(lambda _: self._inflight.pop(request, None))
+        # Shielded so one caller giving up doesn't cancel the download for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, byte_range):
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    return await asyncio.to_thread(self.source.read, key, byte_range)
+            except FileNotFoundError:
+                raise
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff_s * 2**attempt
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def fetch_many(self, keys):
+        return await asyncio.gather(*(self.fetch(key) for key in keys))
+
+    async def download(self, key, dest_dir):
+        """
+        Fetches key and writes it to dest_dir, returning the local path. The file
+        is written under a temporary name and renamed into place, so readers never
+        see a partial scan.
+        """
+        data = await self.fetch(key)
+        path = os.path.join(dest_dir, os.path.basename(key))
+
+        def write():
+            os.makedirs(dest_dir, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+
+        await asyncio.to_thread(write)
+        return path
+
+    async def list_scans(self, radar_id, start, end):
+        """Keys of radar_id's volumes (MDM files excluded) with start <= time <= end."""
+        listings = await asyncio.gather(
+            *(
+                asyncio.to_thread(self.source.list, prefix)
+                for prefix in day_prefixes(radar_id, start, end)
+            )
+        )
+        return [
+            key
+            for keys in listings
+            for key in keys
+            if not key.endswith("_MDM") and start <= scan_time(key) <= end
+        ]
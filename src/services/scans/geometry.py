@@ -0,0 +1,218 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Where gate locations are memory-mapped from (in memory only if unset)
+GEOMETRY_CACHE_DIR = os.environ.get("GEOMETRY_CACHE_DIR")
+GEOMETRY_CACHE_SIZE = int(os.environ.get("GEOMETRY_CACHE_SIZE", "32"))
+
+# Same earth models as pyart: 4/3 effective radius for beam propagation and a
+# sphere for the azimuthal equidistant projection around the radar
+EFFECTIVE_EARTH_RADIUS_M = 6371000.0 * 4.0 / 3.0
+AEQD_EARTH_RADIUS_M = 6370997.0
+
+# Stored sweeps are resampled to this many rays on a uniform azimuth grid
+SCAN_AZIMUTHS = 720
+
+# Columns of radar_scans describing where a stored sweep's gates are. The grid's
+# rows are rays on a uniform azimuth grid (row i centered on (i + 0.5) * 360 / n
+# degrees) and its columns gates at range_start + k * gate_spacing meters.
+GEOMETRY_COLUMNS = [
+    "site_lat",
+    "site_lon",
+    "site_alt",
+    "elevation",
+    "range_start",
+    "gate_spacing",
+]
+
+
+def sweep_geometry(radar, sweep=0):
+    """GEOMETRY_COLUMNS values of one sweep of a pyart Radar, as a dict."""
+    gate_range = radar.range["data"]
+    return {
+        "site_lat": float(radar.latitude["data"][0]),
+        "site_lon": float(radar.longitude["data"][0]),
+        "site_alt": float(radar.altitude["data"][0]),
+        "elevation": float(radar.fixed_angle["data"][sweep]),
+        "range_start": float(gate_range[0]),
+        "gate_spacing": float(gate_range[1] - gate_range[0]),
+    }
+
+
+def regrid_azimuth(data, azimuth, n_azimuth=SCAN_AZIMUTHS):
+    """
+    Rays of data (n_rays, n_gates) resampled to a uniform azimuth grid by taking
+    the nearest ray to each of n_azimuth centers. Shape is (n_azimuth, n_gates).
+    """
+    order = np.argsort(azimuth)
+    azimuth, data = azimuth[order], data[order]
+    centers = (np.arange(n_azimuth) + 0.5) * (360.0 / n_azimuth)
+    upper = np.searchsorted(azimuth, centers) % len(azimuth)
+    lower = (upper - 1) % len(azimuth)
+    dist_upper = np.abs((azimuth[upper] - centers + 180) % 360 - 180)
+    dist_lower = np.abs((azimuth[lower] - centers + 180) % 360 - 180)
+    return data[np.where(dist_lower <= dist_upper, lower, upper)]
+
+
+def ground_range(slant_range, elevation):
+    """Distance along the ground (m) to gates at slant_range (m), as pyart."""
+    e = np.radians(elevation)
+    r = np.asarray(slant_range, dtype=np.float64)
+    R = EFFECTIVE_EARTH_RADIUS_M
+    z = np.sqrt(r**2 + R**2 + 2.0 * r * R * np.sin(e)) - R
+    return R * np.arcsin(r * np.cos(e) / (R + z))
+
+
+def slant_range(ground, elevation, iterations=3):
+    """Inverse of ground_range, by fixed-point iteration (converges in a few steps)."""
+    e = np.radians(elevation)
+    s = np.asarray(ground, dtype=np.float64)
+    R = EFFECTIVE_EARTH_RADIUS_M
+    r = s / np.cos(e)
+    for _ in range(iterations):
+        z = np.sqrt(r**2 + R**2 + 2.0 * r * R * np.sin(e)) - R
+        r = (R + z) * np.sin(s / R) / np.cos(e)
+    return r
+
+
+def lonlat_to_polar(lon, lat, site_lon, site_lat):
+    """
+    Azimuth (degrees clockwise from north) and ground distance (m) of points seen
+    from the radar site, in pyart's azimuthal equidistant projection.
+    """
+    lam = np.radians(np.asarray(lon, dtype=np.float64) - site_lon)
+    phi = np.radians(np.asarray(lat, dtype=np.float64))
+    phi0 = np.radians(site_lat)
+    cos_c = np.sin(phi0) * np.sin(phi) + np.cos(phi0) * np.cos(phi) * np.cos(lam)
+    c = np.arccos(np.clip(cos_c, -1.0, 1.0))
+    x = np.cos(phi) * np.sin(lam)
+    y = np.cos(phi0) * np.sin(phi) - np.sin(phi0) * np.cos(phi) * np.cos(lam)
+    azimuth = np.degrees(np.arctan2(x, y)) % 360.0
+    return azimuth, AEQD_EARTH_RADIUS_M * c
+
+
+def gate_lat_lon_alt(geometry, n_azimuth, n_gates):
+    """
+    Latitude, longitude and altitude (float32, each (n_azimuth, n_gates)) of the
+    gates of a sweep on the uniform azimuth grid of regrid_azimuth, computed the
+    way pyart's Radar.get_gate_lat_lon_alt does.
+    """
+    from pyart.core.transforms import (
+        antenna_vectors_to_cartesian,
+        cartesian_to_geographic_aeqd,
+    )
+
+    ranges = geometry["range_start"] + geometry["gate_spacing"] * np.arange(n_gates)
+    azimuths = (np.arange(n_azimuth) + 0.5) * (360.0 / n_azimuth)
+    elevations = np.full(n_azimuth, geometry["elevation"])
+    x, y, z = antenna_vectors_to_cartesian(ranges, azimuths, elevations)
+    lon, lat = cartesian_to_geographic_aeqd(
+        x, y, geometry["site_lon"], geometry["site_lat"], R=AEQD_EARTH_RADIUS_M
+    )
+    alt = z + geometry["site_alt"]
+    return tuple(a.astype(np.float32) for a in (lat, lon, alt))
+
+
+class GateGeometry:
+    """Gate locations of one sweep layout, and their (min_lon, max_lon, min_lat, max_lat)."""
+
+    def __init__(self, lat, lon, alt):
+        self.lat = lat
+        self.lon = lon
+        self.alt = alt
+        self.bbox = (
+            float(lon.min()),
+            float(lon.max()),
+            float(lat.min()),
+            float(lat.max()),
+        )
+
+
+class GeometryCache:
+    """
+    GateGeometry per (radar_id, elevation, range_start, gate_spacing, n_azimuth,
+    n_gates), so the trigonometry is done once per radar and scan layout instead of
+    once per scan. The last max_entries are kept in memory. With a root directory
+    the arrays are also saved there as .npy files and memory-mapped back, so they
+    are shared by every process (API workers, decode workers) on the machine.
+    """
+
+    def __init__(self, root=None, max_entries=32):
+        self.root = root
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(radar_id, geometry, n_azimuth, n_gates):
+        return (
+            radar_id,
+            round(geometry["elevation"], 2),
+            round(geometry["range_start"], 1),
+            round(geometry["gate_spacing"], 1),
+            n_azimuth,
+            n_gates,
+        )
+
+    def _path(self, key):
+        radar_id, elevation, start, spacing, n_azimuth, n_gates = key
+        name = f"{elevation}_{start}_{spacing}_{n_azimuth}x{n_gates}.npy"
+        return os.path.join(self.root, radar_id, name)
+
+    def _load(self, key, geometry):
+        if not self.root:
+            return gate_lat_lon_alt(geometry, *key[-2:])
+        path = self._path(key)
+        if not os.path.exists(path):
+            arrays = np.stack(gate_lat_lon_alt(geometry, *key[-2:]))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, arrays)
+            os.replace(tmp, path)
+        return tuple(np.load(path, mmap_mode="r"))
+
+    def get(self, radar_id, geometry, n_azimuth, n_gates):
+        """GateGeometry of a sweep with the given sweep_geometry and grid shape."""
+        key = self.key(radar_id, geometry, n_azimuth, n_gates)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        entry = GateGeometry(*self._load(key, geometry))
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def for_sweep(self, radar_id, radar, sweep=0, n_azimuth=SCAN_AZIMUTHS):
+        """GateGeometry of one sweep of a pyart Radar, regridded to n_azimuth rays."""
+        return self.get(radar_id, sweep_geometry(radar, sweep), n_azimuth, radar.ngates)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
+
+
+_cache = None
+
+
+def geometry_cache():
+    """Process-wide GeometryCache (GEOMETRY_CACHE_DIR, GEOMETRY_CACHE_SIZE)."""
+    global _cache
+    if _cache is None:
+        _cache = GeometryCache(GEOMETRY_CACHE_DIR, GEOMETRY_CACHE_SIZE)
+    return _cache
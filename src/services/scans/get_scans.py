@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 # import json
+import asyncio
 import os
 import tempfile
 
@@ -11,6 +12,9 @@ import tempfile
 import nexradaws
 import pandas as pd
 
+from services.scans.downloader import AsyncScanDownloader
+from services.scans.reports import default_store, normalize_reports
+
 # import psycopg2
 # import pyart
 # import pytz
@@ -37,27 +41,51 @@ def download_scans(radar_id, start, temp_dir, scan_count=None):
     return results
 
 
+async def download_scans_async(
+    radar_id, start, temp_dir, scan_count=None, downloader=None, availability=None
+):
+    """
+    Async counterpart of download_scans using a shared AsyncScanDownloader.
+    Available scans come from the ScanAvailabilityIndex when one is given instead
+    of listing the bucket. Returns the local paths of the volumes, oldest first.
+    """
+    downloader = downloader or AsyncScanDownloader()
+    end = start + pd.Timedelta(minutes=int(60 * 5.5))
+    if availability is not None:
+        keys = await availability.scans_between(radar_id, start, end)
+    else:
+        keys = await downloader.list_scans(radar_id, start, end)
+    if not keys:
+        print("No scans available for the given time range and radar ID.")
+        return []
+
+    print(f"There are {len(keys)} scans available between {start} and {end}\n")
+
+    if scan_count:
+        keys = keys[0:scan_count]
+
+    return await asyncio.gather(*(downloader.download(k, temp_dir) for k in keys))
+
+
 def load_and_convert(url, start, end):
-    df = pd.read_csv(url)
-    df["datetime"] = pd.to_datetime(df.date + " " + df.time)
-    df.set_index("datetime", inplace=True)
-    df.index = df.index.tz_localize(
-        "Etc/GMT+6", ambiguous="NaT", nonexistent="shift_forward"
-    ).tz_convert("UTC")
-    df.sort_index(inplace=True)
+    df = normalize_reports(pd.read_csv(url))
     start_str = (start - pd.Timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M")
     end_str = (end + pd.Timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M")
     return df[start_str:end_str]
 
 
-def get_severe_reports(year, start, end):
-    year_str = str(year)
-    wind_url = f"https://www.spc.noaa.gov/wcm/data/{year_str}_wind.csv"
-    torn_url = f"https://www.spc.noaa.gov/wcm/data/{year_str}_torn.csv"
-    hail_url = f"https://www.spc.noaa.gov/wcm/data/{year_str}_hail.csv"
-    wind_rpts = load_and_convert(wind_url, start, end)
-    tor_rpts = load_and_convert(torn_url, start, end)
-    hail_rpts = load_and_convert(hail_url, start, end)
+def get_severe_reports(year, start, end, bbox=None, store=None):
+    """
+    Wind, tornado and hail reports from 30 minutes before start to 30 minutes
+    after end, from the local ReportStore (year's files are fetched once). year
+    is kept for callers; the window decides which years are read.
+    """
+    store = store or default_store()
+    start = start - pd.Timedelta(minutes=30)
+    end = end + pd.Timedelta(minutes=30)
+    wind_rpts = store.reports("wind", start, end, bbox)
+    tor_rpts = store.reports("torn", start, end, bbox)
+    hail_rpts = store.reports("hail", start, end, bbox)
     return wind_rpts, tor_rpts, hail_rpts
 
 
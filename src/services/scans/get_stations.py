@@ -1,12 +1,50 @@
+import hashlib
+import os
+from dataclasses import dataclass
 from math import atan2, cos, radians, sin, sqrt
 
+import numpy as np
 import pandas as pd
 from geopy.geocoders import Nominatim
 
+from services.scans.station_index import EARTH_RADIUS_KM, StationIndex
+
+STATIONS_CSV = os.environ.get("STATIONS_CSV", "data/nexrad_stations.csv")
+STATIONS_HOT_RELOAD = os.environ.get("STATIONS_HOT_RELOAD", "0") == "1"
+
+
+_stations = None
+_stations_source = None
+
+
+def load_stations(path=STATIONS_CSV, hot_reload=STATIONS_HOT_RELOAD):
+    """
+    Returns the process-wide StationIndex, reading the CSV on first use.
+    With hot_reload the CSV mtime is checked on each call and the index is rebuilt
+    when it changes.
+    """
+    global _stations, _stations_source
+    if _stations is not None and _stations_source[0] == path and not hot_reload:
+        return _stations
+
+    mtime = os.path.getmtime(path)
+    if _stations is None or _stations_source[:2] != (path, mtime):
+        with open(path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        _stations = StationIndex.from_csv(path)
+        _stations_source = (path, mtime, digest)
+    return _stations
+
+
+def stations_digest():
+    """SHA-256 of the station CSV backing the current StationIndex."""
+    load_stations()
+    return _stations_source[2]
+
 
 def haversine_distance(lat1, lon1, lat2, lon2):
     """Calculate distance between two points (in km) using the Haversine formula."""
-    R = 6371.0  # Earth's radius in kilometers
+    R = EARTH_RADIUS_KM
     dlat = radians(lat2 - lat1)
     dlon = radians(lon2 - lon1)
     a = (
@@ -17,40 +55,77 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     return R * c
 
 
-def get_radars(target_lat, target_lon, radius_km=100, output_format="list"):
-    station_df = pd.read_csv("data/nexrad_stations.csv")
-    station_df["distance_km"] = station_df.apply(
-        lambda row: haversine_distance(
-            target_lat, target_lon, row["Latitude"], row["Longitude"]
-        ),
-        axis=1,
-    )
-    nearby_radars = station_df[station_df["distance_km"] <= radius_km].sort_values(
-        "distance_km"
-    )
+@dataclass(slots=True)
+class RadarRecord:
+    """One radar of a get_radars result; the JSON encoders serialize it as is."""
 
+    radar_id: str
+    lat: float
+    lon: float
+    distance: float
+
+
+def format_radars(stations, idx, dist, output_format="list"):
+    """Formats the StationIndex entries at idx (distances dist) as get_radars output."""
     if output_format == "list":
-        return nearby_radars["Radar ID"].tolist()
-    elif output_format == "json":
-        json_df = nearby_radars[
-            ["Radar ID", "Latitude", "Longitude", "distance_km"]
-        ].rename(
-            columns={
-                "Radar ID": "radar_id",
-                "Latitude": "lat",
-                "Longitude": "lon",
-                "distance_km": "distance",
-            }
+        return stations.ids[idx].tolist()
+    elif output_format in ("json", "records"):
+        rows = zip(
+            stations.ids[idx].tolist(),
+            stations.lat_deg[idx].tolist(),
+            stations.lon_deg[idx].tolist(),
+            dist.tolist(),
         )
-        return json_df.to_dict(orient="records")
+        if output_format == "records":
+            return [RadarRecord(*row) for row in rows]
+        return [
+            {"radar_id": radar_id, "lat": lat, "lon": lon, "distance": d}
+            for radar_id, lat, lon, d in rows
+        ]
     elif output_format == "readable":
-        return nearby_radars[
-            ["Radar ID", "Latitude", "Longitude", "distance_km"]
-        ].to_string(index=False)
+        return pd.DataFrame(
+            {
+                "Radar ID": stations.ids[idx],
+                "Latitude": stations.lat_deg[idx],
+                "Longitude": stations.lon_deg[idx],
+                "distance_km": dist,
+            }
+        ).to_string(index=False)
     else:
         raise ValueError(
-            "Invalid output_format. Expected 'list', 'json', or 'readable'"
+            "Invalid output_format. Expected 'list', 'json', 'records' or 'readable'"
+        )
+
+
+def get_radars(target_lat, target_lon, radius_km=100, output_format="list"):
+    stations = load_stations()
+    idx, dist = stations.within(target_lat, target_lon, radius_km)
+    return format_radars(stations, idx, dist, output_format)
+
+
+def get_nearest_radars(target_lat, target_lon, k=None, output_format="list"):
+    """Returns the k radars nearest to the target (all radars if k is None)."""
+    stations = load_stations()
+    idx, dist = stations.nearest(target_lat, target_lon, k)
+    return format_radars(stations, idx, dist, output_format)
+
+
+def iter_radars_batch(lats, lons, radius_km=100, output_format="list", chunk_size=1024):
+    """
+    Yields get_radars output for each (lat, lon) point in order. Distances are computed
+    as one points x stations matrix per chunk, so memory stays bounded for huge batches.
+    """
+    stations = load_stations()
+    lats = np.asarray(lats, dtype=np.float64)
+    lons = np.asarray(lons, dtype=np.float64)
+    for start in range(0, len(lats), chunk_size):
+        dist = stations.distance_matrix(
+            lats[start : start + chunk_size], lons[start : start + chunk_size]
         )
+        for row in dist:
+            idx = np.flatnonzero(row <= radius_km)
+            idx = idx[np.argsort(row[idx], kind="stable")]
+            yield format_radars(stations, idx, row[idx], output_format)
 
 
 if __name__ == "__main__":
@@ -74,8 +149,8 @@ if __name__ == "__main__":
 
     radius_km = 200
     nearby_radars = get_radars(target_lat, target_lon, radius_km)
-    if nearby_radars.empty:
+    if not nearby_radars:
         print(f"No radars found within {radius_km} km of the provided location.")
     else:
         print("Nearby Radars:")
-        print(nearby_radars[["Radar ID", "Site Name", "distance_km"]])
+        print(get_radars(target_lat, target_lon, radius_km, output_format="readable"))
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Long-running ingest of new NEXRAD volumes into storage.
+
+One poller per radar discovers new volumes through a ScanAvailabilityIndex (MDM
+files are dropped there, before anything is downloaded) and feeds bounded queues
+through three worker pools: download -> decode/preprocess -> store. A full queue
+blocks the stage before it, so a slow database throttles downloads instead of
+piling volumes up in memory.
+
+    python -m services.scans.ingest KDVN KLOT
+
+INGEST_SOURCE_DIR points the pipeline at a local file drop laid out like the
+bucket instead of S3.
+"""
+
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from services.scans.availability import ScanAvailabilityIndex
+from services.scans.decode import DecodedVolume, decode_shared
+from services.scans.downloader import AsyncScanDownloader, DirectorySource, scan_time
+
+
+class IngestedScan:
+    """A volume moving through the pipeline."""
+
+    def __init__(self, radar_id, key):
+        self.radar_id = radar_id
+        self.key = key
+        self.filename = os.path.basename(key)
+        self.scan_time = scan_time(key)
+        self.discovered = time.perf_counter()
+        self.data = None
+        self.radar = None
+        self.sample = None
+
+
+class StageStats:
+    def __init__(self, window=1000):
+        self.count = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds):
+        self.count += 1
+        self.latencies.append(seconds)
+
+    def summary(self):
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else None,
+            "p95_ms": float(np.percentile(latencies, 95)) if len(latencies) else None,
+            "max_ms": float(latencies.max()) if len(latencies) else None,
+        }
+
+
+def decode_volume(scan):
+    """Decodes the lowest sweep of scan in a worker process (see scans.decode)."""
+    return decode_shared(scan.key, data=scan.data)
+
+
+def store_volume(scan):
+    from services.postgres.store import store_scans, volume_rows
+
+    store_scans(volume_rows([scan.radar], scan.radar_id))
+
+
+def release(scan):
+    """Frees the shared memory of a decoded volume, once stored or dropped."""
+    if isinstance(scan.radar, DecodedVolume):
+        scan.radar.close()
+
+
+class IngestPipeline:
+    """
+    Polls radar_ids for volumes newer than `since` and pushes each one through
+    download, decode (-> scan.radar, + optional preprocess(scan) -> scan.sample)
+    and store stages. decode and store are blocking callables run in worker
+    threads, except that with decode_processes (the default for decode_volume)
+    decode runs in a pool of decode_workers processes. It must then be picklable
+    and return decode_shared's result; scan.radar is the DecodedVolume, freed once
+    the volume is stored or dropped.
+    """
+
+    def __init__(
+        self,
+        radar_ids,
+        downloader=None,
+        availability=None,
+        decode=decode_volume,
+        preprocess=None,
+        store=store_volume,
+        since=None,
+        poll_interval_s=60,
+        queue_size=8,
+        download_workers=4,
+        decode_workers=2,
+        store_workers=1,
+        decode_processes=None,
+    ):
+        self.radar_ids = list(radar_ids)
+        self.downloader = downloader or AsyncScanDownloader()
+        self.availability = availability or ScanAvailabilityIndex(
+            self.downloader.source
+        )
+        self.decode = decode
+        self.decode_processes = (
+            decode is decode_volume if decode_processes is None else decode_processes
+        )
+        self._decode_pool = None
+        self.preprocess = preprocess
+        self.store = store
+        self.since = since or pd.Timestamp.now("UTC") - pd.Timedelta(minutes=30)
+        self.poll_interval_s = poll_interval_s
+        self.workers = {
+            "download": download_workers,
+            "decode": decode_workers,
+            "store": store_workers,
+        }
+        self.queues = {stage: asyncio.Queue(queue_size) for stage in self.workers}
+        self.stats = {stage: StageStats() for stage in (*self.workers, "end_to_end")}
+        self._seen = {radar_id: None for radar_id in self.radar_ids}
+        self._poll_locks = {radar_id: asyncio.Lock() for radar_id in self.radar_ids}
+        self._tasks = []
+        self._started = None
+
+    async def start(self):
+        self._started = time.perf_counter()
+        if self.decode_processes:
+            self._decode_pool = ProcessPoolExecutor(self.workers["decode"])
+        for radar_id in self.radar_ids:
+            self._tasks.append(asyncio.create_task(self._poll(radar_id)))
+        for stage, n in self.workers.items():
+            for _ in range(n):
+                self._tasks.append(asyncio.create_task(self._work(stage)))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Volumes still queued for storage hold shared memory
+        for queue in self.queues.values():
+            while not queue.empty():
+                release(queue.get_nowait())
+                queue.task_done()
+        if self._decode_pool is not None:
+            self._decode_pool.shutdown(cancel_futures=True)
+            self._decode_pool = None
+
+    async def join(self):
+        """Waits until every volume discovered so far has been through all stages."""
+        for stage in self.workers:
+            await self.queues[stage].join()
+
+    async def poll_once(self, radar_id):
+        """Queues volumes of radar_id newer than the last one seen."""
+        async with self._poll_locks[radar_id]:
+            await self._poll_once(radar_id)
+
+    async def _poll_once(self, radar_id):
+        await self.availability.refresh(radar_id)
+        last = self._seen[radar_id]
+        start = self.since if last is None else last.scan_time
+        keys = await self.availability.scans_between(
+            radar_id, start, pd.Timestamp.now("UTC")
+        )
+        for key in keys:
+            if last is not None and key <= last.key:
+                continue
+            last = IngestedScan(radar_id, key)
+            # Blocks while downloads are backed up
+            await self.queues["download"].put(last)
+            self._seen[radar_id] = last
+
+    async def _poll(self, radar_id):
+        while True:
+            try:
+                await self.poll_once(radar_id)
+            except Exception as e:  # noqa: BLE001
+                # Keep polling through transient listing errors
+                print(f"Polling {radar_id} failed: {e}")
+            await asyncio.sleep(self.poll_interval_s)
+
+    async def _run_stage(self, stage, scan):
+        if stage == "download":
+            scan.data = await self.downloader.fetch(scan.key)
+        elif stage == "decode":
+            if self._decode_pool is None:
+                scan.radar = await asyncio.to_thread(self.decode, scan)
+            else:
+                loop = asyncio.get_running_loop()
+                shared = await loop.run_in_executor(
+                    self._decode_pool, self.decode, scan
+                )
+                scan.radar = DecodedVolume(scan.key, *shared)
+            scan.data = None
+            if self.preprocess is not None:
+                scan.sample = await asyncio.to_thread(self.preprocess, scan)
+        else:
+            await asyncio.to_thread(self.store, scan)
+
+    async def _work(self, stage):
+        stages = list(self.workers)
+        queue = self.queues[stage]
+        while True:
+            scan = await queue.get()
+            start = time.perf_counter()
+            try:
+                await self._run_stage(stage, scan)
+            except Exception as e:  # noqa: BLE001
+                # A bad volume is counted and dropped; the worker moves on
+                self.stats[stage].errors += 1
+                print(f"{stage} failed for {scan.key}: {e}")
+                release(scan)
+                continue
+            else:
+                self.stats[stage].record(time.perf_counter() - start)
+                i = stages.index(stage)
+                if i + 1 < len(stages):
+                    # Blocks while the next stage is backed up
+                    await self.queues[stages[i + 1]].put(scan)
+                else:
+                    release(scan)
+                    self.stats["end_to_end"].record(
+                        time.perf_counter() - scan.discovered
+                    )
+            finally:
+                queue.task_done()
+
+    def metrics(self):
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        stored = self.stats["store"].count
+        return {
+            "volumes_per_min": stored / elapsed * 60 if elapsed else 0.0,
+            "stages": {stage: s.summary() for stage, s in self.stats.items()},
+            "queue_depth": {stage: q.qsize() for stage, q in self.queues.items()},
+        }
+
+
+async def run(radar_ids, report_interval_s=60):
+    source_dir = os.environ.get("INGEST_SOURCE_DIR")
+    downloader = AsyncScanDownloader(
+        DirectorySource(source_dir) if source_dir else None
+    )
+    pipeline = IngestPipeline(radar_ids, downloader=downloader)
+    await pipeline.start()
+    try:
+        while True:
+            await asyncio.sleep(report_interval_s)
+            print(pipeline.metrics())
+    finally:
+        await pipeline.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(sys.argv[1:] or ["KDVN"]))
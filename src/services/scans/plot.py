@@ -1,52 +1,65 @@
 #!/usr/bin/env python3
 
-import json
-
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
-import numpy as np
 
-from src.services.postgres.utils import get_postgres_connection
+from services.postgres.grid import decode_grid, json_grid_to_array
+from services.postgres.query import SCAN_ITERSIZE
+from services.postgres.utils import pooled_connection
+from services.scans.geometry import GEOMETRY_COLUMNS, geometry_cache
 
 
-def query_scans():
+def query_scans(itersize=SCAN_ITERSIZE):
     """
-    Query the radar_scans table for all stored scans.
+    Streams all stored scans from the radar_scans table, oldest first. Rows come
+    through a server-side cursor, itersize at a time, instead of all at once.
     """
-    conn = get_postgres_connection()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT radar_id, scan_time, grid_data, min_lon, max_lon, min_lat, max_lat
-        FROM radar_scans
-        ORDER BY scan_time;
-    """)
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
-    return rows
+    with (
+        pooled_connection() as conn,
+        conn.cursor(name="query_scans") as cur,
+    ):
+        cur.itersize = itersize
+        cur.execute("""
+            SELECT radar_id, scan_time, grid, grid_shape, grid_dtype, grid_scale,
+                grid_offset, grid_codec, grid_data, min_lon, max_lon, min_lat, max_lat,
+                site_lat, site_lon, site_alt, elevation, range_start, gate_spacing
+            FROM radar_scans
+            ORDER BY scan_time;
+        """)
+        yield from cur
 
 
 def plot_scan_from_db(scan):
-    radar_id, scan_time, grid_data_json, min_lon, max_lon, min_lat, max_lat = scan
-    grid_data = json.loads(grid_data_json)
-    reflectivity = grid_data.get("reflectivity", [])
-    refl_array = np.array(reflectivity)
-    if refl_array.ndim == 1:
-        refl_array = refl_array.reshape(1, -1)
+    radar_id, scan_time, *grid, grid_data_json = scan[:9]
+    min_lon, max_lon, min_lat, max_lat = scan[9:13]
+    if grid[0] is not None:
+        refl_array = decode_grid(*grid)
+    else:
+        # Row not yet converted by services.postgres.migrate_grids
+        refl_array = json_grid_to_array(grid_data_json)
 
     projection = ccrs.PlateCarree()
     fig, ax = plt.subplots(figsize=(10, 8), subplot_kw={"projection": projection})
     ax.set_extent([min_lon, max_lon, min_lat, max_lat])
 
-    im = ax.imshow(
-        refl_array,
-        origin="upper",
-        extent=[min_lon, max_lon, min_lat, max_lat],
-        cmap="HomeyerRainbow",
-        vmin=-7.5,
-        vmax=65,
-        transform=ccrs.PlateCarree(),
-    )
+    style = {
+        "cmap": "HomeyerRainbow",
+        "vmin": -7.5,
+        "vmax": 65,
+        "transform": ccrs.PlateCarree(),
+    }
+    if scan[13] is not None:
+        # Polar grid drawn at its gates' locations (cached per radar and layout)
+        geometry = dict(zip(GEOMETRY_COLUMNS, scan[13:]))
+        gates = geometry_cache().get(radar_id, geometry, *refl_array.shape)
+        im = ax.pcolormesh(gates.lon, gates.lat, refl_array, **style)
+    else:
+        im = ax.imshow(
+            refl_array,
+            origin="upper",
+            extent=[min_lon, max_lon, min_lat, max_lat],
+            **style,
+        )
     plt.colorbar(im, ax=ax, orientation="horizontal", pad=0.05)
     ax.set_title(f"Radar {radar_id} Reflectivity at {scan_time}")
     plt.show()
@@ -54,10 +67,11 @@ def plot_scan_from_db(scan):
 
 def main():
     scans = query_scans()
-    if not scans:
+    first_scan = next(scans, None)
+    scans.close()
+    if first_scan is None:
         print("No scans found in the database.")
         return
-    first_scan = scans[0]
     plot_scan_from_db(first_scan)
 
 
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Local store of SPC severe weather reports.
+
+Each year's wind, torn and hail CSVs are downloaded once, converted to UTC, sorted
+by time and written as Parquet under REPORT_STORE_DIR/<type>/<year>.parquet.
+Queries load a year's file once and slice it with a binary search on the sorted
+time index. A year is refreshed at most every REPORT_REFRESH_S seconds, with a
+conditional request so an unchanged file isn't downloaded or rewritten again,
+until it has been fetched REPORT_FINAL_AFTER_DAYS after the year ended (SPC
+keeps revising a year's reports for a while); after that it is final.
+
+    python -m services.scans.reports 2019 2020
+
+fetches the given years ahead of time.
+"""
+
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+SPC_REPORTS_URL = os.environ.get("SPC_REPORTS_URL", "https://www.spc.noaa.gov/wcm/data")
+REPORT_STORE_DIR = os.environ.get("REPORT_STORE_DIR", "./data/reports")
+REPORT_REFRESH_S = int(os.environ.get("REPORT_REFRESH_S", "21600"))
+REPORT_FINAL_AFTER_DAYS = int(os.environ.get("REPORT_FINAL_AFTER_DAYS", "90"))
+REPORT_TYPES = ["wind", "torn", "hail"]
+
+
+def normalize_reports(df):
+    """
+    Indexes SPC report rows by their time in UTC, sorted. SPC's date/time columns
+    are in CST (UTC-6) year round.
+    """
+    df = df.copy()
+    df["datetime"] = pd.to_datetime(df.date + " " + df.time)
+    df.set_index("datetime", inplace=True)
+    df.index = df.index.tz_localize(
+        "Etc/GMT+6", ambiguous="NaT", nonexistent="shift_forward"
+    ).tz_convert("UTC")
+    df.sort_index(inplace=True, kind="stable")
+    return df
+
+
+def fetch_csv(url, etag=None, last_modified=None, timeout=60):
+    """
+    Body and validators (ETag, Last-Modified) of url. The body is None when the
+    server says it is unchanged since the given validators.
+    """
+    request = urllib.request.Request(url)
+    if etag:
+        request.add_header("If-None-Match", etag)
+    if last_modified:
+        request.add_header("If-Modified-Since", last_modified)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            validators = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            return response.read(), validators
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None, {"etag": etag, "last_modified": last_modified}
+        raise
+
+
+def _utc(t):
+    t = pd.Timestamp(t)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+
+class ReportStore:
+    """
+    SPC reports by type and year, stored as sorted Parquet files under root and
+    fetched from base_url ({base_url}/{year}_{type}.csv) when missing or stale.
+    """
+
+    def __init__(
+        self,
+        root=REPORT_STORE_DIR,
+        base_url=SPC_REPORTS_URL,
+        refresh_s=REPORT_REFRESH_S,
+        fetch=fetch_csv,
+        final_after_days=REPORT_FINAL_AFTER_DAYS,
+    ):
+        self.root = root
+        self.base_url = base_url
+        self.refresh_s = refresh_s
+        self.final_after = pd.Timedelta(days=final_after_days)
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        # (kind, year) -> (Parquet mtime, DataFrame)
+        self._frames = {}
+
+    def _path(self, kind, year, ext="parquet"):
+        return os.path.join(self.root, kind, f"{year}.{ext}")
+
+    def _state(self, kind, year):
+        try:
+            with open(self._path(kind, year, "json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save_state(self, kind, year, state):
+        os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+        with open(self._path(kind, year, "json"), "w") as f:
+            json.dump({**state, "fetched_at": time.time()}, f)
+
+    def _stale(self, kind, year, state):
+        if state is None:
+            return True
+        stored = os.path.exists(self._path(kind, year))
+        if not stored and not state.get("missing"):
+            return True
+        # Final once fetched long enough after the year ended, whenever first
+        # fetched; a year that isn't published yet is retried every refresh_s
+        final = pd.Timestamp(year + 1, 1, 1, tz="UTC") + self.final_after
+        if stored and pd.Timestamp(state["fetched_at"], unit="s", tz="UTC") >= final:
+            return False
+        return time.time() - state["fetched_at"] > self.refresh_s
+
+    def refresh(self, kind, year, force=False):
+        """
+        Fetches one year of one report type if it isn't stored yet, or, until the
+        year is final, if the stored copy is older than refresh_s. Returns True if
+        the stored reports changed.
+        """
+        state = self._state(kind, year)
+        if not force and not self._stale(kind, year, state):
+            return False
+        state = state or {}
+        url = f"{self.base_url}/{year}_{kind}.csv"
+        try:
+            body, validators = self.fetch(
+                url, state.get("etag"), state.get("last_modified")
+            )
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                # Remembered, so a year SPC hasn't published isn't asked for again
+                # on every query, only every refresh_s
+                self._save_state(kind, year, {**state, "missing": True})
+            raise
+        changed = body is not None
+        os.makedirs(os.path.join(self.root, kind), exist_ok=True)
+        if changed:
+            reports = normalize_reports(pd.read_csv(io.BytesIO(body)))
+            path = self._path(kind, year)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            reports.to_parquet(tmp)
+            os.replace(tmp, path)
+            print(f"Stored {len(reports)} {kind} reports for {year}")
+        self._save_state(kind, year, validators)
+        return changed
+
+    def load(self, kind, year):
+        """
+        All stored reports of one type and year (fetched if needed), sorted. If a
+        refresh fails, the stored copy is used.
+        """
+        path = self._path(kind, year)
+        try:
+            self.refresh(kind, year)
+        except (OSError, ValueError) as e:
+            if isinstance(e, urllib.error.HTTPError) and e.code == 404:
+                # SPC publishes a year's file some time after it starts
+                print(f"No {kind} reports published for {year}")
+            elif os.path.exists(path):
+                print(f"Could not refresh {kind} reports for {year}: {e}")
+            else:
+                raise
+        if not os.path.exists(path):
+            return None
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._frames.get((kind, year))
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+        frame = pd.read_parquet(path)
+        with self._lock:
+            self._frames[(kind, year)] = (mtime, frame)
+        return frame
+
+    def reports(self, kind, start, end, bbox=None):
+        """
+        Reports of one type with start <= time <= end (UTC), oldest first, and,
+        given bbox = (min_lon, max_lon, min_lat, max_lat), starting inside it.
+        """
+        start, end = _utc(start), _utc(end)
+        # Late December reports in CST fall in the next year in UTC
+        years = range((start - pd.Timedelta(days=1)).year, end.year + 1)
+        parts = []
+        for year in years:
+            frame = self.load(kind, year)
+            if frame is None:
+                continue
+            lo = frame.index.searchsorted(start, side="left")
+            hi = frame.index.searchsorted(end, side="right")
+            parts.append(frame.iloc[lo:hi])
+        if not parts:
+            return pd.DataFrame()
+        window = pd.concat(parts) if len(parts) > 1 else parts[0]
+        if bbox is not None:
+            min_lon, max_lon, min_lat, max_lat = bbox
+            window = window[
+                window.slon.between(min_lon, max_lon)
+                & window.slat.between(min_lat, max_lat)
+            ]
+        return window
+
+
+_store = None
+
+
+def default_store():
+    global _store
+    if _store is None:
+        _store = ReportStore()
+    return _store
+
+
+def main(years):
+    store = default_store()
+    for year in years:
+        for kind in REPORT_TYPES:
+            store.refresh(kind, int(year))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or [pd.Timestamp.now("UTC").year])
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from math import asin, cos, degrees, radians, sin
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0
+HALF_CIRCUMFERENCE_KM = np.pi * EARTH_RADIUS_KM
+
+
+def haversine_distances(lat1, lon1, lat2, lon2, cos_lat2=None):
+    """
+    Vectorized Haversine distance (in km). All angles are in radians and broadcast
+    against each other; cos_lat2 may be passed in when it has been precomputed.
+    """
+    if cos_lat2 is None:
+        cos_lat2 = np.cos(lat2)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class StationIndex:
+    """
+    In-memory spatial index of radar stations on a regular lat/lon cell grid.
+
+    Station positions are kept as NumPy arrays (radians, cos(lat) and unit vectors)
+    and bucketed into cell_deg x cell_deg cells, so radius queries only compute
+    distances for stations in the cells overlapping the query's bounding box.
+    Several networks (NEXRAD, TDWR, ...) can be loaded into the same index with `add`.
+    """
+
+    def __init__(self, cell_deg=2.0):
+        self.cell_deg = cell_deg
+        self.n_lon_cells = int(np.ceil(360 / cell_deg))
+        self.ids = np.empty(0, dtype=object)
+        self.names = np.empty(0, dtype=object)
+        self.networks = np.empty(0, dtype=object)
+        self.lat_deg = np.empty(0)
+        self.lon_deg = np.empty(0)
+        self._build()
+
+    @classmethod
+    def from_frame(cls, df, network="NEXRAD", cell_deg=2.0):
+        """Builds an index from a DataFrame laid out like data/nexrad_stations.csv."""
+        index = cls(cell_deg=cell_deg)
+        index.add_frame(df, network=network)
+        return index
+
+    @classmethod
+    def from_csv(cls, path, network="NEXRAD", cell_deg=2.0):
+        return cls.from_frame(pd.read_csv(path), network=network, cell_deg=cell_deg)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, lats, lons, names=None, network="NEXRAD"):
+        """
+        Adds stations (lat/lon in degrees) and rebuilds the cell grid.
+        Stations without coordinates can never match a query and are skipped.
+        """
+        ids = np.asarray(ids, dtype=object)
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        names = ids if names is None else np.asarray(names, dtype=object)
+
+        located = np.isfinite(lats) & np.isfinite(lons)
+        ids, names, lats, lons = (
+            ids[located],
+            names[located],
+            lats[located],
+            lons[located],
+        )
+        self.ids = np.concatenate([self.ids, ids])
+        self.names = np.concatenate([self.names, names])
+        self.networks = np.concatenate(
+            [self.networks, np.full(len(ids), network, dtype=object)]
+        )
+        self.lat_deg = np.concatenate([self.lat_deg, lats])
+        self.lon_deg = np.concatenate([self.lon_deg, lons])
+        self._build()
+
+    def add_frame(self, df, network="NEXRAD"):
+        self.add(
+            df["Radar ID"],
+            df["Latitude"],
+            df["Longitude"],
+            names=df.get("Site Name"),
+            network=network,
+        )
+
+    def _build(self):
+        self.lat = np.radians(self.lat_deg)
+        self.lon = np.radians(self.lon_deg)
+        self.cos_lat = np.cos(self.lat)
+        self.xyz = np.column_stack(
+            (
+                self.cos_lat * np.cos(self.lon),
+                self.cos_lat * np.sin(self.lon),
+                np.sin(self.lat),
+            )
+        )
+        self._all = np.arange(len(self.ids))
+
+        cells = defaultdict(list)
+        for i, key in enumerate(
+            zip(self._lat_cell(self.lat_deg), self._lon_cell(self.lon_deg))
+        ):
+            cells[key].append(i)
+        self.cells = {key: np.array(idx) for key, idx in cells.items()}
+
+    def _lat_cell(self, lat):
+        return np.floor((np.asarray(lat) + 90) / self.cell_deg).astype(int).tolist()
+
+    def _lon_cell(self, lon):
+        return (
+            np.floor((np.asarray(lon) + 180) / self.cell_deg).astype(int)
+            % self.n_lon_cells
+        ).tolist()
+
+    def distances(self, lat, lon, idx=None):
+        """Distance (km) from (lat, lon) in degrees to the stations at idx (or all)."""
+        if idx is None:
+            idx = self._all
+        return haversine_distances(
+            radians(lat), radians(lon), self.lat[idx], self.lon[idx], self.cos_lat[idx]
+        )
+
+    def distance_matrix(self, lats, lons):
+        """Point-to-station distances (km) as a points x stations matrix."""
+        lats = np.radians(np.asarray(lats, dtype=np.float64))[:, None]
+        lons = np.radians(np.asarray(lons, dtype=np.float64))[:, None]
+        return haversine_distances(lats, lons, self.lat, self.lon, self.cos_lat)
+
+    def candidates(self, lat, lon, radius_km):
+        """Indices of stations in cells overlapping the query circle's bounding box."""
+        if radius_km >= HALF_CIRCUMFERENCE_KM:
+            return self._all
+
+        dlat = degrees(radius_km / EARTH_RADIUS_KM)
+        lat_min, lat_max = lat - dlat, lat + dlat
+        if (
+            lat_max >= 90
+            or lat_min <= -90
+            or sin(radius_km / EARTH_RADIUS_KM) >= cos(radians(lat))
+        ):
+            # The circle covers a pole, so every longitude is in range.
+            lon_cells = range(self.n_lon_cells)
+        else:
+            dlon = degrees(asin(sin(radius_km / EARTH_RADIUS_KM) / cos(radians(lat))))
+            first = int(np.floor((lon - dlon + 180) / self.cell_deg))
+            last = int(np.floor((lon + dlon + 180) / self.cell_deg))
+            if last - first + 1 >= self.n_lon_cells:
+                lon_cells = range(self.n_lon_cells)
+            else:
+                lon_cells = [j % self.n_lon_cells for j in range(first, last + 1)]
+
+        first_lat = int(np.floor((max(lat_min, -90) + 90) / self.cell_deg))
+        last_lat = int(np.floor((min(lat_max, 90) + 90) / self.cell_deg))
+        found = [
+            self.cells[(i, j)]
+            for i in range(first_lat, last_lat + 1)
+            for j in lon_cells
+            if (i, j) in self.cells
+        ]
+        if not found:
+            return np.empty(0, dtype=int)
+        return np.concatenate(found)
+
+    def within(self, lat, lon, radius_km):
+        """
+        Stations within radius_km of (lat, lon), nearest first.
+        Returns (indices, distances_km) as NumPy arrays.
+        """
+        idx = self.candidates(lat, lon, radius_km)
+        dist = self.distances(lat, lon, idx)
+        keep = dist <= radius_km
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind="stable")
+        return idx[order], dist[order]
+
+    def nearest(self, lat, lon, k=None):
+        """
+        The k stations nearest to (lat, lon), nearest first (all stations if k is None).
+        Returns (indices, distances_km) as NumPy arrays.
+        """
+        if k is None or k >= len(self):
+            return self.within(lat, lon, HALF_CIRCUMFERENCE_KM)
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+
+        # Grow the search radius until it holds at least k stations; those k are
+        # then guaranteed to be the nearest ones.
+        radius_km = 2 * self.cell_deg * 111.0
+        while True:
+            idx, dist = self.within(lat, lon, radius_km)
+            if len(idx) >= k or radius_km >= HALF_CIRCUMFERENCE_KM:
+                return idx[:k], dist[:k]
+            radius_km *= 2
@@ -0,0 +1,256 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+
+from services.scans.cache import CacheIndex
+from services.scans.geometry import lonlat_to_polar, slant_range
+
+TILE_SIZE = 256
+TILE_CACHE_DIR = os.environ.get("TILE_CACHE_DIR")
+TILE_CACHE_MAX_BYTES = int(os.environ.get("TILE_CACHE_MAX_BYTES", str(1024**3)))
+# Each lookup table is TILE_SIZE**2 int32s (256 KiB)
+TILE_LUT_CACHE_SIZE = int(os.environ.get("TILE_LUT_CACHE_SIZE", "512"))
+
+# Color scale of plot_scan_from_db
+REFLECTIVITY_CMAP = "HomeyerRainbow"
+REFLECTIVITY_VMIN = -7.5
+REFLECTIVITY_VMAX = 65.0
+
+
+def tile_bounds(z, x, y):
+    """(min_lon, max_lon, min_lat, max_lat) of Web Mercator tile z/x/y."""
+    n = 2**z
+    lons = np.array([x, x + 1]) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * np.array([y + 1, y]) / n))))
+    return lons[0], lons[1], lats[0], lats[1]
+
+
+def tile_lonlat(z, x, y, size=TILE_SIZE):
+    """Lon/lat of the centers of a tile's pixels, each (size, size), row 0 north."""
+    n = 2**z
+    offsets = (np.arange(size) + 0.5) / size
+    lon = (x + offsets) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + offsets) / n))))
+    return np.meshgrid(lon, lat)
+
+
+@lru_cache(maxsize=TILE_LUT_CACHE_SIZE)
+def gate_lookup(geometry, n_azimuth, n_gates, z, x, y, size=TILE_SIZE):
+    """
+    Flat index into a (n_azimuth, n_gates) stored sweep for every pixel of tile
+    z/x/y, or n_azimuth * n_gates (one past the end) where no gate covers the
+    pixel. geometry is the sorted items of a scan's geometry dict, so the table is
+    shared by every scan a radar makes with the same site and gate layout.
+    """
+    g = dict(geometry)
+    lon, lat = tile_lonlat(z, x, y, size)
+    azimuth, ground = lonlat_to_polar(lon, lat, g["site_lon"], g["site_lat"])
+    gate = np.rint(
+        (slant_range(ground, g["elevation"]) - g["range_start"]) / g["gate_spacing"]
+    ).astype(np.int64)
+    ray = (azimuth * (n_azimuth / 360.0)).astype(np.int64) % n_azimuth
+    index = ray * n_gates + gate
+    index[(gate < 0) | (gate >= n_gates)] = n_azimuth * n_gates
+    index = index.astype(np.int32).ravel()
+    index.flags.writeable = False
+    return index
+
+
+@lru_cache(maxsize=8)
+def color_table(name=REFLECTIVITY_CMAP, n=256):
+    """(n + 1, 4) uint8 RGBA table: n colors of the colormap, then transparent."""
+    import matplotlib
+
+    try:
+        cmap = matplotlib.colormaps[name]
+    except KeyError:
+        # Registers the radar colormaps (pyart depends on it)
+        import cmweather  # noqa: F401
+
+        cmap = matplotlib.colormaps[name]
+    table = np.zeros((n + 1, 4), dtype=np.uint8)
+    table[:n] = np.rint(cmap(np.linspace(0, 1, n)) * 255)
+    return table
+
+
+def color_indices(values, vmin=REFLECTIVITY_VMIN, vmax=REFLECTIVITY_VMAX, n=256):
+    """Index into color_table for each value; missing and below-vmin are n."""
+    scaled = (values - vmin) * ((n - 1) / (vmax - vmin))
+    indices = np.full(values.shape, n, dtype=np.uint16)
+    valid = scaled >= 0
+    indices[valid] = np.minimum(scaled[valid], n - 1).astype(np.uint16)
+    return indices
+
+
+def encode_png(rgba):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    # Low zlib effort: tiles are mostly transparent and encode time dominates
+    Image.fromarray(rgba, "RGBA").save(buffer, "PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def render_tile(colors, geometry, shape, z, x, y, size=TILE_SIZE):
+    """
+    RGBA tile from a stored sweep already mapped to color indices (color_indices
+    of the grid, flattened, with one trailing transparent index).
+    """
+    index = gate_lookup(geometry, shape[0], shape[1], z, x, y, size)
+    return color_table()[colors[index]].reshape(size, size, 4)
+
+
+@lru_cache(maxsize=1)
+def empty_tile(size=TILE_SIZE):
+    return encode_png(np.zeros((size, size, 4), dtype=np.uint8))
+
+
+def intersects(a, b):
+    return a[0] <= b[1] and a[1] >= b[0] and a[2] <= b[3] and a[3] >= b[2]
+
+
+class TileCache:
+    """
+    Rendered tiles on disk, one file per tile, bounded to max_bytes by deleting the
+    least recently used. Sizes and reads are kept in a CacheIndex under root, so
+    every process (API worker) using the directory shares the hits and the bound.
+    """
+
+    def __init__(self, root, max_bytes=TILE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.index = CacheIndex(root, self._scan)
+
+    def _scan(self):
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith(".") or name.endswith(".tmp"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield os.path.relpath(path, self.root), stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        try:
+            # The file is the truth: another worker may have rendered it
+            with open(os.path.join(self.root, key), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        self.index.hit(key, len(data))
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        self.index.add(key, len(data))
+        size = self.index.totals()[1]
+        if size <= self.max_bytes:
+            return
+        for old in self.index.candidates("lru"):
+            if size <= self.max_bytes:
+                break
+            if old == key:
+                continue
+            try:
+                os.remove(os.path.join(self.root, old))
+            except FileNotFoundError:
+                pass
+            # None if a concurrent put in another worker evicted it first
+            size -= self.index.remove(old) or 0
+
+    def stats(self):
+        entries, size = self.index.totals()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+
+class TileRenderer:
+    """
+    Renders XYZ reflectivity tiles of stored scans. Each scan's grid is read and
+    mapped to color indices once (the last scans_cached are kept), each tile is a
+    single gather through a lookup table shared by all scans of a radar, and
+    rendered PNGs go to the optional on-disk TileCache.
+    """
+
+    def __init__(self, store, cache=None, scans_cached=16):
+        self.store = store
+        self.cache = cache
+        self.scans_cached = scans_cached
+        self._lock = threading.Lock()
+        self._scans = OrderedDict()
+
+    def _scan(self, radar_id, scan_time):
+        """(ScanRef, color indices) for a scan, or None if it can't be tiled."""
+        key = (radar_id, scan_time)
+        with self._lock:
+            if key in self._scans:
+                self._scans.move_to_end(key)
+                return self._scans[key]
+        refs = self.store.scans_in_range(radar_id, scan_time, scan_time)
+        if not refs or refs[0].geometry is None:
+            return None
+        ref = refs[0]
+        grid = ref.grid()
+        if grid is None:
+            return None
+        colors = np.append(color_indices(grid).ravel(), np.uint16(256))
+        scan = (ref, grid.shape, colors)
+        with self._lock:
+            self._scans[key] = scan
+            while len(self._scans) > self.scans_cached:
+                self._scans.popitem(last=False)
+        return scan
+
+    def tile(self, radar_id, scan_time, z, x, y):
+        """PNG bytes of tile z/x/y of a scan, or None if there is no such scan."""
+        cache_key = f"{radar_id}/{scan_time:%Y%m%dT%H%M%S}/{z}/{x}/{y}.png"
+        if self.cache is not None:
+            png = self.cache.get(cache_key)
+            if png is not None:
+                return png
+
+        scan = self._scan(radar_id, scan_time)
+        if scan is None:
+            return None
+        ref, shape, colors = scan
+        if not intersects(tile_bounds(z, x, y), ref.bbox):
+            return empty_tile()
+
+        geometry = tuple(sorted(ref.geometry.items()))
+        png = encode_png(render_tile(colors, geometry, shape, z, x, y))
+        if self.cache is not None:
+            self.cache.put(cache_key, png)
+        return png
+
+    def stats(self):
+        lookup = gate_lookup.cache_info()
+        return {
+            "scans": len(self._scans),
+            "lookup_tables": {"hits": lookup.hits, "misses": lookup.misses},
+            "disk": self.cache.stats() if self.cache is not None else None,
+        }
@@ -1,3 +1,4 @@
+import json
 import os
 import subprocess
 import time
@@ -68,6 +69,36 @@ def test_radars_nearby_endpoint(api_service):
         ), "Expected an error message when no radars are found."
 
 
+def test_radars_nearby_batch_endpoint(api_service):
+    points = [[34.0522, -118.2437], [41.6, -90.58], [0.0, 0.0]]
+    response = requests.post(
+        f"{BASE_URL}/radars_near/batch", params={"radius_km": 200}, json=points
+    )
+    assert response.status_code == 200, "Batch endpoint did not return 200 OK."
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == len(points), "Expected one result line per point."
+    assert [[line["lat"], line["lon"]] for line in lines] == points
+    assert len(lines[0]["radars"]) > 0, "Expected radars near Los Angeles."
+    assert lines[2]["radars"] == [], "Expected no radars near (0, 0)."
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        {"lat": 34.0},
+        [[34.0, "x"]],
+        [[34.0], [1, 2]],
+        [34.0, -90.0],
+        [[None, -90.0]],
+        [[91.0, -90.0]],
+        [[34.0, 181.0]],
+    ],
+)
+def test_radars_nearby_batch_bad_body(api_service, body):
+    response = requests.post(f"{BASE_URL}/radars_near/batch", json=body)
+    assert response.status_code == 400, "Expected 400 for a malformed body."
+
+
 def test_radars_endpoint(api_service):
     response = get_endpoint_response("/radars/34.0522/-118.2437", assert_200=False)
     if response.status_code == 200:
@@ -76,3 +107,37 @@ def test_radars_endpoint(api_service):
         assert len(json_data) > 0, f"Should return all radars, got ${len(json_data)}"
     else:
         raise AssertionError("Expected a 200 OK response, but got an error.")
+
+
+def test_radars_nearest_endpoint(api_service):
+    response = get_endpoint_response("/radars_nearest/34.0522/-118.2437/3")
+    json_data = response.json()
+    assert isinstance(json_data, list), "Expected a list of radars."
+    assert len(json_data) == 3, f"Expected 3 nearest radars, got {len(json_data)}"
+    distances = [radar["distance"] for radar in json_data]
+    assert distances == sorted(distances), "Expected radars sorted by distance."
+
+
+def test_radars_etag_not_modified(api_service):
+    response = get_endpoint_response("/radars/34.0522/-118.2437")
+    etag = response.headers.get("ETag")
+    assert etag, "Expected an ETag header on station responses."
+    assert "max-age" in response.headers.get("Cache-Control", "")
+
+    response = requests.get(
+        f"{BASE_URL}/radars/34.0522/-118.2437", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304, "Expected 304 Not Modified for a matching ETag."
+
+
+def test_cache_stats_endpoint(api_service):
+    get_endpoint_response("/radars_near/34.0522/-118.2437/50", assert_200=False)
+    stats = get_endpoint_response("/cache/stats").json()
+    assert stats["hits"] + stats["misses"] > 0, "Expected cache lookups to be counted."
+
+
+def test_model_stats_disabled(api_service):
+    # compose runs the API with MODEL_ENABLED=0 unless set
+    response = requests.get(f"{BASE_URL}/model/stats")
+    assert response.status_code == 503, "Expected 503 when the model is disabled."
+    assert response.json() == {"detail": "Model serving is not enabled"}
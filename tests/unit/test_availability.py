@@ -0,0 +1,94 @@
+import asyncio
+
+import pandas as pd
+
+from services.scans.availability import ScanAvailabilityIndex
+
+
+class FakeListing:
+    """Listing source backed by a list of keys that can grow between refreshes."""
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.calls = []
+
+    def list(self, prefix, start_after=None):
+        self.calls.append((prefix, start_after))
+        return sorted(
+            k
+            for k in self.keys
+            if k.startswith(prefix) and (start_after is None or k > start_after)
+        )
+
+
+def key(radar, t):
+    t = pd.Timestamp(t)
+    return f"{t:%Y/%m/%d}/{radar}/{radar}{t:%Y%m%d_%H%M%S}_V06"
+
+
+def ts(t):
+    return pd.Timestamp(t, tz="UTC")
+
+
+SCANS = [
+    key("KDVN", "2020-08-09 23:58:00"),
+    key("KDVN", "2020-08-10 16:25:12"),
+    key("KDVN", "2020-08-10 16:30:12"),
+    key("KDVN", "2020-08-10 16:30:12") + "_MDM",
+    key("KDVN", "2020-08-10 16:35:40"),
+    key("KLOT", "2020-08-10 16:31:00"),
+]
+
+
+def test_range_and_latest_queries():
+    source = FakeListing(SCANS)
+    index = ScanAvailabilityIndex(source)
+
+    async def run():
+        between = await index.scans_between(
+            "KDVN", ts("2020-08-10 16:25:12"), ts("2020-08-10 16:35")
+        )
+        latest = await index.latest_before("KDVN", ts("2020-08-10 16:34"))
+        exact = await index.latest_before("KDVN", ts("2020-08-10 16:35:40"))
+        previous_day = await index.latest_before("KDVN", ts("2020-08-10 01:00"))
+        none = await index.latest_before("KLOT", ts("2020-08-10 16:00"))
+        return between, latest, exact, previous_day, none
+
+    between, latest, exact, previous_day, none = asyncio.run(run())
+    assert between == SCANS[1:3]
+    assert latest == SCANS[2]
+    assert exact == SCANS[4]
+    assert previous_day == SCANS[0]
+    assert none is None
+
+
+def test_past_days_are_listed_once():
+    source = FakeListing(SCANS)
+    index = ScanAvailabilityIndex(source, refresh_s=0)
+
+    async def run():
+        for _ in range(3):
+            await index.latest_before("KDVN", ts("2020-08-10 17:00"))
+
+    asyncio.run(run())
+    assert len(source.calls) == 1
+
+
+def test_refresh_only_lists_new_keys():
+    now = pd.Timestamp.now("UTC").floor("min")
+    source = FakeListing([key("KDVN", now.tz_localize(None) - pd.Timedelta(minutes=5))])
+    index = ScanAvailabilityIndex(source, refresh_s=3600)
+
+    async def run():
+        first = await index.latest_before("KDVN", now)
+        new_key = key("KDVN", now.tz_localize(None))
+        source.keys.append(new_key)
+        cached = await index.latest_before("KDVN", now)
+        await index.refresh("KDVN")
+        refreshed = await index.latest_before("KDVN", now)
+        return first, cached, refreshed, new_key
+
+    first, cached, refreshed, new_key = asyncio.run(run())
+    assert first == cached != new_key
+    assert refreshed == new_key
+    assert source.calls[-1][1] == first
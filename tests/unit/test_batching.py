@@ -0,0 +1,87 @@
+import asyncio
+import threading
+
+import numpy as np
+import pytest
+
+from services.model.batching import BatchingEngine, stack_samples
+
+
+class TinyModel:
+    """Stand-in for the Keras model: a linear layer that records its batch sizes."""
+
+    def __init__(self):
+        self.weights = np.arange(6, dtype=np.float32).reshape(3, 2)
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def predict_batch(self, x):
+        with self.lock:
+            self.batch_sizes.append(len(x["DBZ"]))
+        return x["DBZ"].reshape(len(x["DBZ"]), -1) @ self.weights
+
+
+def make_sample(i):
+    return {"DBZ": np.full(3, i, dtype=np.float32), "range_folded_mask": None}
+
+
+def test_stack_samples_drops_non_arrays():
+    batch = stack_samples([make_sample(1), make_sample(2)])
+    assert list(batch) == ["DBZ"]
+    assert batch["DBZ"].shape == (2, 3)
+
+
+def test_requests_are_batched_and_fanned_out():
+    model = TinyModel()
+
+    async def run():
+        async with BatchingEngine(
+            model.predict_batch, max_batch_size=8, max_latency_ms=50
+        ) as engine:
+            outputs = await asyncio.gather(
+                *(engine.predict(make_sample(i)) for i in range(20))
+            )
+            return outputs, engine.stats()
+
+    outputs, stats = asyncio.run(run())
+    for i, output in enumerate(outputs):
+        np.testing.assert_allclose(output, np.full(3, i) @ model.weights)
+    assert max(model.batch_sizes) == 8
+    assert stats["samples"] == 20
+    assert stats["batches"] == len(model.batch_sizes) < 20
+
+
+def test_single_request_waits_at_most_latency_budget():
+    model = TinyModel()
+
+    async def run():
+        async with BatchingEngine(
+            model.predict_batch, max_batch_size=64, max_latency_ms=10
+        ) as engine:
+            return await asyncio.wait_for(engine.predict(make_sample(1)), timeout=1)
+
+    asyncio.run(run())
+    assert model.batch_sizes == [1]
+
+
+def test_errors_propagate_to_every_caller():
+    def broken(x):
+        raise ValueError("bad batch")
+
+    async def run():
+        async with BatchingEngine(
+            broken, max_batch_size=4, max_latency_ms=10
+        ) as engine:
+            return await asyncio.gather(
+                *(engine.predict(make_sample(i)) for i in range(3)),
+                return_exceptions=True,
+            )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_predict_requires_start():
+    engine = BatchingEngine(TinyModel().predict_batch)
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.predict(make_sample(1)))
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from services.model.catalog import Catalog
+
+
+def write_catalog(root, n=400):
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp("2013-01-01") + pd.to_timedelta(
+        rng.integers(0, 9 * 365, n), unit="D"
+    )
+    category = rng.choice(["TOR", "NUL", "WRN"], n)
+    catalog = pd.DataFrame(
+        {
+            "filename": [
+                f"train/{t.year}/{c}_{i}.nc"
+                for i, (t, c) in enumerate(zip(start, category))
+            ],
+            "category": category,
+            "ef_number": np.where(category == "TOR", rng.integers(0, 6, n), -1),
+            "lat": rng.uniform(25, 49, n),
+            "lon": rng.uniform(-125, -67, n),
+            "start_time": start,
+            "end_time": start + pd.Timedelta(minutes=5),
+            "radar": rng.choice(["KDVN", "KLOT", "KTLX", "KFWS"], n),
+            "type": rng.choice(["train", "test"], n),
+        }
+    )
+    catalog.to_csv(os.path.join(root, "catalog.csv"), index=False)
+    return catalog
+
+
+def test_query_matches_full_scan(tmp_path):
+    expected = write_catalog(tmp_path)
+    catalog = Catalog(str(tmp_path), row_group_size=32)
+
+    subset = catalog.query(years=[2019, 2020], types="train", min_ef=2)
+    mask = (
+        expected.start_time.dt.year.isin([2019, 2020])
+        & (expected.type == "train")
+        & (expected.ef_number >= 2)
+    )
+    assert sorted(subset.filename) == sorted(expected.filename[mask])
+    assert subset.path[0] == os.path.join(str(tmp_path), subset.filename[0])
+    assert {"lat", "lon", "radar", "category"} <= set(subset.columns)
+
+    radar = catalog.query(radars="KDVN", max_ef=1, columns=["start_time"])
+    mask = (expected.radar == "KDVN") & (expected.ef_number <= 1)
+    assert sorted(radar.filename) == sorted(expected.filename[mask])
+    assert set(radar.columns) == {
+        "filename",
+        "start_time",
+        "radar",
+        "ef_number",
+        "path",
+    }
+
+
+def test_only_matching_row_groups_are_read(tmp_path):
+    write_catalog(tmp_path)
+    catalog = Catalog(str(tmp_path), row_group_size=32)
+    total = catalog.file.metadata.num_row_groups
+    # Rows are sorted by year first, so one year spans a few groups
+    assert 0 < len(catalog.row_groups(years=2016)) <= 3 < total
+    assert catalog.row_groups(years=1999) == []
+    assert catalog.files(years=1999) == []
+
+
+def test_catalog_is_rebuilt_when_csv_changes(tmp_path):
+    write_catalog(tmp_path, n=50)
+    assert len(Catalog(str(tmp_path)).query()) == 50
+    write_catalog(tmp_path, n=60)
+    os.utime(tmp_path / "catalog.parquet", (0, 0))
+    assert len(Catalog(str(tmp_path)).query()) == 60
@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+
+from services.scans.decode import decode_volumes
+
+
+def fake_reader(path, scale=1.0):
+    """Stands in for Level II decoding: the file holds float32 gate values."""
+    data = np.fromfile(path, dtype=np.float32)
+    if not len(data):
+        raise ValueError("empty volume")
+    return {"reflectivity_0": data.reshape(2, -1) * scale}, {"pid": os.getpid()}
+
+
+def write_volume(directory, name, values):
+    path = os.path.join(directory, name)
+    np.asarray(values, dtype=np.float32).tofile(path)
+    return path
+
+
+def test_volumes_are_decoded_in_scan_time_order(tmp_path):
+    names = [f"KDVN20200810_16{m:02d}00_V06" for m in range(0, 50, 5)]
+    paths = [
+        write_volume(tmp_path, name, np.arange(4) + i) for i, name in enumerate(names)
+    ]
+
+    decoded = []
+    for volume in decode_volumes(
+        reversed(paths),
+        workers=2,
+        chunksize=3,
+        max_pending=1,
+        reader=fake_reader,
+        scale=2.0,
+    ):
+        with volume:
+            decoded.append((volume.path, volume["reflectivity_0"].copy()))
+
+    assert [path for path, _ in decoded] == paths
+    for i, (_, data) in enumerate(decoded):
+        np.testing.assert_array_equal(data, (np.arange(4) + i).reshape(2, 2) * 2.0)
+
+
+def test_unreadable_volumes_are_skipped(tmp_path):
+    good = write_volume(tmp_path, "KDVN20200810_160000_V06", [1, 2, 3, 4])
+    bad = write_volume(tmp_path, "KDVN20200810_160500_V06", [])
+
+    volumes = list(decode_volumes([bad, good], workers=1, reader=fake_reader))
+    assert [v.path for v in volumes] == [good]
+    assert volumes[0].meta["pid"] != os.getpid()
+    volumes[0].close()
+
+
+def test_stopping_early_frees_shared_memory(tmp_path):
+    paths = [
+        write_volume(tmp_path, f"KDVN20200810_16{m:02d}00_V06", [1, 2, 3, 4])
+        for m in range(0, 30, 5)
+    ]
+    before = set(os.listdir("/dev/shm"))
+
+    volumes = decode_volumes(paths, workers=2, chunksize=2, reader=fake_reader)
+    with next(volumes) as volume:
+        assert volume["reflectivity_0"].shape == (2, 2)
+    volumes.close()
+
+    assert set(os.listdir("/dev/shm")) == before
@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pandas as pd
+import pytest
+
+from services.scans.downloader import AsyncScanDownloader, DirectorySource
+from services.scans.get_scans import download_scans_async
+
+KEYS = [
+    "2020/08/10/KDVN/KDVN20200810_162512_V06",
+    "2020/08/10/KDVN/KDVN20200810_163012_V06",
+    "2020/08/10/KDVN/KDVN20200810_163012_V06_MDM",
+    "2020/08/10/KDVN/KDVN20200810_235512_V06",
+    "2020/08/11/KDVN/KDVN20200811_000412_V06",
+]
+
+
+@pytest.fixture
+def bucket(tmp_path):
+    for key in KEYS:
+        path = tmp_path / "bucket" / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(f"volume {key[-19:]}".encode())
+    return str(tmp_path / "bucket")
+
+
+class CountingSource(DirectorySource):
+    """DirectorySource that counts reads and fails the first `failures` of them."""
+
+    def __init__(self, root, failures=0, delay=0.0):
+        super().__init__(root)
+        self.reads = 0
+        self.failures = failures
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def read(self, key, byte_range=None, chunk_size=None):
+        with self.lock:
+            self.reads += 1
+            fail = self.reads <= self.failures
+        if self.delay:
+            threading.Event().wait(self.delay)
+        if fail:
+            raise ConnectionError("connection reset")
+        return super().read(key, byte_range)
+
+
+def test_list_scans_spans_days_and_skips_mdm(bucket):
+    downloader = AsyncScanDownloader(DirectorySource(bucket))
+    start = pd.Timestamp("2020-08-10 16:30", tz="UTC")
+    end = pd.Timestamp("2020-08-11 01:00", tz="UTC")
+
+    keys = asyncio.run(downloader.list_scans("KDVN", start, end))
+    assert keys == [KEYS[1], KEYS[3], KEYS[4]]
+
+
+def test_concurrent_requests_for_same_key_share_one_read(bucket):
+    source = CountingSource(bucket, delay=0.05)
+    downloader = AsyncScanDownloader(source)
+
+    async def run():
+        return await asyncio.gather(*(downloader.fetch(KEYS[0]) for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert source.reads == 1
+    assert len(set(results)) == 1
+
+
+def test_retries_with_backoff_then_succeeds(bucket):
+    source = CountingSource(bucket, failures=2)
+    downloader = AsyncScanDownloader(source, retries=3, backoff_s=0.001)
+
+    data = asyncio.run(downloader.fetch(KEYS[0], byte_range=(0, 6)))
+    assert data == b"volume"
+    assert source.reads == 3
+
+
+def test_missing_key_is_not_retried(bucket):
+    source = CountingSource(bucket)
+    downloader = AsyncScanDownloader(source, retries=3, backoff_s=0.001)
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(downloader.fetch("2020/08/10/KDVN/missing"))
+    assert source.reads == 1
+
+
+def test_download_scans_async_writes_files(bucket, tmp_path):
+    downloader = AsyncScanDownloader(DirectorySource(bucket))
+    start = pd.Timestamp("2020-08-10 16:00", tz="UTC")
+
+    paths = asyncio.run(
+        download_scans_async("KDVN", start, str(tmp_path / "scans"), 2, downloader)
+    )
+    assert [p.rsplit("/", 1)[-1] for p in paths] == [
+        "KDVN20200810_162512_V06",
+        "KDVN20200810_163012_V06",
+    ]
+
+
+def test_download_replaces_files_atomically(bucket, tmp_path):
+    downloader = AsyncScanDownloader(DirectorySource(bucket))
+    dest = tmp_path / "scans"
+    dest.mkdir()
+    (dest / "KDVN20200810_163012_V06").write_bytes(b"trunc")
+
+    async def run():
+        return await asyncio.gather(
+            *(downloader.download(KEYS[1], str(dest)) for _ in range(3))
+        )
+
+    paths = asyncio.run(run())
+    assert len(set(paths)) == 1
+    scan = dest / "KDVN20200810_163012_V06"
+    assert scan.read_bytes() == b"volume 20200810_163012_V06"
+    assert [p.name for p in dest.iterdir()] == ["KDVN20200810_163012_V06"]
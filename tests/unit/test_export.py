@@ -0,0 +1,128 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+onnx = pytest.importorskip("onnx")
+pytest.importorskip("onnxruntime")
+
+from onnx import TensorProto, helper, numpy_helper
+
+from services.model import export as export_module
+from services.model.export import (
+    OnnxModel,
+    convert_fp16,
+    export,
+    export_path,
+    load_backend,
+)
+
+SHAPE = (8, 8, 2)
+
+
+def write_graph(path, seed=0):
+    """
+    Stand-in for the exported checkpoint: a linear layer over two named inputs
+    with a dynamic batch axis, returning one logit per sample.
+    """
+    rng = np.random.default_rng(seed)
+    n = 2 * int(np.prod(SHAPE))
+    weights = rng.normal(scale=0.1, size=(n, 1)).astype(np.float32)
+    bias = np.array([0.5], dtype=np.float32)
+    inputs = [
+        helper.make_tensor_value_info(name, TensorProto.FLOAT, ["batch", *SHAPE])
+        for name in ["DBZ", "coordinates"]
+    ]
+    output = helper.make_tensor_value_info("logits", TensorProto.FLOAT, ["batch", 1])
+    graph = helper.make_graph(
+        [
+            helper.make_node("Concat", ["DBZ", "coordinates"], ["x"], axis=-1),
+            helper.make_node("Flatten", ["x"], ["flat"], axis=1),
+            helper.make_node("MatMul", ["flat", "weights"], ["dense"]),
+            helper.make_node("Add", ["dense", "bias"], ["logits"]),
+        ],
+        "baseline",
+        inputs,
+        [output],
+        [
+            numpy_helper.from_array(weights, "weights"),
+            numpy_helper.from_array(bias, "bias"),
+        ],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    onnx.save(model, path)
+
+    def reference(x):
+        flat = np.concatenate([x["DBZ"], x["coordinates"]], axis=-1)
+        return flat.reshape(len(flat), -1) @ weights + bias
+
+    return reference
+
+
+def batch(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return {
+        "DBZ": rng.normal(size=(n, *SHAPE)),
+        "coordinates": rng.normal(size=(n, *SHAPE)).astype(np.float32),
+        "range_folded_mask": np.zeros((n, *SHAPE), dtype=np.float32),
+    }
+
+
+def test_onnx_model_matches_graph(tmp_path):
+    reference = write_graph(export_path("onnx", tmp_path))
+    model = load_backend("onnx", root=tmp_path)
+    assert isinstance(model, OnnxModel)
+    assert model.input["DBZ"].shape == (None, *SHAPE)
+    assert model.input["DBZ"].dtype == np.float32
+
+    # float64 inputs are cast and inputs the graph doesn't take are ignored
+    x = batch(5)
+    np.testing.assert_allclose(model.predict_on_batch(x), reference(x), rtol=1e-5)
+
+
+def test_quantized_variants_stay_close(tmp_path):
+    reference = write_graph(export_path("onnx", tmp_path))
+    paths = export(["onnx-int8", "onnx-fp16"], root=tmp_path)
+    x = batch(16)
+    expected = reference(x)
+    for backend, atol in [("onnx-int8", 0.1), ("onnx-fp16", 0.02)]:
+        model = OnnxModel(paths[backend])
+        # Inputs and outputs stay float32 whatever the weights are
+        assert model.input["DBZ"].dtype == np.float32
+        output = model.predict_on_batch(x)
+        assert output.dtype == np.float32
+        np.testing.assert_allclose(output, expected, atol=atol)
+        assert ((output > 0) == (expected > 0)).mean() >= 0.9
+
+
+def test_fp16_weights_are_halved(tmp_path):
+    src = export_path("onnx", tmp_path)
+    write_graph(src)
+    dst = export_path("onnx-fp16", tmp_path)
+    convert_fp16(src, dst)
+    weights = {t.name: t for t in onnx.load(dst).graph.initializer}
+    assert weights["weights"].data_type == TensorProto.FLOAT16
+
+
+def test_missing_variant_is_exported_once(tmp_path, monkeypatch):
+    write_graph(export_path("onnx", tmp_path))
+    calls = []
+
+    def quantize(src, dst):
+        calls.append(dst)
+        export_module.quantize_int8(src, dst)
+
+    monkeypatch.setitem(export_module.VARIANTS, "onnx-int8", quantize)
+    with ThreadPoolExecutor(4) as pool:
+        models = list(pool.map(lambda _: load_backend("onnx-int8", tmp_path), range(4)))
+    assert all(isinstance(m, OnnxModel) for m in models)
+    # One loader wrote it through a temporary file; the others waited and reused it
+    assert len(calls) == 1 and calls[0] != export_path("onnx-int8", tmp_path)
+    assert not [name for name in os.listdir(tmp_path) if ".tmp" in name]
+
+
+def test_unknown_backend(tmp_path):
+    with pytest.raises(ValueError):
+        load_backend("tflite", root=tmp_path)
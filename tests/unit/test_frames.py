@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+from services.model.frames import FrameBuffer, FrameStore
+
+T0 = pd.Timestamp("2020-08-10 16:30", tz="UTC")
+
+
+def read_frame(path):
+    """Stand-in for Model.preprocess_frame: the frame of volume i is filled with i."""
+    i = int(path.split("_")[-1])
+    return {
+        "reflectivity": np.full((4, 3, 2), i, dtype=np.float32),
+        "range_folded_mask": np.zeros((4, 3, 2), dtype=np.float32),
+        "coordinates": np.full((4, 3, 2), -i, dtype=np.float32),
+        "rng_lower": np.array([2125.0]),
+    }
+
+
+KEYS = ["reflectivity", "range_folded_mask", "coordinates"]
+
+
+def frames(window):
+    return window["reflectivity"][:, 0, 0, 0].tolist()
+
+
+def test_window_holds_last_frames_oldest_first():
+    buffer = FrameBuffer(3, ["reflectivity", "coordinates"])
+    buffer.push(read_frame("v_0"))
+    # Repeats the only frame until more arrive
+    assert frames(buffer.window()) == [0, 0, 0]
+    assert not buffer.ready
+    for i in range(1, 6):
+        buffer.push(read_frame(f"v_{i}"))
+        window = buffer.window()
+        assert frames(window) == [max(i - 2, 0), max(i - 1, 0), i]
+        assert window["reflectivity"].shape == (3, 4, 3, 2)
+        assert window["reflectivity"].flags["C_CONTIGUOUS"]
+    assert buffer.ready
+    assert window["coordinates"][:, 0, 0, 0].tolist() == [-3, -4, -5]
+    assert window["rng_lower"].tolist() == [2125.0]
+
+
+def test_each_volume_is_read_once():
+    store = FrameStore(n_frames=4, reader=read_frame, keys=KEYS)
+    for i in range(10):
+        window = store.update("KDVN", f"v_{i}", T0 + pd.Timedelta(minutes=5 * i))
+    assert frames(window) == [6, 7, 8, 9]
+    # An already buffered volume isn't read again
+    store.update("KDVN", "v_9", T0 + pd.Timedelta(minutes=45))
+    assert store.stats()["reads"] == 10
+
+    store.update("KLOT", "v_1", T0)
+    assert frames(store.get("KLOT").window()) == [1, 1, 1, 1]
+    assert frames(store.get("KDVN").window()) == [6, 7, 8, 9]
+
+
+def test_gap_starts_new_sequence():
+    store = FrameStore(n_frames=3, reader=read_frame, max_gap_s=600)
+    store.update("KDVN", "v_1", T0)
+    store.update("KDVN", "v_2", T0 + pd.Timedelta(minutes=5))
+    window = store.update("KDVN", "v_3", T0 + pd.Timedelta(hours=1))
+    assert frames(window) == [3, 3, 3]
+    assert store.get("KDVN").count == 1
+
+
+def test_single_frame_window_has_no_frame_axis():
+    store = FrameStore(n_frames=1, reader=read_frame, keys=KEYS)
+    store.update("KDVN", "v_1", T0)
+    window = store.update("KDVN", "v_2", T0 + pd.Timedelta(minutes=5))
+    assert window["reflectivity"].shape == (4, 3, 2)
+    assert window["reflectivity"][0, 0, 0] == 2
+    # Entries not in keys are passed through from the newest frame
+    assert window["rng_lower"].tolist() == [2125.0]
+
+
+def test_past_scan_gets_its_own_window():
+    store = FrameStore(n_frames=3, reader=read_frame, keys=KEYS)
+    for i in range(1, 4):
+        store.update("KDVN", f"v_{i}", T0 + pd.Timedelta(minutes=5 * i))
+    window = store.update("KDVN", "v_0", T0)
+    assert frames(window) == [0, 0, 0]
+    # The radar's buffer is left as it was
+    assert frames(store.get("KDVN").window()) == [1, 2, 3]
+    assert store.get("KDVN").times[-1] == T0 + pd.Timedelta(minutes=15)
+
+
+def test_update_returns_copies_and_handles_new_keys():
+    store = FrameStore(n_frames=2, reader=read_frame, keys=KEYS)
+    window = store.update("KDVN", "v_1", T0)
+    store.update("KDVN", "v_2", T0 + pd.Timedelta(minutes=5))
+    # A later push doesn't change a window already handed out
+    assert frames(window) == [1, 1]
+
+    # A frame key missing from a volume reallocates instead of raising
+    def without_mask(path):
+        sample = read_frame(path)
+        del sample["range_folded_mask"]
+        return sample
+
+    store.reader = without_mask
+    window = store.update("KDVN", "v_3", T0 + pd.Timedelta(minutes=10))
+    assert frames(window) == [3, 3]
+    assert "range_folded_mask" not in window
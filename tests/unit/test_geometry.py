@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+pyart = pytest.importorskip("pyart")
+
+from services.scans.geometry import GeometryCache, regrid_azimuth
+
+
+def make_radar(n_rays=720, n_gates=300):
+    radar = pyart.testing.make_empty_ppi_radar(n_gates, n_rays, 1)
+    radar.latitude["data"][:] = 41.61
+    radar.longitude["data"][:] = -90.58
+    radar.altitude["data"][:] = 230.0
+    radar.range["data"] = 2125.0 + 250.0 * np.arange(n_gates)
+    radar.fixed_angle["data"][:] = 0.5
+    radar.elevation["data"][:] = 0.5
+    radar.azimuth["data"][:] = (np.arange(n_rays) + 0.5) * 360 / n_rays
+    return radar
+
+
+def test_gate_locations_match_pyart():
+    radar = make_radar()
+    gates = GeometryCache().for_sweep("KDVN", radar)
+    lat, lon, alt = radar.get_gate_lat_lon_alt(sweep=0)
+    np.testing.assert_allclose(gates.lat, lat, atol=1e-4)
+    np.testing.assert_allclose(gates.lon, lon, atol=1e-4)
+    np.testing.assert_allclose(gates.alt, alt, atol=0.01)
+    np.testing.assert_allclose(
+        gates.bbox, (lon.min(), lon.max(), lat.min(), lat.max()), atol=1e-4
+    )
+
+
+def test_cache_reuses_geometry_in_memory_and_on_disk(tmp_path):
+    radar = make_radar()
+    cache = GeometryCache(str(tmp_path))
+    first = cache.for_sweep("KDVN", radar)
+    # A later scan with the same layout but rays in a different order
+    radar.azimuth["data"][:] = np.roll(radar.azimuth["data"], 100)
+    assert cache.for_sweep("KDVN", radar) is first
+    assert cache.stats() == {"hits": 1, "misses": 1, "entries": 1}
+
+    # Another process sharing the directory maps the saved arrays
+    other = GeometryCache(str(tmp_path)).for_sweep("KDVN", radar)
+    assert isinstance(other.lat, np.memmap)
+    np.testing.assert_array_equal(other.lon, first.lon)
+
+    radar.fixed_angle["data"][:] = 1.5
+    assert cache.for_sweep("KDVN", radar) is not first
+    assert len(list(tmp_path.glob("KDVN/*.npy"))) == 2
+
+
+def test_regrid_azimuth_takes_nearest_ray():
+    azimuth = np.array([350.0, 10.0, 100.0, 190.0, 280.0])
+    data = np.arange(5)[:, None]
+    np.testing.assert_array_equal(regrid_azimuth(data, azimuth, 4)[:, 0], [1, 2, 3, 4])
@@ -0,0 +1,65 @@
+import json
+
+import numpy as np
+import pytest
+
+from services.postgres.grid import decode_grid, encode_grid, json_grid_to_array
+
+
+def sweep(n_rays=360, n_gates=500):
+    rng = np.random.default_rng(0)
+    data = rng.uniform(-30, 75, size=(n_rays, n_gates)).astype(np.float32)
+    return np.ma.masked_less(data, 0)
+
+
+def test_int8_round_trip_keeps_mask_within_half_step():
+    data = sweep()
+    grid = encode_grid(data, "int8", "none")
+    assert len(grid["grid"]) == data.size
+
+    values = decode_grid(**grid)
+    assert values.dtype == np.float32
+    np.testing.assert_array_equal(np.isnan(values), data.mask)
+    error = np.abs(values - data.filled(np.nan))[~data.mask]
+    assert error.max() <= grid["grid_scale"] / 2 + 1e-4
+
+
+def test_float16_round_trip():
+    data = sweep()
+    values = decode_grid(**encode_grid(data, "float16", "none"))
+    assert values.dtype == np.float16
+    np.testing.assert_array_equal(np.isnan(values), data.mask)
+    np.testing.assert_allclose(values[~data.mask], data.compressed(), atol=0.05)
+
+
+def test_raw_read_is_zero_copy():
+    grid = encode_grid(sweep(), "int8", "none")
+    buffer = memoryview(grid.pop("grid"))
+    codes = decode_grid(buffer, **grid, dequantize=False)
+    assert codes.dtype == np.int8
+    assert not codes.flags.writeable
+    assert np.shares_memory(codes, np.frombuffer(buffer, dtype=np.int8))
+
+
+def test_fully_masked_grid():
+    data = np.ma.masked_all((4, 4), dtype=np.float32)
+    assert np.isnan(decode_grid(**encode_grid(data, "int8", "none"))).all()
+
+
+def test_zstd_compression():
+    pytest.importorskip("zstandard")
+    data = sweep()
+    grid = encode_grid(data, "int8", "zstd")
+    assert len(grid["grid"]) < data.size
+    np.testing.assert_array_equal(
+        decode_grid(**grid), decode_grid(**encode_grid(data, "int8", "none"))
+    )
+
+
+def test_legacy_json_rows():
+    legacy = json.dumps({"reflectivity": [1.5, None, 3.0], "min_lon": -90.0})
+    values = json_grid_to_array(legacy)
+    assert values.shape == (1, 3)
+    np.testing.assert_array_equal(np.isnan(values), [[False, True, False]])
+    grid = encode_grid(values)
+    np.testing.assert_allclose(decode_grid(**grid), values, atol=grid["grid_scale"])
@@ -0,0 +1,131 @@
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+
+from services.scans.decode import decode_shared
+from services.scans.downloader import AsyncScanDownloader, DirectorySource
+from services.scans.ingest import IngestPipeline
+
+
+def drop(root, radar, t, suffix=""):
+    key = f"{t:%Y/%m/%d}/{radar}/{radar}{t:%Y%m%d_%H%M%S}_V06{suffix}"
+    os.makedirs(os.path.join(root, os.path.dirname(key)), exist_ok=True)
+    with open(os.path.join(root, key), "wb") as f:
+        f.write(key.encode())
+    return key
+
+
+def test_pipeline_ingests_new_volumes(tmp_path):
+    now = pd.Timestamp.now("UTC").floor("s")
+    first = [drop(tmp_path, "KDVN", now - pd.Timedelta(minutes=m)) for m in (3, 2)]
+    drop(tmp_path, "KDVN", now - pd.Timedelta(minutes=2), "_MDM")
+    stored = []
+
+    def store(scan):
+        stored.append((scan.key, scan.radar, scan.sample))
+
+    pipeline = IngestPipeline(
+        ["KDVN"],
+        downloader=AsyncScanDownloader(DirectorySource(tmp_path)),
+        decode=lambda scan: scan.data.decode(),
+        preprocess=lambda scan: len(scan.radar),
+        store=store,
+        since=now - pd.Timedelta(minutes=10),
+        queue_size=1,
+    )
+
+    async def run():
+        await pipeline.start()
+        await pipeline.poll_once("KDVN")
+        await pipeline.join()
+        second = drop(tmp_path, "KDVN", now - pd.Timedelta(minutes=1))
+        await pipeline.poll_once("KDVN")
+        await pipeline.join()
+        await pipeline.stop()
+        return second
+
+    second = asyncio.run(run())
+    assert [key for key, _, _ in stored] == first + [second]
+    assert all(radar == key and sample == len(key) for key, radar, sample in stored)
+
+    metrics = pipeline.metrics()
+    assert metrics["stages"]["store"]["count"] == 3
+    assert metrics["stages"]["end_to_end"]["count"] == 3
+    assert metrics["volumes_per_min"] > 0
+
+
+def test_failed_volume_does_not_stop_pipeline(tmp_path):
+    now = pd.Timestamp.now("UTC").floor("s")
+    keys = [drop(tmp_path, "KDVN", now - pd.Timedelta(minutes=m)) for m in (3, 2)]
+    stored = []
+
+    def decode(scan):
+        if scan.key == keys[0]:
+            raise ValueError("corrupt volume")
+        return scan.data
+
+    pipeline = IngestPipeline(
+        ["KDVN"],
+        downloader=AsyncScanDownloader(DirectorySource(tmp_path)),
+        decode=decode,
+        store=lambda scan: stored.append(scan.key),
+        since=now - pd.Timedelta(minutes=10),
+    )
+
+    async def run():
+        await pipeline.start()
+        await pipeline.poll_once("KDVN")
+        await pipeline.join()
+        await pipeline.stop()
+
+    asyncio.run(run())
+    assert stored == keys[1:]
+    assert pipeline.metrics()["stages"]["decode"]["errors"] == 1
+
+
+def read_bytes(path, data=None):
+    """Stands in for read_sweep_arrays: the gates are the volume's bytes."""
+    if data == b"corrupt":
+        raise ValueError("corrupt volume")
+    return {"reflectivity_0": np.frombuffer(data, dtype=np.uint8)}, {"pid": os.getpid()}
+
+
+def decode_in_worker(scan):
+    return decode_shared(scan.key, reader=read_bytes, data=scan.data)
+
+
+def test_decode_runs_in_worker_processes(tmp_path):
+    now = pd.Timestamp.now("UTC").floor("s")
+    keys = [drop(tmp_path, "KDVN", now - pd.Timedelta(minutes=m)) for m in (3, 2)]
+    # The first volume fails to decode in its worker
+    with open(os.path.join(tmp_path, keys[0]), "wb") as f:
+        f.write(b"corrupt")
+    stored = []
+    before = set(os.listdir("/dev/shm"))
+
+    def store(scan):
+        stored.append((scan.key, bytes(scan.radar["reflectivity_0"])))
+        assert scan.radar.meta["pid"] != os.getpid()
+
+    pipeline = IngestPipeline(
+        ["KDVN"],
+        downloader=AsyncScanDownloader(DirectorySource(tmp_path)),
+        decode=decode_in_worker,
+        decode_processes=True,
+        store=store,
+        since=now - pd.Timedelta(minutes=10),
+    )
+
+    async def run():
+        await pipeline.start()
+        await pipeline.poll_once("KDVN")
+        await pipeline.join()
+        await pipeline.stop()
+
+    asyncio.run(run())
+    assert stored == [(keys[1], keys[1].encode())]
+    assert pipeline.metrics()["stages"]["decode"]["errors"] == 1
+    # Stored volumes' shared memory is freed
+    assert set(os.listdir("/dev/shm")) == before
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from services.model.level2 import LEVEL2_FIELDS, is_netcdf, radar_to_sample
+
+pyart = pytest.importorskip("pyart")
+
+
+def make_radar(n_rays=360, n_gates=40):
+    # Two split-cut tilts: velocity only exists in the second (Doppler) sweep of each
+    radar = pyart.testing.make_empty_ppi_radar(n_gates, n_rays, 4)
+    radar.fixed_angle["data"][:] = [0.5, 0.5, 0.9, 0.9]
+    radar.azimuth["data"][:] = np.tile((np.arange(n_rays) + 0.25) % 360, 4)
+    for i, field in enumerate(LEVEL2_FIELDS):
+        data = np.ma.masked_array(
+            np.full((radar.nrays, n_gates), i, dtype=np.float32), mask=False
+        )
+        if field == "velocity":
+            for sweep in (0, 2):
+                data[radar.get_slice(sweep)] = np.ma.masked
+            data[radar.get_slice(3)] = 100
+        radar.add_field(field, {"data": data})
+    return radar
+
+
+def test_radar_to_sample_matches_read_file_layout():
+    sample = radar_to_sample(make_radar(), n_azimuth=720)
+
+    for field in LEVEL2_FIELDS:
+        assert sample[field].shape == (1, 720, 40, 2)
+        assert sample[field].dtype == np.float32
+    assert sample["range_folded_mask"].shape == (1, 720, 40, 2)
+    assert sample["rng_upper"][0] > sample["rng_lower"][0]
+
+
+def test_split_cuts_use_sweep_with_data():
+    sample = radar_to_sample(make_radar())
+
+    velocity = sample["velocity"][0]
+    assert not np.isnan(velocity).any()
+    np.testing.assert_array_equal(velocity[..., 0], 1)
+    np.testing.assert_array_equal(velocity[..., 1], 100)
+
+
+def test_is_netcdf(tmp_path):
+    nc_file = tmp_path / "scan.nc"
+    nc_file.write_bytes(b"\x89HDF\r\n")
+    level2 = tmp_path / "KDVN20200810_163000_V06"
+    level2.write_bytes(b"AR2V0006.")
+    assert is_netcdf(nc_file)
+    assert not is_netcdf(level2)
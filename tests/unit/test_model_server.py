@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+
+from services.model.server import InferenceService, ModelClient, serve
+
+
+class TinyModel:
+    """Stand-in for services.model.main.Model that reads samples from .npy files."""
+
+    def preprocess(self, file_path):
+        return {"DBZ": np.load(file_path)}
+
+    def predict_batch(self, x):
+        return x["DBZ"].sum(axis=1, keepdims=True)
+
+
+def test_client_round_trip(tmp_path):
+    files = []
+    for i in range(4):
+        files.append(str(tmp_path / f"scan_{i}.npy"))
+        np.save(files[-1], np.full(3, i, dtype=np.float32))
+    socket_path = str(tmp_path / "model.sock")
+
+    async def run():
+        async with InferenceService(TinyModel(), max_latency_ms=20) as service:
+            server = asyncio.create_task(serve(service, socket_path))
+            while not (tmp_path / "model.sock").exists():
+                await asyncio.sleep(0.01)
+
+            client = ModelClient(socket_path)
+            results = await asyncio.gather(*(client.predict_file(f) for f in files))
+            stats = await client.stats()
+            try:
+                await client.predict_file(str(tmp_path / "missing.npy"))
+            except RuntimeError as e:
+                error = str(e)
+            server.cancel()
+            return results, stats, error
+
+    results, stats, error = asyncio.run(run())
+    assert results == [[0.0], [3.0], [6.0], [9.0]]
+    assert stats["samples"] == 4
+    assert stats["rss_mb"] > 0
+    assert "FileNotFoundError" in error
@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from services.postgres import store, utils
+from services.postgres.grid import decode_grid
+
+
+class FakeConnection:
+    closed = 0
+
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.executed = []
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def cursor(self):
+        return FakeCursor(self)
+
+
+class FakeCursor:
+    def __init__(self, conn=None):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        if self.conn is not None:
+            self.conn.executed.append(" ".join(sql.split()))
+
+    def fetchone(self):
+        # No table exists
+        return (None,)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeThreadedPool:
+    """Stands in for psycopg2's pool, which raises once maxconn are checked out."""
+
+    def __init__(self, minconn, maxconn, **kwargs):
+        self.maxconn = maxconn
+        self.out = 0
+
+    def getconn(self):
+        if self.out == self.maxconn:
+            raise utils.psycopg2.pool.PoolError("connection pool exhausted")
+        self.out += 1
+        return FakeConnection()
+
+    def putconn(self, conn, close=False):
+        self.out -= 1
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(utils.psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    return utils.ConnectionPool(minconn=1, maxconn=2, host="unused")
+
+
+def test_exhausted_pool_waits_for_a_connection(pool):
+    first, second = pool.getconn(), pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.05)
+    assert not got
+    pool.putconn(first)
+    waiter.join(1)
+    assert len(got) == 1
+    pool.putconn(second)
+    pool.putconn(got[0])
+
+
+def test_connection_commits_or_rolls_back(pool):
+    with pool.connection() as conn:
+        pass
+    assert conn.commits == 1
+
+    with pytest.raises(ValueError), pool.connection() as conn:
+        raise ValueError
+    assert conn.rollbacks == 1 and conn.commits == 0
+    assert pool._pool.out == 0
+
+
+def test_async_pool_limits_concurrency(pool):
+    running, peak = 0, 0
+
+    def query(conn, i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        time.sleep(0.02)
+        running -= 1
+        return i
+
+    async def run():
+        async_pool = utils.AsyncConnectionPool(pool)
+        return await asyncio.gather(*(async_pool.run(query, i) for i in range(6)))
+
+    assert asyncio.run(run()) == list(range(6))
+    assert peak <= 2
+
+
+def test_store_scans_pages_rows_in_one_transaction(monkeypatch):
+    pages = []
+    monkeypatch.setattr(
+        store.psycopg2.extras,
+        "execute_values",
+        lambda cur, sql, page, page_size: pages.append(page),
+    )
+    t = pd.Timestamp("2020-08-10 16:30", tz="UTC")
+    reflectivity = np.ma.masked_less(np.arange(12, dtype=np.float32).reshape(3, 4), 2)
+    rows = (
+        store.scan_row("KDVN", t, reflectivity, (-91, -89, 41, 42)) for _ in range(5)
+    )
+
+    conn = FakeConnection()
+    assert store.store_scans(rows, conn=conn, page_size=2) == 5
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert conn.commits == 0
+    # A missing partition is created under a lock against concurrent creators
+    lock, create = conn.executed[1:3]
+    assert lock.startswith("SELECT pg_advisory_xact_lock")
+    assert create.startswith("CREATE TABLE IF NOT EXISTS radar_scans_y2020m08")
+
+    row = dict(zip(store.SCAN_COLUMNS, pages[0][0]))
+    assert row["radar_id"] == "KDVN" and row["max_lat"] == 42.0
+    grid = decode_grid(
+        bytes(row["grid"].adapted),
+        row["grid_shape"],
+        row["grid_dtype"],
+        row["grid_scale"],
+        row["grid_offset"],
+        row["grid_codec"],
+    )
+    np.testing.assert_allclose(grid, reflectivity.filled(np.nan), atol=0.1)
+
+
+def test_volume_rows_close_volumes_after_encoding():
+    class Volume:
+        path = "/tmp/KDVN20200810_163012_V06"
+        closed = False
+
+        def __init__(self):
+            self.meta = {"bbox": (-91, -89, 41, 42), "geometry": {"site_lat": 41.6}}
+
+        def __getitem__(self, name):
+            assert not self.closed
+            if name == "azimuth_0":
+                return np.array([0.0, 180.0], dtype=np.float32)
+            return np.zeros((2, 3), dtype=np.float32)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            self.closed = True
+
+    volumes = [Volume(), Volume()]
+    rows = list(store.volume_rows(volumes, "KDVN"))
+    assert all(v.closed for v in volumes)
+    row = dict(zip(store.SCAN_COLUMNS, rows[0]))
+    assert row["scan_time"] == pd.Timestamp("2020-08-10 16:30:12", tz="UTC")
+    assert row["grid_shape"] == [store.SCAN_AZIMUTHS, 3]
+    assert (row["site_lat"], row["site_lon"]) == (41.6, None)
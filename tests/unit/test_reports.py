@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+import urllib.error
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from services.scans.get_scans import get_severe_reports
+from services.scans.reports import ReportStore, fetch_csv
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "spc")
+
+
+class CountingFetch:
+    def __init__(self):
+        self.urls = []
+
+    def __call__(self, url, etag=None, last_modified=None):
+        self.urls.append(url)
+        return fetch_csv(url, etag, last_modified)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ReportStore(
+        str(tmp_path / "store"),
+        base_url=f"file://{FIXTURES}",
+        fetch=CountingFetch(),
+    )
+
+
+def test_reports_in_window_are_utc_and_sorted(store):
+    start = pd.Timestamp("2020-08-10 16:00", tz="UTC")
+    torn = store.reports("torn", start, start + pd.Timedelta(hours=2))
+    # 10:24 and 11:02 CST, out of file order
+    assert list(torn.om) == [620117, 620118]
+    assert torn.index[0] == pd.Timestamp("2020-08-10 16:24", tz="UTC")
+
+    iowa = (-96.6, -90.1, 40.4, 43.5)
+    wide = store.reports("torn", start, start + pd.Timedelta(hours=4), bbox=iowa)
+    assert list(wide.om) == [620117, 620118]
+    assert store.reports("torn", "2020-06-01", "2020-06-02").empty
+
+
+def test_years_are_fetched_once(store, tmp_path):
+    start = pd.Timestamp("2020-08-10 16:00", tz="UTC")
+    for _ in range(3):
+        store.reports("wind", start, start + pd.Timedelta(hours=2))
+    assert store.fetch.urls == [f"file://{FIXTURES}/2020_wind.csv"]
+    assert os.path.exists(tmp_path / "store" / "wind" / "2020.parquet")
+
+    # A new store over the same directory reads the Parquet file
+    again = ReportStore(store.root, base_url="file:///nonexistent")
+    assert len(again.reports("wind", start, start + pd.Timedelta(hours=2))) == 1
+
+
+def test_report_window_spans_years(store):
+    # 21:10 CST on Dec 31 is 03:10 UTC on Jan 1
+    torn = store.reports("torn", "2020-01-01 03:00", "2020-01-01 04:00")
+    assert list(torn.om) == [610500]
+
+
+def test_current_year_refresh_is_conditional(tmp_path):
+    year = pd.Timestamp.now("UTC").year
+    source = tmp_path / "spc"
+    source.mkdir()
+    shutil.copy(os.path.join(FIXTURES, "2020_torn.csv"), source / f"{year}_torn.csv")
+    calls = []
+
+    def fetch(url, etag=None, last_modified=None):
+        calls.append(last_modified)
+        if last_modified is not None:
+            return None, {"etag": etag, "last_modified": last_modified}
+        return fetch_csv(url)
+
+    store = ReportStore(
+        str(tmp_path / "store"), base_url=source.as_uri(), refresh_s=0, fetch=fetch
+    )
+    assert store.refresh("torn", year)
+    assert not store.refresh("torn", year)
+    assert calls[0] is None and calls[1] is not None
+    assert len(store.load("torn", year)) == 4
+
+
+def set_fetched_at(store, kind, year, when):
+    path = store._path(kind, year, "json")
+    with open(path) as f:
+        state = json.load(f)
+    with open(path, "w") as f:
+        json.dump({**state, "fetched_at": pd.Timestamp(when).timestamp()}, f)
+
+
+def test_past_year_is_final_only_after_a_late_fetch(store):
+    store.refresh("torn", 2020)
+    # Fetched before SPC stopped revising the year: still refreshed
+    set_fetched_at(store, "torn", 2020, "2020-12-01")
+    store.refresh_s = 0
+    store.refresh("torn", 2020)
+    assert len(store.fetch.urls) == 2
+    # The refetch happened long after the year ended, so it's final now
+    store.refresh("torn", 2020)
+    assert len(store.fetch.urls) == 2
+
+
+def test_failed_refresh_keeps_stored_copy(store):
+    assert len(store.load("torn", 2020)) == 4
+    set_fetched_at(store, "torn", 2020, "2020-12-01")
+
+    def fail(url, etag=None, last_modified=None):
+        raise urllib.error.HTTPError(url, 503, "Service Unavailable", None, None)
+
+    again = ReportStore(store.root, base_url=store.base_url, refresh_s=0, fetch=fail)
+    assert len(again.load("torn", 2020)) == 4
+    # Without a stored copy the error still surfaces
+    with pytest.raises(urllib.error.HTTPError):
+        again.load("wind", 2020)
+
+
+def test_unpublished_year_is_retried_every_refresh_s(store):
+    urls = []
+
+    # file:// raises URLError for a missing file, so answer 404 like SPC
+    def not_found(url, etag=None, last_modified=None):
+        urls.append(url)
+        raise urllib.error.HTTPError(url, 404, "Not Found", None, None)
+
+    store.fetch = not_found
+    for _ in range(3):
+        assert store.load("torn", 2031) is None
+    assert len(urls) == 1
+    store.refresh_s = 0
+    assert store.load("torn", 2031) is None
+    assert len(urls) == 2
+
+
+def test_get_severe_reports_pads_window(store):
+    start = pd.Timestamp("2020-08-10 17:20", tz="UTC")
+    wind, torn, hail = get_severe_reports(
+        2020, start, start + pd.Timedelta(minutes=20), store=store
+    )
+    assert list(torn.om) == [620118]
+    assert list(wind.om) == [700001]
+    assert hail.empty
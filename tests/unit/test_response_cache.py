@@ -0,0 +1,52 @@
+import json
+
+from starlette.requests import Request
+
+from services.api.cache import ResponseCache
+
+
+def request(if_none_match=None):
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_caches_results_and_answers_etags():
+    cache = ResponseCache(maxsize=8, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [{"Radar ID": "KDVN"}]
+
+    first = cache.respond(request(), ("radars", 1), "v1", compute)
+    assert first.status_code == 200
+    assert json.loads(first.body) == [{"Radar ID": "KDVN"}]
+    etag = first.headers["ETag"]
+
+    assert cache.respond(request(), ("radars", 1), "v1", compute).body == first.body
+    assert len(calls) == 1
+
+    for header in [etag, f'"other", W/{etag}', "*"]:
+        response = cache.respond(request(header), ("radars", 1), "v1", compute)
+        assert response.status_code == 304
+    # A tag that merely contains the ETag doesn't match
+    partial = cache.respond(request(f'"x{etag[1:]}'), ("radars", 1), "v1", compute)
+    assert partial.status_code == 200
+
+
+def test_errors_are_not_cached():
+    cache = ResponseCache(maxsize=8, ttl=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"Error": "Could not find any radars"}, 500
+
+    for _ in range(2):
+        response = cache.respond(request(), ("radars", 2), "v1", compute)
+        assert response.status_code == 500
+        assert "ETag" not in response.headers
+        assert response.headers["Cache-Control"] == "no-store"
+        assert json.loads(response.body) == {"Error": "Could not find any radars"}
+    assert len(calls) == 2
+    assert cache.stats()["size"] == 0
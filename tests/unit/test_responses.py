@@ -0,0 +1,21 @@
+import json
+
+import numpy as np
+
+from services.api.responses import dumps, enc_hook
+from services.scans.get_stations import RadarRecord
+
+
+def test_records_encode_like_dicts():
+    record = RadarRecord("KDVN", 41.61, -90.58, 12.5)
+    expected = {"radar_id": "KDVN", "lat": 41.61, "lon": -90.58, "distance": 12.5}
+    assert json.loads(dumps([record])) == [expected]
+    assert enc_hook(record) == expected
+
+
+def test_enc_hook_handles_numpy():
+    # What the msgspec and stdlib encoders fall back to; orjson does it natively
+    content = {"n": np.int64(3), "x": np.float32(0.5), "grid": np.eye(2)}
+    expected = {"n": 3, "x": 0.5, "grid": [[1.0, 0.0], [0.0, 1.0]]}
+    assert json.loads(json.dumps(content, default=enc_hook)) == expected
+    assert json.loads(dumps(content)) == expected
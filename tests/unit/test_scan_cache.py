@@ -0,0 +1,155 @@
+import asyncio
+import multiprocessing
+import os
+
+import pytest
+
+from services.scans.cache import ScanCache
+from services.scans.utils import enforce_dir_size_limit
+
+
+def write(cache, name, size=10):
+    with open(cache.path(name), "wb") as f:
+        f.write(b"x" * size)
+    return cache.add(cache.path(name))
+
+
+def files(directory):
+    """Cached scans, without the pin and lock files."""
+    return sorted(name for name in os.listdir(directory) if not name.startswith("."))
+
+
+def test_lru_evicts_least_recently_read(tmp_path):
+    cache = ScanCache(str(tmp_path), max_bytes=30, low_water=1.0)
+    for name in "abc":
+        write(cache, name)
+    assert cache.get("a") is not None
+    write(cache, "d")
+    assert files(tmp_path) == ["a", "c", "d"]
+    assert cache.get("b") is None
+    assert cache.stats()["bytes"] == 30
+
+
+def test_lfu_evicts_least_read(tmp_path):
+    cache = ScanCache(str(tmp_path), max_bytes=30, policy="lfu", low_water=0.5)
+    for name in "abc":
+        write(cache, name)
+    for name in ["a", "a", "a", "b", "c", "c"]:
+        cache.get(name)
+    write(cache, "d")
+    # Down to 15 bytes: d (never read), b (read once), then c
+    assert files(tmp_path) == ["a"]
+
+
+def test_pinned_scans_are_not_evicted(tmp_path):
+    cache = ScanCache(str(tmp_path), max_bytes=20, low_water=1.0)
+    with cache.pin("a"):
+        write(cache, "a")
+        write(cache, "b")
+        write(cache, "c")
+        assert files(tmp_path) == ["a", "c"]
+        assert cache.stats()["pinned"] == 1
+    write(cache, "d")
+    assert files(tmp_path) == ["c", "d"]
+
+
+def test_index_is_rebuilt_from_disk(tmp_path):
+    for i, name in enumerate("abc"):
+        (tmp_path / name).write_bytes(b"x" * 10)
+        os.utime(tmp_path / name, (i, i))
+    assert enforce_dir_size_limit(str(tmp_path), max_size_bytes=25) == 10
+    assert files(tmp_path) == ["b", "c"]
+    assert ScanCache(str(tmp_path)).stats()["entries"] == 2
+
+    with pytest.raises(ValueError):
+        ScanCache(str(tmp_path), policy="fifo")
+
+
+def test_background_eviction(tmp_path):
+    async def run():
+        cache = ScanCache(str(tmp_path), max_bytes=20, low_water=0.5)
+        await cache.start()
+        for name in "abc":
+            write(cache, name)
+        # add() only signals the eviction task
+        assert cache.stats()["bytes"] == 30
+        for _ in range(100):
+            if cache.stats()["bytes"] <= 10:
+                break
+            await asyncio.sleep(0.01)
+        await cache.stop()
+        return cache
+
+    cache = asyncio.run(run())
+    assert files(tmp_path) == ["c"]
+    assert cache.stats()["evicted"] == 2
+
+
+def hold_pin(root, name, pinned, release):
+    with ScanCache(root).pin(name):
+        pinned.set()
+        release.wait(10)
+
+
+def test_pins_and_size_are_shared_across_processes(tmp_path):
+    root = str(tmp_path)
+    # Another API worker, whose own adds never reach its limit
+    worker = ScanCache(root, max_bytes=10**6)
+    owner = ScanCache(root, max_bytes=30, low_water=0.5)
+    for name in "ab":
+        write(worker, name)
+    # A scan another process downloaded is found on disk
+    assert owner.get("a") == owner.path("a")
+    os.remove(worker.path("b"))
+    assert worker.get("b") is None
+
+    context = multiprocessing.get_context("fork")
+    pinned, release = context.Event(), context.Event()
+    process = context.Process(target=hold_pin, args=(root, "a", pinned, release))
+    process.start()
+    try:
+        assert pinned.wait(10)
+        for name in "cde":
+            write(worker, name)
+        # The owner never saw c, d and e, but the shared index did
+        assert owner.stats()["bytes"] == 40
+        assert owner.evict() == 30
+        assert files(tmp_path) == ["a"]
+    finally:
+        release.set()
+        process.join()
+    for name in "fgh":
+        write(worker, name)
+    owner.evict()
+    assert files(tmp_path) == ["h"]
+
+
+def test_eviction_never_scans_the_directory(tmp_path, monkeypatch):
+    cache = ScanCache(str(tmp_path), max_bytes=30, low_water=0.5)
+    for name in "abc":
+        write(cache, name)
+
+    def scandir(path):
+        raise AssertionError("scanned the cache directory")
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    monkeypatch.setattr(os, "walk", scandir)
+    write(cache, "d")
+    assert cache.stats()["entries"] == 1
+    monkeypatch.undo()
+    assert files(tmp_path) == ["d"]
+
+
+def test_pin_async(tmp_path):
+    cache = ScanCache(str(tmp_path), max_bytes=10, low_water=1.0)
+
+    async def run():
+        async with cache.pin_async("a") as path:
+            write(cache, "a")
+            write(cache, "b")
+            assert cache.stats()["pinned"] == 1
+            return path
+
+    assert asyncio.run(run()) == cache.path("a")
+    assert files(tmp_path) == ["a"]
+    assert cache.stats()["pinned"] == 0
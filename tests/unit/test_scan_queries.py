@@ -0,0 +1,103 @@
+import base64
+import json
+import struct
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg2")
+
+from services.api.responses import scan_binary_frame, scan_ndjson_line
+from services.postgres.grid import decode_grid
+from services.postgres.query import ScanStore
+from services.postgres.store import scan_row
+
+
+def ts(t):
+    return pd.Timestamp(t, tz="UTC")
+
+
+@pytest.fixture
+def store():
+    store = ScanStore.sqlite()
+    rows = [
+        ("KDVN", "2020-08-10 16:25:12", (-92.6, -88.6, 40.0, 43.2)),
+        ("KDVN", "2020-08-10 16:30:12", (-92.6, -88.6, 40.0, 43.2)),
+        ("KDVN", "2020-08-10 16:35:40", (-92.6, -88.6, 40.0, 43.2)),
+        ("KLOT", "2020-08-10 16:31:00", (-90.1, -86.1, 40.0, 43.2)),
+        ("KTLX", "2020-08-10 16:30:00", (-99.3, -95.3, 33.7, 37.0)),
+    ]
+    store.add(
+        scan_row(radar_id, ts(t), np.full((2, 3), i, dtype=np.float32), bbox)
+        for i, (radar_id, t, bbox) in enumerate(rows)
+    )
+    return store
+
+
+def test_scans_in_range(store):
+    refs = store.scans_in_range("KDVN", ts("2020-08-10 16:26"), ts("2020-08-10 16:40"))
+    assert [r.scan_time for r in refs] == [
+        ts("2020-08-10 16:30:12"),
+        ts("2020-08-10 16:35:40"),
+    ]
+    assert refs[0].bbox == (-92.6, -88.6, 40.0, 43.2)
+    np.testing.assert_allclose(refs[0].grid(), np.full((2, 3), 1.0))
+
+    exact = store.scans_in_range(
+        "KDVN", ts("2020-08-10 16:25:12"), ts("2020-08-10 16:25:12")
+    )
+    assert len(exact) == 1
+
+
+def test_scans_intersecting(store):
+    t0, t1 = ts("2020-08-10 16:28"), ts("2020-08-10 16:32")
+    chicago = (-87.8, -87.5, 41.7, 42.0)
+    assert [r.radar_id for r in store.scans_intersecting(chicago, t0, t1)] == ["KLOT"]
+    # Overlaps both KDVN's and KLOT's coverage
+    rockford = (-89.3, -88.9, 42.1, 42.4)
+    refs = store.scans_intersecting(rockford, t0, t1)
+    assert [r.radar_id for r in refs] == ["KDVN", "KLOT"]
+    everywhere = (-180.0, 180.0, -90.0, 90.0)
+    assert {r.radar_id for r in store.scans_intersecting(everywhere, t0, t1)} == {
+        "KDVN",
+        "KLOT",
+        "KTLX",
+    }
+    assert store.scans_intersecting((0.0, 1.0, 0.0, 1.0), t0, t1) == []
+
+
+def test_iter_scans_streams_grids(store):
+    refs = store.iter_scans(t0=ts("2020-08-10 16:30"), itersize=2)
+    first = next(refs)
+    assert (first.radar_id, first.payload is not None) == ("KTLX", True)
+    rest = list(refs)
+    assert [r.radar_id for r in rest] == ["KDVN", "KLOT", "KDVN"]
+    np.testing.assert_allclose(rest[-1].grid(), np.full((2, 3), 2.0))
+
+    metadata_only = list(store.iter_scans(radar_id="KLOT", with_grid=False))
+    assert metadata_only[0].payload is None
+    np.testing.assert_allclose(metadata_only[0].grid(), np.full((2, 3), 3.0))
+
+
+def test_streamed_frames_round_trip(store):
+    (ref,) = store.iter_scans(radar_id="KLOT")
+
+    line = json.loads(scan_ndjson_line(ref))
+    assert line["scan_time"] == "2020-08-10T16:31:00+00:00"
+    grid = line["grid"]
+    values = decode_grid(
+        base64.b64decode(grid["data"]),
+        grid["shape"],
+        grid["dtype"],
+        grid["scale"],
+        grid["offset"],
+        grid["codec"],
+    )
+    np.testing.assert_allclose(values, np.full((2, 3), 3.0))
+
+    frame = scan_binary_frame(ref)
+    (n,) = struct.unpack_from("<I", frame)
+    header = json.loads(frame[4 : 4 + n])
+    assert len(frame) == 4 + n + header["grid"]["nbytes"]
+    assert "grid" not in json.loads(scan_ndjson_line(ref, with_grid=False))
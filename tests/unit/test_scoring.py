@@ -0,0 +1,66 @@
+import numpy as np
+
+from services.model.scoring import BatchScorer
+
+
+def read_sample(path):
+    """Stand-in for preprocess_file: sample i is filled with i."""
+    if path.endswith("bad"):
+        raise OSError(f"Can't read {path}")
+    i = int(path.split("_")[-1])
+    return {
+        "DBZ": np.full((4, 3, 2), i, dtype=np.float32),
+        "coordinates": np.full((2, 3), -i, dtype=np.float32),
+        "range_folded_mask": None,
+    }
+
+
+def predict(x):
+    assert x["DBZ"].flags["C_CONTIGUOUS"]
+    return (
+        x["DBZ"].reshape(len(x["DBZ"]), -1).sum(axis=1, keepdims=True)
+        + x["coordinates"][:, :1, 0]
+    )
+
+
+def test_scores_every_sample_in_order():
+    paths = [f"sample_{i}" for i in range(11)]
+    scorer = BatchScorer(predict, read_sample, batch_size=4, workers=2, prefetch=1)
+    batches = list(scorer.score(paths))
+    assert [len(p) for p, _, _ in batches] == [4, 4, 3]
+    outputs = np.concatenate([o for _, o, _ in batches])[:, 0]
+    np.testing.assert_array_equal(outputs, [23 * i for i in range(11)])
+
+    stats = scorer.stats()
+    assert stats["samples"] == 11
+    assert stats["samples_per_s"] > 0
+    assert stats["stages"]["read"]["count"] == 11
+    assert stats["stages"]["predict"]["count"] == 3
+
+
+def test_unreadable_samples_are_reported():
+    paths = ["sample_1", "sample_2.bad", "sample_3"]
+    scores = BatchScorer(
+        predict, read_sample, batch_size=2, workers=1, keys=["DBZ", "coordinates"]
+    ).score_all(paths)
+    assert list(scores.path) == paths
+    assert scores.output[0] == 23 and scores.output[2] == 69
+    assert np.isnan(scores.output[1])
+    assert "Can't read" in scores.error[1]
+
+
+def test_template_comes_from_first_readable_sample():
+    paths = ["sample_1.bad", "sample_2.bad", "sample_3", "sample_4", "sample_5"]
+    scorer = BatchScorer(predict, read_sample, batch_size=2, workers=1, prefetch=0)
+    scores = scorer.score_all(paths)
+    assert list(scores.path) == paths
+    assert scores.output[:2].isna().all()
+    assert list(scores.output[2:]) == [69, 92, 115]
+    assert "Can't read" in scores.error[0] and "Can't read" in scores.error[1]
+    assert scorer.stats()["stages"]["read"]["errors"] == 2
+
+    # With nothing readable every sample is an error, and predict isn't called
+    scores = BatchScorer(None, read_sample, batch_size=2, workers=1).score_all(
+        ["sample_1.bad", "sample_2.bad", "sample_3.bad"]
+    )
+    assert scores.output.isna().all() and scores.error.notna().all()
@@ -0,0 +1,79 @@
+import numpy as np
+
+from services.model.tensor_cache import TensorCache
+
+VARIABLES = ["reflectivity", "velocity"]
+
+
+def write_scan(path, content):
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_hit_skips_compute_and_is_memory_mapped(tmp_path):
+    cache = TensorCache(str(tmp_path / "cache"))
+    scan = write_scan(tmp_path / "scan.nc", b"volume-1")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"DBZ": np.ones((2, 3), dtype=np.float32), "label": None}
+
+    first = cache.get_or_compute(scan, VARIABLES, 1, compute)
+    second = cache.get_or_compute(scan, VARIABLES, 1, compute)
+
+    assert len(calls) == 1
+    assert isinstance(second["DBZ"], np.memmap)
+    np.testing.assert_array_equal(first["DBZ"], second["DBZ"])
+    assert cache.stats()["hits"] == 1
+
+
+def test_key_depends_on_content_variables_and_version(tmp_path):
+    a = write_scan(tmp_path / "a.nc", b"volume-1")
+    b = write_scan(tmp_path / "b.nc", b"volume-1")
+    c = write_scan(tmp_path / "c.nc", b"volume-2")
+
+    assert TensorCache.key(a, VARIABLES, 1) == TensorCache.key(b, VARIABLES, 1)
+    assert TensorCache.key(a, VARIABLES, 1) != TensorCache.key(c, VARIABLES, 1)
+    assert TensorCache.key(a, VARIABLES, 1) != TensorCache.key(a, VARIABLES[:1], 1)
+    assert TensorCache.key(a, VARIABLES, 1) != TensorCache.key(a, VARIABLES, 2)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    sample = {"DBZ": np.zeros(1000, dtype=np.float32)}
+    cache = TensorCache(str(tmp_path / "cache"), max_bytes=3 * 4200)
+    for key in ["a", "b", "c"]:
+        cache.put(key, sample)
+    cache.get("a")
+    cache.put("d", sample)
+
+    assert cache.get("b") is None
+    assert all(cache.get(key) is not None for key in ["a", "c", "d"])
+
+    # The index is rebuilt from disk on restart
+    assert TensorCache(str(tmp_path / "cache")).stats()["entries"] == 3
+
+
+def test_entries_are_shared_by_processes(tmp_path):
+    # Two workers (each with its own index) on one directory
+    first = TensorCache(str(tmp_path / "cache"))
+    second = TensorCache(str(tmp_path / "cache"))
+    scan = write_scan(tmp_path / "scan.nc", b"volume-1")
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"DBZ": np.ones((2, 3), dtype=np.float32)}
+
+    first.get_or_compute(scan, VARIABLES, 1, compute)
+    for _ in range(3):
+        second.get_or_compute(scan, VARIABLES, 1, compute)
+    assert len(calls) == 1
+    assert second.stats()["hits"] == 3 and second.stats()["entries"] == 1
+
+    # Storing an entry that already exists indexes it instead of failing
+    key = TensorCache.key(scan, VARIABLES, 2)
+    first.put(key, compute())
+    second.put(key, compute())
+    assert second.stats()["entries"] == 2
+    assert second.get(key) is not None
@@ -0,0 +1,127 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("psycopg2")
+pytest.importorskip("PIL")
+pyart = pytest.importorskip("pyart")
+
+from services.postgres.query import ScanStore
+from services.postgres.store import radar_scan_row
+from services.scans.tiles import TileCache, TileRenderer, color_indices, color_table
+
+
+class LocalScan:
+    filename = "KDVN20200810_163012_V06"
+
+
+def make_radar(n_rays=360, n_gates=400):
+    """Reflectivity 10 dBZ in the NE quadrant, 40 dBZ in the SE, nothing elsewhere."""
+    radar = pyart.testing.make_empty_ppi_radar(n_gates, n_rays, 1)
+    radar.latitude["data"][:] = 41.61
+    radar.longitude["data"][:] = -90.58
+    radar.range["data"] = 2125.0 + 250.0 * np.arange(n_gates, dtype=np.float32)
+    # Rays start mid-sweep, as in real volumes
+    azimuth = (np.arange(n_rays) + 0.5 + 200) % 360
+    radar.azimuth["data"][:] = azimuth
+    data = np.ma.masked_all((n_rays, n_gates), dtype=np.float32)
+    data[(azimuth < 90)] = 10.0
+    data[(azimuth >= 90) & (azimuth < 180)] = 40.0
+    radar.add_field("reflectivity", {"data": data})
+    return radar
+
+
+def pixel(z, lon, lat):
+    """Tile x/y and pixel column/row containing lon/lat."""
+    n = 2**z
+    fx = (lon + 180) / 360 * n
+    fy = (1 - np.arcsinh(np.tan(np.radians(lat))) / np.pi) / 2 * n
+    return int(fx), int(fy), int(fx % 1 * 256), int(fy % 1 * 256)
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    store = ScanStore.sqlite()
+    store.add([radar_scan_row(LocalScan, make_radar(), "KDVN")])
+    return TileRenderer(store, TileCache(str(tmp_path / "tiles"), max_bytes=10**6))
+
+
+def test_tiles_follow_radar_geometry(renderer):
+    from io import BytesIO
+
+    from PIL import Image
+
+    t = pd.Timestamp("2020-08-10 16:30:12", tz="UTC")
+    colors = color_table()
+    expected = {
+        10.0: colors[color_indices(np.array([10.0]))[0]],
+        40.0: colors[color_indices(np.array([40.0]))[0]],
+    }
+    # ~40 km NE, SE and SW of the radar, and far outside its 100 km range
+    for lon, lat, value in [
+        (-90.24, 41.86, 10.0),
+        (-90.24, 41.36, 40.0),
+        (-90.92, 41.36, None),
+        (-88.0, 41.61, None),
+    ]:
+        x, y, col, row = pixel(8, lon, lat)
+        png = renderer.tile("KDVN", t, 8, x, y)
+        rgba = np.asarray(Image.open(BytesIO(png)))
+        if value is None:
+            assert rgba[row, col, 3] == 0
+        else:
+            np.testing.assert_array_equal(rgba[row, col], expected[value])
+
+    assert renderer.tile("KDVN", t + pd.Timedelta(minutes=5), 8, x, y) is None
+    assert renderer.tile("KDVN", t, 8, 0, 0) is not None
+
+
+def test_tile_cache_evicts_least_recently_used(tmp_path):
+    cache = TileCache(str(tmp_path), max_bytes=25)
+    cache.put("a/0/0/0.png", b"x" * 10)
+    cache.put("a/1/0/0.png", b"y" * 10)
+    assert cache.get("a/0/0/0.png") == b"x" * 10
+    cache.put("a/1/1/0.png", b"z" * 10)
+    assert cache.get("a/1/0/0.png") is None
+    assert cache.get("a/0/0/0.png") is not None
+    assert TileCache(str(tmp_path)).stats()["entries"] == 2
+
+
+def test_tile_cache_is_shared_by_workers(tmp_path):
+    # Two API workers on one directory
+    first = TileCache(str(tmp_path), max_bytes=25)
+    second = TileCache(str(tmp_path), max_bytes=25)
+    first.put("a/0/0/0.png", b"x" * 10)
+    assert second.get("a/0/0/0.png") == b"x" * 10
+    second.put("a/1/0/0.png", b"y" * 10)
+    first.put("a/1/1/0.png", b"z" * 10)
+    # One bound for the directory, not one per worker
+    assert first.stats()["bytes"] == second.stats()["bytes"] == 20
+    assert second.get("a/0/0/0.png") is None
+    assert first.get("a/1/0/0.png") == b"y" * 10
+
+
+def test_polar_inverse_matches_pyart_gate_locations():
+    from services.scans.geometry import lonlat_to_polar, slant_range
+
+    radar = make_radar()
+    radar.fixed_angle["data"][:] = 0.5
+    radar.elevation["data"][:] = 0.5
+    lats, lons, _ = radar.get_gate_lat_lon_alt(sweep=0)
+    azimuth, ground = lonlat_to_polar(lons, lats, -90.58, 41.61)
+    np.testing.assert_allclose(
+        slant_range(ground, 0.5),
+        np.broadcast_to(radar.range["data"], lats.shape),
+        atol=1.0,
+    )
+    error = (azimuth - radar.azimuth["data"][:, None] + 180) % 360 - 180
+    assert np.abs(error[:, 1:]).max() < 0.01
+
+
+def test_latest_scan(renderer):
+    store = renderer.store
+    ref = store.latest("KDVN")
+    assert ref.scan_time == pd.Timestamp("2020-08-10 16:30:12", tz="UTC")
+    assert ref.geometry["gate_spacing"] == 250.0
+    assert store.latest("KDVN", before="2020-08-10 16:00") is None
+    assert store.latest("KLOT") is None